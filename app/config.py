@@ -1,4 +1,5 @@
 # app/config.py
+from functools import lru_cache
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -11,9 +12,66 @@ class Settings(BaseSettings):
     redis_host: str = Field("localhost", alias="REDIS_HOST")
     redis_port: int = Field(6379, alias="REDIS_PORT")
     api_port: int = Field(8000, alias="API_PORT")
+    bulk_max_line_bytes: int = Field(1024 * 1024, alias="BULK_MAX_LINE_BYTES")
+    log_level: str = Field("INFO", alias="LOG_LEVEL")
+    log_format: str = Field("text", alias="LOG_FORMAT")
+    log_async: bool = Field(True, alias="LOG_ASYNC")
+    log_sample_rates: str = Field("", alias="LOG_SAMPLE_RATES")
+    worker_max_batch: int = Field(10, alias="WORKER_MAX_BATCH")
+    worker_max_wait: int = Field(20, alias="WORKER_MAX_WAIT")
+    worker_depth_refresh: float = Field(15.0, alias="WORKER_DEPTH_REFRESH")
+    worker_queues: str = Field("", alias="WORKER_QUEUES")
+    worker_scheduling: str = Field("weighted", alias="WORKER_SCHEDULING")
+    worker_stats_interval: float = Field(60.0, alias="WORKER_STATS_INTERVAL")
+    worker_transport: str = Field("sqs", alias="WORKER_TRANSPORT")
+    stream_group: str = Field("order-workers", alias="STREAM_GROUP")
+    stream_max_batch: int = Field(500, alias="STREAM_MAX_BATCH")
+    stream_visibility_timeout: float = Field(30.0, alias="STREAM_VISIBILITY_TIMEOUT")
+    breaker_latency_threshold: float = Field(0.5, alias="BREAKER_LATENCY_THRESHOLD")
+    breaker_error_rate: float = Field(0.5, alias="BREAKER_ERROR_RATE")
+    breaker_window: int = Field(20, alias="BREAKER_WINDOW")
+    breaker_reset_timeout: float = Field(10.0, alias="BREAKER_RESET_TIMEOUT")
+    redis_nodes: str = Field("", alias="REDIS_NODES")
+    hash_ring_replicas: int = Field(160, alias="HASH_RING_REPLICAS")
+    redis_replicas: str = Field("", alias="REDIS_REPLICAS")
+    replica_max_lag: float = Field(5.0, alias="REPLICA_MAX_LAG")
+    replica_check_interval: float = Field(1.0, alias="REPLICA_CHECK_INTERVAL")
+    user_stats_layout: str = Field("hash", alias="USER_STATS_LAYOUT")
+    user_stats_buckets: int = Field(0, alias="USER_STATS_BUCKETS")
+    user_stats_expected_users: int = Field(1_000_000, alias="USER_STATS_EXPECTED_USERS")
+    global_stats_shards: int = Field(1, alias="GLOBAL_STATS_SHARDS")
+    global_stats_cache_ttl: float = Field(0.0, alias="GLOBAL_STATS_CACHE_TTL")
+    invalid_orders_codec: str = Field("zlib", alias="INVALID_ORDERS_CODEC")
+    invalid_orders_max_count: int = Field(0, alias="INVALID_ORDERS_MAX_COUNT")
+    invalid_orders_max_age: float = Field(0.0, alias="INVALID_ORDERS_MAX_AGE")
+    trending_half_life: float = Field(86400.0, alias="TRENDING_HALF_LIFE")
+    leaderboard_snapshots: bool = Field(False, alias="LEADERBOARD_SNAPSHOTS")
+    leaderboard_snapshot_interval: float = Field(5.0, alias="LEADERBOARD_SNAPSHOT_INTERVAL")
+    leaderboard_snapshot_every: int = Field(1000, alias="LEADERBOARD_SNAPSHOT_EVERY")
+    leaderboard_snapshot_ttl: float = Field(60.0, alias="LEADERBOARD_SNAPSHOT_TTL")
 
     class Config:
         env_file = ".env"
         extra = "ignore"
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Builds the settings (reading the environment and .env) on first use."""
+    return Settings()
+
+class _LazySettings:
+    """
+    Stands in for the Settings instance so importing app.config does not parse
+    the environment; attribute reads and writes go to ``get_settings()``.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+    def __delattr__(self, name):
+        delattr(get_settings(), name)
+
+settings = _LazySettings()
@@ -0,0 +1,202 @@
+import random
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Trips when too many recent calls failed or were slower than
+    ``latency_threshold`` seconds.
+
+    While open, ``allow()`` returns False until ``reset_timeout`` seconds have
+    passed; the breaker then goes half-open and lets a probe through. A good
+    probe closes it again, a bad one re-opens it.
+    """
+
+    def __init__(self, latency_threshold: float = 0.5, error_rate: float = 0.5, window: int = 20,
+                 min_samples: int = 5, reset_timeout: float = 10.0, clock=time.monotonic):
+        self.latency_threshold = latency_threshold
+        self.error_rate = error_rate
+        self.min_samples = min_samples
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Returns True if calls may go through (closed, or half-open probe)."""
+        return self.state != OPEN
+
+    def seconds_until_probe(self) -> float:
+        """Seconds left before an open breaker lets a probe through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record(self, ok: bool, latency: float = 0.0):
+        """Records one call; slow calls count as failures."""
+        bad = not ok or latency > self.latency_threshold
+        state = self.state
+        if state == HALF_OPEN:
+            if bad:
+                self._trip()
+            else:
+                self._state = CLOSED
+                self._outcomes.clear()
+            return
+        self._outcomes.append(bad)
+        if (state == CLOSED and len(self._outcomes) >= self.min_samples
+                and sum(self._outcomes) / len(self._outcomes) >= self.error_rate):
+            self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+
+class AdaptivePoller:
+    """
+    Chooses receive parameters from observed queue depth and processing time.
+
+    - Batch size is capped so a whole batch can be processed within half the
+      queue's visibility timeout, based on an EWMA of per-message time.
+    - The long-poll wait is the maximum when the queue looks empty (fewest
+      wasted receives) and short when there is a backlog.
+    - Errors back off exponentially with jitter instead of a fixed sleep.
+    """
+
+    def __init__(self, max_batch: int = 10, max_wait: int = 20, min_wait: int = 1,
+                 visibility_timeout: float = 30.0, max_backoff: float = 30.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.min_wait = min_wait
+        self.visibility_timeout = visibility_timeout
+        self.max_backoff = max_backoff
+        self.queue_depth = None
+        self._avg_message_seconds = None
+        self._errors = 0
+
+    def observe_depth(self, depth: int):
+        """Records the latest approximate number of visible messages."""
+        self.queue_depth = depth
+
+    def observe_message(self, seconds: float):
+        """Records how long one message took to process."""
+        if self._avg_message_seconds is None:
+            self._avg_message_seconds = seconds
+        else:
+            self._avg_message_seconds = 0.8 * self._avg_message_seconds + 0.2 * seconds
+
+    def batch_size(self, probing: bool = False) -> int:
+        if probing:
+            return 1
+        size = self.max_batch
+        if self._avg_message_seconds:
+            size = min(size, int(self.visibility_timeout * 0.5 / self._avg_message_seconds))
+        if self.queue_depth:
+            size = min(size, self.queue_depth)
+        return max(1, size)
+
+    def wait_seconds(self) -> int:
+        if self.queue_depth:
+            return self.min_wait
+        return self.max_wait
+
+    def record_success(self):
+        self._errors = 0
+
+    def error_backoff(self) -> float:
+        """Returns the next sleep after an error: 1s doubling up to ``max_backoff``, with jitter."""
+        self._errors += 1
+        delay = min(self.max_backoff, 2 ** (self._errors - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+
+def parse_queue_weights(spec: str) -> dict:
+    """Parses "queue=weight,queue" into an ordered dict of weights (default 1)."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            weights[name.strip()] = max(1, int(weight)) if weight.strip() else 1
+    return weights
+
+
+class QueueScheduler:
+    """
+    Splits receive capacity between several queues and tracks per-queue
+    throughput and lag.
+
+    - Weighted (default): smooth weighted round-robin over receive calls, so
+      each queue leads a poll round in proportion to its weight. The other
+      queues follow in credit order, so a round's capacity goes to the next
+      queue when the leader is empty.
+    - Strict priority: queues are always tried in configured order; a queue
+      is only read once every queue before it came back empty.
+
+    When every queue is empty, the worker long-polls ``idle_queue()``: the
+    first configured (highest priority) queue.
+    """
+
+    def __init__(self, weights: dict, strict_priority: bool = False, clock=time.monotonic):
+        self.weights = dict(weights)
+        self.strict_priority = strict_priority
+        self._clock = clock
+        self._credit = {name: 0 for name in self.weights}
+        self._total = sum(self.weights.values())
+        self._counts = {name: 0 for name in self.weights}
+        self._lag = {name: None for name in self.weights}
+        self._reported_counts = dict(self._counts)
+        self._reported_at = clock()
+
+    def order(self) -> list:
+        """Returns the queues to try this round, in order."""
+        if self.strict_priority or len(self.weights) == 1:
+            return list(self.weights)
+        for name, weight in self.weights.items():
+            self._credit[name] += weight
+        leader = max(self._credit, key=self._credit.get)
+        self._credit[leader] -= self._total
+        return [leader] + sorted((name for name in self.weights if name != leader),
+                                 key=lambda name: -self._credit[name])
+
+    def idle_queue(self) -> str:
+        return next(iter(self.weights))
+
+    def record(self, name: str, count: int, lag: float | None = None):
+        """Records ``count`` messages taken from ``name``, with the age in seconds of the oldest."""
+        self._counts[name] += count
+        if lag is not None or count == 0:
+            # An empty receive means the queue has caught up
+            self._lag[name] = lag if count else 0.0
+
+    def report(self) -> dict:
+        """
+        Returns per-queue totals, messages/sec since the previous report and
+        the latest lag, and starts a new reporting interval.
+        """
+        now = self._clock()
+        elapsed = max(now - self._reported_at, 1e-9)
+        stats = {
+            name: {
+                "messages": self._counts[name],
+                "per_sec": round((self._counts[name] - self._reported_counts[name]) / elapsed, 2),
+                "lag": self._lag[name],
+            }
+            for name in self.weights
+        }
+        self._reported_counts = dict(self._counts)
+        self._reported_at = now
+        return stats
@@ -1,14 +1,118 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 
-def configure_logging(level=logging.INFO):
+from app.config import settings
+
+# Attributes every LogRecord has; anything else was passed via ``extra``.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records tagged with ``extra={"event": ...}``,
+    per event name. Records without an event, or with an unlisted event, and
+    warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records without formatting them; the listener thread does the
+    %-formatting and the blocking write, keeping both off the hot path.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """Parses "event=rate,event=rate" into a dict of floats."""
+    rates = {}
+    for part in spec.split(","):
+        if "=" in part:
+            event, _, rate = part.partition("=")
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(level=None, fmt: str | None = None, async_logging: bool | None = None,
+                      sample_rates: dict | None = None):
     """Centralized logging configuration for the application.
-    This sets a basic handler only if no handlers are present so imports from
-    libraries or repeated calls don't reconfigure logging.
+    This sets a handler only if no handlers are present so imports from
+    libraries or repeated calls don't reconfigure logging. The worker, the
+    API and the scripts all call this, so LOG_* settings apply everywhere:
+    text or JSON output (LOG_FORMAT), a background writer thread behind a
+    QueueHandler (LOG_ASYNC) and per-event sampling (LOG_SAMPLE_RATES).
     """
+    global _listener
+    level = level if level is not None else logging.getLevelName(settings.log_level.upper())
     root = logging.getLogger()
     if not root.handlers:
-        logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+        fmt = fmt or settings.log_format
+        async_logging = settings.log_async if async_logging is None else async_logging
+        rates = parse_sample_rates(settings.log_sample_rates) if sample_rates is None else sample_rates
+
+        stream = logging.StreamHandler()
+        if fmt == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+        if async_logging:
+            records = queue.SimpleQueue()
+            handler = _LazyQueueHandler(records)
+            _listener = logging.handlers.QueueListener(records, stream)
+            _listener.start()
+            atexit.register(stop_logging)
+        else:
+            handler = stream
+        if rates:
+            handler.addFilter(SamplingFilter(rates))
+        root.addHandler(handler)
     root.setLevel(level)
 
+
+def stop_logging():
+    """Flushes queued records and stops the background listener, if any."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(name: str):
     return logging.getLogger(name)
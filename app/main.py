@@ -1,9 +1,41 @@
-from fastapi import FastAPI
-from app.routes import router
-from app.logutil import configure_logging
+import argparse
+import threading
+from contextlib import asynccontextmanager
+
+from app.startup import profile
+
+with profile.phase("import fastapi + app modules"):
+    from fastapi import FastAPI
+    from app.routes import router
+    from app.logutil import configure_logging
+    from app.services import storage
 
 # Configure logging early for the application
 configure_logging()
 
-app = FastAPI(title="Order Stats API")
+def _warm_up_redis():
+    with profile.phase("Redis warm-up"):
+        storage.warm_up()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the Redis pools in the background so the server starts accepting
+    # requests immediately instead of waiting on connection setup.
+    threading.Thread(target=_warm_up_redis, name="redis-warmup", daemon=True).start()
+    yield
+
+app = FastAPI(title="Order Stats API", lifespan=lifespan)
 app.include_router(router)
+
+if __name__ == "__main__":
+    import uvicorn
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Run the Order Stats API.")
+    parser.add_argument("--print-startup-profile", action="store_true",
+                        help="Print import and initialization timings after startup.")
+    args = parser.parse_args()
+    if args.print_startup_profile:
+        _warm_up_redis()
+        print(profile.report(), flush=True)
+    uvicorn.run(app, host="0.0.0.0", port=settings.api_port)
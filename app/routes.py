@@ -1,19 +1,35 @@
 
-from fastapi import APIRouter, status, Query, HTTPException
+import json
+from datetime import datetime, timezone
+from fastapi import APIRouter, status, Query, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List
-from app.services import storage, processor
+from app.config import settings
+from app.logutil import get_logger
+from app.services import storage, processor, export, snapshots
 from typing import Literal
 
+logger = get_logger(__name__)
+
 router = APIRouter()
 
 @router.get("/stats/top-users")
-def top_users(by: Literal["spend","orders"] = Query("spend", description="Leaderboard type: spend or orders"),
+def top_users(by: Literal["spend","orders","trending"] = Query("spend", description="Leaderboard type: spend, orders or trending"),
               n: int = Query(10, ge=1, le=100, description="Number of users to return (max 100)"),
               offset: int = Query(0, ge=0, description="Offset for pagination")):
     """
     Get top-N users by spend or order count.
+    With LEADERBOARD_SNAPSHOTS enabled, ranges within the materialized top 100
+    are served as pre-serialized bytes from one key; others read the ZSET.
     """
+    if settings.leaderboard_snapshots:
+        cached = snapshots.read_top_users(by, n, offset)
+        if cached is not None:
+            body, age = cached
+            return Response(body, media_type="application/json",
+                            headers={"X-Snapshot-Age": f"{age:.3f}"})
     try:
         users = storage.get_top_users(by, n, offset)
         return {"by": by, "n": n, "offset": offset, "users": users}
@@ -36,13 +52,25 @@ class Order(BaseModel):
     payment_method: str
 
 @router.get("/users/{user_id}/stats")
-def user_stats(user_id: str):
+def user_stats(user_id: str,
+               window: Literal["1h","24h"] | None = Query(None, description="Also return orders and spend in this rolling window")):
     """
     Retrieves the order statistics for a specific user.
     """
-    stats = storage.get_user_stats(user_id)
+    stats = storage.get_user_stats(user_id, window=window)
     return {"user_id": user_id, **stats}
 
+@router.get("/users/export")
+def export_users(format: Literal["ndjson","csv"] = Query("ndjson", description="Export format: ndjson or csv"),
+                 segments: int = Query(4, ge=1, le=32, description="Parallel scan segments")):
+    """
+    Streams the stats of every user as NDJSON or CSV in constant memory.
+    """
+    batches = export.iter_user_stats_batches(segments=segments)
+    if format == "csv":
+        return StreamingResponse(export.iter_csv(batches), media_type="text/csv")
+    return StreamingResponse(export.iter_ndjson(batches), media_type="application/x-ndjson")
+
 @router.get("/stats/global")
 def global_stats():
     """
@@ -50,18 +78,190 @@ def global_stats():
     """
     return storage.get_global_stats()
 
+def _epoch(moment: datetime | None) -> float | None:
+    """Converts a query datetime to Unix time, reading naive values as UTC."""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
 @router.get("/orders/invalid")
-def invalid_orders(limit: int = 50):
+def invalid_orders(response: Response, limit: int = 50,
+                   reason: str | None = Query(None, description="Reason code, e.g. total_mismatch"),
+                   since: datetime | None = Query(None, description="Only entries logged at or after this time (UTC if no offset)"),
+                   until: datetime | None = Query(None, description="Only entries logged at or before this time (UTC if no offset)"),
+                   cursor: str | None = Query(None, description="X-Next-Cursor of the previous page")):
     """
     Lists the most recent invalid orders, with a configurable limit.
+    With ``reason``, ``since``, ``until`` or ``cursor`` the page is read from
+    the reason and day indexes, newest first; the ``X-Next-Cursor`` response
+    header is set when more entries may follow.
+    """
+    if reason is None and since is None and until is None and cursor is None:
+        return storage.list_invalid_orders(limit=limit)
+    try:
+        entries, next_cursor = storage.query_invalid_orders(
+            reason=reason, since=_epoch(since), until=_epoch(until), cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+@router.get("/orders/invalid/counts")
+def invalid_order_counts(day: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="UTC day, YYYY-MM-DD")):
+    """
+    Returns the number of invalid orders logged per reason code, overall or for one day.
     """
-    return storage.list_invalid_orders(limit=limit)
+    return storage.get_invalid_order_counts(day)
 
 
 @router.post("/orders/reprocess", status_code=status.HTTP_202_ACCEPTED)
-async def reprocess_order(order: Order):
+def reprocess_order(order: Order):
     """
     Accepts a corrected order JSON and sends it for processing.
+    Declared sync so FastAPI runs the blocking Redis calls in its threadpool.
     """
     processor.process_order(order.dict())
     return {"status": "accepted", "message": "Order sent for reprocessing."}
+
+
+class _LineSplitter:
+    """
+    Splits a streamed body into lines, scanning only the newly received bytes.
+    Lines longer than ``max_bytes`` are not buffered and come out as None.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._partial = bytearray()
+        self._overflow = False
+
+    def feed(self, data: bytes) -> list:
+        lines = []
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline == -1:
+                break
+            piece = data[start:newline]
+            if self._overflow or len(self._partial) + len(piece) > self.max_bytes:
+                lines.append(None)
+            else:
+                self._partial += piece
+                lines.append(bytes(self._partial))
+            self._partial.clear()
+            self._overflow = False
+            start = newline + 1
+        rest = data[start:]
+        if not self._overflow:
+            if len(self._partial) + len(rest) > self.max_bytes:
+                self._overflow = True
+                self._partial.clear()
+            else:
+                self._partial += rest
+        return lines
+
+    def finish(self) -> list:
+        if self._overflow:
+            return [None]
+        return [bytes(self._partial)] if self._partial.strip() else []
+
+
+async def _process_bulk_body(request: Request, chunk_size: int):
+    """
+    Reads an NDJSON body as it streams in, validates each order on arrival and
+    stores them in chunks of ``chunk_size`` on the threadpool, so the event
+    loop never blocks on Redis. Yields one NDJSON result line per input line,
+    as soon as the line's chunk has been stored.
+    """
+    results = []
+    pending = []  # (line number, order, is_valid, reason)
+
+    async def flush():
+        validated = [(order, is_valid, reason) for _, order, is_valid, reason in pending]
+        completed = ["invalid", "users", "global"]
+        try:
+            await run_in_threadpool(processor.store_orders, validated)
+        except processor.StoreOrdersError as e:
+            logger.exception("Bulk chunk of %s orders failed at stage %s", len(pending), e.failed_stage)
+            completed = e.completed
+        for line_no, order, is_valid, reason in pending:
+            result = {"line": line_no, "order_id": order.get("order_id")}
+            if is_valid and "users" in completed and "global" in completed:
+                result["status"] = "processed"
+            elif is_valid:
+                result.update(status="error", reason="Storage failure; this order may be partially applied")
+            elif "invalid" in completed:
+                result.update(status="invalid", reason=reason)
+            else:
+                result.update(status="error", reason="Storage failure; this invalid order was not recorded")
+            results.append(json.dumps(result) + "\n")
+        pending.clear()
+
+    def parse(line_no: int, raw: bytes | None):
+        if raw is None:
+            error = f"Line exceeds {settings.bulk_max_line_bytes} bytes"
+        else:
+            try:
+                order = json.loads(raw)
+            except ValueError:
+                order, error = None, "Invalid JSON"
+            else:
+                error = None if isinstance(order, dict) else "Order must be a JSON object"
+            if error is None:
+                try:
+                    pending.append((line_no, order, *processor.validate_order(order)))
+                    return
+                except Exception:
+                    error = "Invalid order structure"
+        results.append(json.dumps({"line": line_no, "status": "error", "reason": error}) + "\n")
+
+    splitter = _LineSplitter(settings.bulk_max_line_bytes)
+    line_no = 0
+    async for data in request.stream():
+        for raw in splitter.feed(data):
+            line_no += 1
+            if raw is None or raw.strip():
+                parse(line_no, raw)
+        if len(pending) >= chunk_size:
+            await flush()
+        if results:
+            yield "".join(results)
+            results.clear()
+    for raw in splitter.finish():
+        line_no += 1
+        parse(line_no, raw)
+    if pending:
+        await flush()
+    if results:
+        yield "".join(results)
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose body generator still reads the request body.
+
+    StreamingResponse normally listens for the client disconnecting by
+    calling receive() alongside the generator, which would race the
+    generator's own receive() calls for body chunks. Here the generator
+    notices a disconnect itself: ``request.stream()`` raises ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/orders/bulk")
+async def bulk_orders(request: Request,
+                      chunk_size: int = Query(500, ge=1, le=5000, description="Orders stored per pipelined chunk")):
+    """
+    Accepts a stream of NDJSON orders and streams per-line results as NDJSON
+    while the body is still arriving, one stored chunk at a time, so memory
+    stays flat for any request size. Clients sending large bodies should read
+    the response as they upload.
+    """
+    return _DuplexStreamingResponse(_process_bulk_body(request, chunk_size), media_type="application/x-ndjson")
@@ -0,0 +1,126 @@
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app.logutil import get_logger
+from app.services import storage
+from app.services.processor import validate_order
+
+logger = get_logger(__name__)
+
+# Default bytes per chunk handed to a worker process.
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def line_aligned_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """
+    Splits an NDJSON file into (start, end) byte ranges of roughly
+    ``chunk_size`` bytes, each ending just after a newline (or at EOF).
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = mm.find(b"\n", end - 1)
+                end = size if newline == -1 else newline + 1
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def reduce_chunk(path: str, start: int, end: int) -> dict:
+    """
+    Validates the orders in one byte range of an NDJSON file with the same
+    rules as ``processor.validate_order`` and reduces them locally.
+
+    Returns a dict with per-user ``users`` totals (user_id -> [order_count,
+    total_spend]), the global ``orders``/``revenue``, the ``invalid``
+    (order, reason) pairs and the number of undecodable ``bad_lines``.
+    """
+    users = {}
+    invalid = []
+    orders = 0
+    revenue = 0.0
+    bad_lines = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = start
+        while position < end:
+            newline = mm.find(b"\n", position, end)
+            line_end = end if newline == -1 else newline
+            line = mm[position:line_end].strip()
+            position = line_end + 1
+            if not line:
+                continue
+            try:
+                order = json.loads(line)
+            except ValueError:
+                bad_lines += 1
+                continue
+            if not isinstance(order, dict):
+                bad_lines += 1
+                continue
+            try:
+                is_valid, reason = validate_order(order)
+            except Exception as e:
+                # One malformed order must not abort the whole backfill
+                is_valid, reason = False, f"Validation error: {e}"
+            if not is_valid:
+                invalid.append((order, reason))
+                continue
+            user_id = str(order["user_id"])
+            totals = users.get(user_id)
+            if totals is None:
+                totals = users[user_id] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += order["order_value"]
+            orders += 1
+            revenue += order["order_value"]
+    return {"users": users, "orders": orders, "revenue": revenue, "invalid": invalid, "bad_lines": bad_lines}
+
+
+def run_backfill(path: str, workers: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Backfills aggregates from an NDJSON order archive.
+
+    Chunks are validated and reduced in parallel worker processes. Invalid
+    orders are pushed to the invalid channel in bulk as each chunk finishes;
+    the merged per-user and global totals are written once at the end with
+    large pipelines. Returns a summary of what was processed.
+    """
+    chunks = line_aligned_chunks(path, chunk_size)
+    users = {}
+    summary = {"chunks": len(chunks), "orders": 0, "revenue": 0.0, "invalid": 0, "bad_lines": 0, "users": 0}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(reduce_chunk, path, start, end) for start, end in chunks]
+        for future in futures:
+            partial = future.result()
+            for user_id, (order_count, total_spend) in partial["users"].items():
+                totals = users.get(user_id)
+                if totals is None:
+                    users[user_id] = [order_count, total_spend]
+                else:
+                    totals[0] += order_count
+                    totals[1] += total_spend
+            summary["orders"] += partial["orders"]
+            summary["revenue"] += partial["revenue"]
+            summary["invalid"] += len(partial["invalid"])
+            summary["bad_lines"] += partial["bad_lines"]
+            if partial["invalid"] and not dry_run:
+                storage.log_invalid_orders(partial["invalid"], batch_size=batch_size)
+            logger.info("Reduced chunk: %s orders, %s invalid", partial["orders"], len(partial["invalid"]))
+
+    summary["users"] = len(users)
+    if not dry_run:
+        # Archived orders are history, not trends or recent activity
+        storage.apply_user_aggregates(users, batch_size=batch_size, trending=False, windows=False)
+        if summary["orders"]:
+            storage.update_global_stats(summary["revenue"], order_count=summary["orders"])
+    return summary
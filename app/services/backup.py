@@ -0,0 +1,440 @@
+"""Binary snapshots of the aggregate state, for fast rebuilds after data loss.
+
+A snapshot holds every user's totals, the summed global stats and the
+spend, orders and trending leaderboards. Users are stored logically (id,
+order count, spend), so a snapshot taken in one user stats layout restores
+into either, and partitioned deployments restore each user onto the node
+the ring assigns it.
+
+File layout (little-endian):
+
+    header  "<4sHd"   magic b"OSNP", format version, created_at (Unix time)
+    chunk   "<BBIII"  kind, board (BOARDS index, board chunks only), record count,
+                      raw length, payload length
+            payload   zlib-compressed records
+    ...
+    end     a chunk of kind CHUNK_END with no payload
+
+Record encodings by chunk kind:
+
+    CHUNK_USERS   per user: "<H" id length, id (UTF-8), "<qd" order count, spend
+    CHUNK_GLOBAL  one "<qd" record: total orders, total revenue
+    CHUNK_BOARD   per member: "<H" id length, id, "<d" score
+
+Chunks carry their record count and length, so a reader can walk them and
+summarize a file from the headers alone; ``SnapshotReader`` does this over
+an mmap of the file and only decompresses the chunks it is asked for.
+Trending scores are stored decayed to ``created_at`` and restored on a
+fresh epoch equal to it, so they keep decaying from where they were.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from app.logutil import get_logger
+from app.services import export, storage
+
+logger = get_logger(__name__)
+
+MAGIC = b"OSNP"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHd")
+_CHUNK = struct.Struct("<BBIII")
+_ID_LEN = struct.Struct("<H")
+_USER = struct.Struct("<qd")
+_SCORE = struct.Struct("<d")
+
+CHUNK_END = 0
+CHUNK_USERS = 1
+CHUNK_GLOBAL = 2
+CHUNK_BOARD = 3
+
+# Leaderboards in a snapshot, by index: (name, key).
+BOARDS = (
+    ("spend", storage.LEADERBOARD_SPEND),
+    ("orders", storage.LEADERBOARD_ORDERS),
+    ("trending", storage.LEADERBOARD_TRENDING),
+)
+
+# Records per chunk: big enough to compress well, small enough to stream.
+CHUNK_RECORDS = 50_000
+
+
+class SnapshotStats:
+    """Counts what a dump or restore handled and reports the throughput."""
+
+    def __init__(self):
+        self.users = 0
+        self.board_entries = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def users_per_sec(self) -> float:
+        return self.users / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _pack_id(user_id: str) -> bytes:
+    raw = user_id.encode("utf-8")
+    return _ID_LEN.pack(len(raw)) + raw
+
+
+def _unpack_id(buf, offset: int) -> tuple:
+    (length,) = _ID_LEN.unpack_from(buf, offset)
+    offset += _ID_LEN.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+
+class SnapshotWriter:
+    """Streams records into a snapshot file, one compressed chunk at a time."""
+
+    def __init__(self, fileobj, created_at: float | None = None):
+        self.file = fileobj
+        self.created_at = created_at if created_at is not None else time.time()
+        self.bytes = _HEADER.size
+        fileobj.write(_HEADER.pack(MAGIC, FORMAT_VERSION, self.created_at))
+
+    def _chunk(self, kind: int, count: int, raw: bytes, board: int = 0):
+        payload = zlib.compress(raw, 1) if raw else b""
+        self.file.write(_CHUNK.pack(kind, board, count, len(raw), len(payload)))
+        self.file.write(payload)
+        self.bytes += _CHUNK.size + len(payload)
+
+    def write_users(self, rows: list):
+        """Writes ``(user_id, order_count, total_spend)`` rows."""
+        for start in range(0, len(rows), CHUNK_RECORDS):
+            part = rows[start:start + CHUNK_RECORDS]
+            raw = b"".join(_pack_id(user_id) + _USER.pack(count, spend) for user_id, count, spend in part)
+            self._chunk(CHUNK_USERS, len(part), raw)
+
+    def write_global(self, total_orders: int, total_revenue: float):
+        self._chunk(CHUNK_GLOBAL, 1, _USER.pack(total_orders, total_revenue))
+
+    def write_board(self, board: int, entries: list):
+        """Writes ``(user_id, score)`` entries of leaderboard ``BOARDS[board]``."""
+        for start in range(0, len(entries), CHUNK_RECORDS):
+            part = entries[start:start + CHUNK_RECORDS]
+            raw = b"".join(_pack_id(user_id) + _SCORE.pack(score) for user_id, score in part)
+            self._chunk(CHUNK_BOARD, len(part), raw, board)
+
+    def close(self):
+        self._chunk(CHUNK_END, 0, b"")
+
+
+class SnapshotReader:
+    """
+    Reads a snapshot through a read-only mmap. ``chunks()`` walks the chunk
+    headers without touching payloads; the ``iter_*`` methods decompress one
+    chunk at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty, not a snapshot.") from None
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a snapshot file.")
+        magic, version, self.created_at = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a snapshot file.")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot version {version} (this build reads {FORMAT_VERSION}).")
+        self.version = version
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def chunks(self):
+        """Yields ``(kind, board, count, payload offset, payload length)`` per chunk, excluding the end marker."""
+        offset = _HEADER.size
+        while True:
+            if offset + _CHUNK.size > len(self._map):
+                raise ValueError(f"{self.path} is truncated.")
+            kind, board, count, _, length = _CHUNK.unpack_from(self._map, offset)
+            offset += _CHUNK.size
+            if kind == CHUNK_END:
+                return
+            yield kind, board, count, offset, length
+            offset += length
+
+    def _records(self, kind: int):
+        for chunk_kind, board, count, offset, length in self.chunks():
+            if chunk_kind == kind:
+                yield board, count, zlib.decompress(self._map[offset:offset + length])
+
+    def summary(self) -> dict:
+        """Counts records per section from the chunk headers alone."""
+        summary = {"version": self.version, "created_at": self.created_at, "bytes": self.size,
+                   "chunks": 0, "users": 0, "boards": {name: 0 for name, _ in BOARDS}}
+        for kind, board, count, _, _ in self.chunks():
+            summary["chunks"] += 1
+            if kind == CHUNK_USERS:
+                summary["users"] += count
+            elif kind == CHUNK_BOARD:
+                summary["boards"][BOARDS[board][0]] += count
+        return summary
+
+    def iter_users(self):
+        """Yields batches of ``(user_id, order_count, total_spend)`` rows, one per chunk."""
+        for _, count, raw in self._records(CHUNK_USERS):
+            rows = []
+            offset = 0
+            for _ in range(count):
+                user_id, offset = _unpack_id(raw, offset)
+                order_count, spend = _USER.unpack_from(raw, offset)
+                offset += _USER.size
+                rows.append((user_id, order_count, spend))
+            yield rows
+
+    def read_global(self) -> tuple:
+        """Returns ``(total_orders, total_revenue)``."""
+        for _, _, raw in self._records(CHUNK_GLOBAL):
+            return _USER.unpack(raw)
+        return 0, 0.0
+
+    def iter_boards(self):
+        """Yields ``(board index, [(user_id, score), ...])`` per chunk."""
+        for board, count, raw in self._records(CHUNK_BOARD):
+            offset = 0
+            entries = []
+            for _ in range(count):
+                user_id, offset = _unpack_id(raw, offset)
+                (score,) = _SCORE.unpack_from(raw, offset)
+                offset += _SCORE.size
+                entries.append((user_id, score))
+            yield board, entries
+
+    def find_user(self, user_id: str) -> tuple | None:
+        """Scans the user chunks for one user; returns ``(order_count, total_spend)`` or None."""
+        for rows in self.iter_users():
+            for row_id, order_count, spend in rows:
+                if row_id == user_id:
+                    return order_count, spend
+        return None
+
+
+def _scan_board(client, board: int, now: float, scan_count: int):
+    """Yields batches of ``(user_id, score)`` of one board on one node, trending scores decayed to ``now``."""
+    key = BOARDS[board][1]
+    factor = 1.0
+    if key == storage.LEADERBOARD_TRENDING:
+        epoch = client.get(storage.LEADERBOARD_TRENDING_EPOCH)
+        if epoch is None:
+            return
+        factor = math.exp(-storage.trending_lambda() * (now - float(epoch)))
+    batch = []
+    for user_id, score in client.zscan_iter(key, count=scan_count):
+        batch.append((user_id, score * factor))
+        if len(batch) >= CHUNK_RECORDS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dump(path: str, segments: int = 4, scan_count: int = 5000) -> SnapshotStats:
+    """
+    Writes a snapshot of the aggregates to ``path``. User rows are read with
+    the export's parallel segments and written as they arrive; the file is
+    written under a temporary name and renamed when complete.
+    """
+    stats = SnapshotStats()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        writer = SnapshotWriter(f)
+        for batch in export.iter_user_stats_batches(segments=segments, scan_count=scan_count):
+            writer.write_users([(row["user_id"], row["order_count"], row["total_spend"]) for row in batch])
+            stats.users += len(batch)
+        global_stats = storage.get_global_stats()
+        writer.write_global(global_stats["total_orders"], global_stats["total_revenue"])
+        for board in range(len(BOARDS)):
+            for client in storage.get_user_read_clients():
+                for entries in _scan_board(client, board, writer.created_at, scan_count):
+                    writer.write_board(board, entries)
+                    stats.board_entries += len(entries)
+        writer.close()
+        stats.bytes = writer.bytes
+    os.replace(tmp, path)
+    return stats
+
+
+def _group_by_client(user_ids) -> list:
+    """Returns ``[(client, [user_id, ...])]`` by owning node."""
+    ring = storage.get_user_ring()
+    if ring is None:
+        return [(storage.get_redis_client(), list(user_ids))]
+    return [(storage.get_node_client(node), ids) for node, ids in ring.group_by_node(user_ids).items()]
+
+
+# Runs ARGV[1] (HSET or ZADD) once per argument list in the JSON array
+# ARGV[2]. One call carries thousands of writes as a single string, which
+# saves the client encoding every argument of every command; values are sent
+# as strings so scores and spends keep their precision. Keys are built by
+# the client, so restores target standalone nodes (as partitioning does),
+# not Redis Cluster.
+_RESTORE_BATCH_LUA = """
+for _, args in ipairs(cjson.decode(ARGV[2])) do
+    redis.call(ARGV[1], unpack(args))
+end
+return 0
+"""
+
+# Writes per script call, and members per restored ZADD.
+RESTORE_BATCH = 1000
+
+
+def _run_batches(client, command: str, arg_lists: list):
+    """Applies ``command`` for each argument list, RESTORE_BATCH per script call, in one pipeline."""
+    with client.pipeline(transaction=False) as pipe:
+        script = pipe.register_script(_RESTORE_BATCH_LUA)
+        for start in range(0, len(arg_lists), RESTORE_BATCH):
+            payload = json.dumps(arg_lists[start:start + RESTORE_BATCH], separators=(",", ":"))
+            script(keys=[], args=[command, payload], client=pipe)
+        pipe.execute()
+
+
+def _has_keys(client, pattern: str) -> bool:
+    return next(iter(client.scan_iter(match=pattern, count=10_000)), None) is not None
+
+
+def _restore_users(rows: list, clear_other_layout: bool = False):
+    """
+    Writes ``rows`` in the current user stats layout. With
+    ``clear_other_layout``, each user's entry in the other layout is removed
+    too, since reads in the bucketed layout add any legacy hash.
+    """
+    by_id = {user_id: (count, spend) for user_id, count, spend in rows}
+    for client, ids in _group_by_client(by_id):
+        if clear_other_layout:
+            if storage.user_stats_bucketed():
+                _run_batches(client, "DEL", [[f"{storage.USER_STATS_PREFIX}{user_id}" for user_id in
+                                              ids[start:start + RESTORE_BATCH]]
+                                             for start in range(0, len(ids), RESTORE_BATCH)])
+            else:
+                buckets = {}
+                for user_id in ids:
+                    buckets.setdefault(storage.user_stats_bucket_key(user_id), []).extend(
+                        storage.user_stats_bucket_fields(user_id))
+                _run_batches(client, "HDEL", [[key, *fields] for key, fields in buckets.items()])
+        if storage.user_stats_bucketed():
+            # One HSET per bucket: the users of a chunk share buckets
+            buckets = {}
+            for user_id in ids:
+                count, spend = by_id[user_id]
+                count_field, spend_field = storage.user_stats_bucket_fields(user_id)
+                buckets.setdefault(storage.user_stats_bucket_key(user_id), []).extend(
+                    (count_field, str(count), spend_field, str(storage.to_cents(spend))))
+            writes = [[key, *fields] for key, fields in buckets.items()]
+        else:
+            writes = [[f"{storage.USER_STATS_PREFIX}{user_id}", "order_count", str(by_id[user_id][0]),
+                       "total_spend", repr(by_id[user_id][1])] for user_id in ids]
+        _run_batches(client, "HSET", writes)
+
+
+def _restore_board(board: int, entries: list):
+    scores = dict(entries)
+    key = BOARDS[board][1]
+    for client, ids in _group_by_client(scores):
+        writes = []
+        for start in range(0, len(ids), RESTORE_BATCH):
+            args = [key]
+            for user_id in ids[start:start + RESTORE_BATCH]:
+                args += (repr(scores[user_id]), user_id)
+            writes.append(args)
+        _run_batches(client, "ZADD", writes)
+
+
+def restore(path: str) -> SnapshotStats:
+    """
+    Loads a snapshot into Redis, replacing the global stats and leaderboards.
+    User totals are overwritten per user (users missing from the snapshot
+    are left alone), in the current USER_STATS_LAYOUT; if any keys of the
+    other layout exist, restored users' entries there are deleted so they
+    are not counted twice. Writes are pipelined a chunk at a time.
+    """
+    stats = SnapshotStats()
+    with SnapshotReader(path) as reader:
+        stats.bytes = reader.size
+        node_clients = storage.get_user_node_clients()
+        other_layout = storage.USER_STATS_PREFIX if storage.user_stats_bucketed() else storage.USER_STATS_BUCKET_PREFIX
+        clear_other_layout = any(_has_keys(client, f"{other_layout}*") for client in node_clients)
+        for client in node_clients:
+            client.delete(*(key for _, key in BOARDS), storage.LEADERBOARD_TRENDING_EPOCH)
+        for client in node_clients:
+            client.set(storage.LEADERBOARD_TRENDING_EPOCH, repr(reader.created_at))
+
+        for rows in reader.iter_users():
+            _restore_users(rows, clear_other_layout)
+            stats.users += len(rows)
+
+        total_orders, total_revenue = reader.read_global()
+        client = storage.get_redis_client()
+        with client.pipeline(transaction=False) as pipe:
+            pipe.delete(*storage.global_stats_keys())
+            pipe.hset(storage.GLOBAL_STATS_KEY, mapping={"total_orders": total_orders, "total_revenue": total_revenue})
+            pipe.execute()
+
+        for board, entries in reader.iter_boards():
+            _restore_board(board, entries)
+            stats.board_entries += len(entries)
+    logger.info("Restored %s users and %s leaderboard entries from %s in %.2fs (%.0f users/sec).",
+                stats.users, stats.board_entries, path, stats.elapsed, stats.users_per_sec,
+                extra={"event": "backup.restored"})
+    return stats
+
+
+def write_synthetic(path: str, users: int, seed: int = 0) -> SnapshotStats:
+    """
+    Writes a snapshot of ``users`` generated users, with matching spend and
+    orders leaderboards, for measuring restore time without a live dataset.
+    """
+    import random
+
+    rng = random.Random(seed)
+    stats = SnapshotStats()
+    with open(path, "wb") as f:
+        writer = SnapshotWriter(f)
+        total_orders, total_revenue = 0, 0.0
+        for start in range(0, users, CHUNK_RECORDS):
+            rows = []
+            for i in range(start, min(start + CHUNK_RECORDS, users)):
+                count = rng.randint(1, 50)
+                rows.append((f"user_{i}", count, round(count * rng.uniform(10.0, 200.0), 2)))
+            writer.write_users(rows)
+            writer.write_board(0, [(user_id, spend) for user_id, _, spend in rows])
+            writer.write_board(1, [(user_id, count) for user_id, count, _ in rows])
+            total_orders += sum(count for _, count, _ in rows)
+            total_revenue += sum(spend for _, _, spend in rows)
+            stats.users += len(rows)
+            stats.board_entries += 2 * len(rows)
+        writer.write_global(total_orders, total_revenue)
+        writer.close()
+        stats.bytes = writer.bytes
+    return stats
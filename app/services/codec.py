@@ -0,0 +1,49 @@
+import json
+import zlib
+
+import msgpack
+
+# Stored invalid entries start with a version byte naming the format of the
+# rest. Entries written before the codec existed are plain JSON documents,
+# recognized by their leading "{".
+VERSION_MSGPACK_ZLIB = 1
+VERSION_MSGPACK_ZSTD = 2
+
+CODECS = {"zlib": VERSION_MSGPACK_ZLIB, "zstd": VERSION_MSGPACK_ZSTD}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("The zstd codec requires zstandard: pip install zstandard") from e
+    return zstandard
+
+
+def encode_entry(entry: dict, codec: str = "zlib") -> bytes:
+    """Packs an entry with msgpack and compresses it, behind a version byte."""
+    version = CODECS.get(codec)
+    if version is None:
+        raise ValueError(f"Unknown codec {codec!r}. Must be one of: {', '.join(CODECS)}.")
+    packed = msgpack.packb(entry, use_bin_type=True)
+    if version == VERSION_MSGPACK_ZSTD:
+        body = _zstd().ZstdCompressor(level=3).compress(packed)
+    else:
+        body = zlib.compress(packed, 6)
+    return bytes((version,)) + body
+
+
+def decode_entry(raw) -> dict:
+    """Decodes an entry written by ``encode_entry`` or a legacy JSON document."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    version, body = raw[0], raw[1:]
+    if version == VERSION_MSGPACK_ZLIB:
+        packed = zlib.decompress(body)
+    elif version == VERSION_MSGPACK_ZSTD:
+        packed = _zstd().ZstdDecompressor().decompress(body)
+    else:
+        raise ValueError(f"Unknown entry version {version}")
+    return msgpack.unpackb(packed, raw=False)
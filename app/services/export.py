@@ -0,0 +1,238 @@
+import csv
+import io
+import json
+import queue
+import threading
+import time
+
+from app.services import storage
+
+# Fields of every exported row, in column order.
+EXPORT_FIELDS = ("user_id", "order_count", "total_spend")
+
+# Buckets fetched per pipeline when reading the bucketed layout.
+BUCKETS_PER_PIPELINE = 256
+
+
+class ExportStats:
+    """Counts exported rows and reports the throughput."""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class _SharedScan:
+    """
+    One SCAN over a node shared by several readers. Each ``next_keys()`` call
+    advances the cursor under a lock and returns the next batch of keys, or
+    None once the scan is complete, so readers split the keyspace without
+    walking it more than once.
+    """
+
+    def __init__(self, client, match: str, count: int):
+        self.client = client
+        self.match = match
+        self.count = count
+        self._cursor = 0
+        self._done = False
+        self._lock = threading.Lock()
+
+    def next_keys(self) -> list | None:
+        with self._lock:
+            if self._done:
+                return None
+            self._cursor, keys = self.client.scan(self._cursor, match=self.match, count=self.count)
+            self._done = self._cursor == 0
+            return keys
+
+
+def _scan_legacy_hashes(client, scan: _SharedScan):
+    """
+    Yields batches of rows for the ``user:{id}`` hashes on one node: keys come
+    from a (shared) cursor-based SCAN with a large COUNT, and each batch is
+    read with one pipelined HMGET per key. In the bucketed layout, users
+    already present in a bucket are skipped because the bucket segment
+    exports them (including the legacy part).
+    """
+    prefix = storage.USER_STATS_PREFIX
+    bucketed = storage.user_stats_bucketed()
+    while True:
+        keys = scan.next_keys()
+        if keys is None:
+            break
+        if keys:
+            user_ids = [key[len(prefix):] for key in keys]
+            with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hmget(key, "order_count", "total_spend")
+                if bucketed:
+                    for user_id in user_ids:
+                        count_field, _ = storage.user_stats_bucket_fields(user_id)
+                        pipe.hexists(storage.user_stats_bucket_key(user_id), count_field)
+                replies = pipe.execute()
+            rows = []
+            for i, user_id in enumerate(user_ids):
+                if bucketed and replies[len(keys) + i]:
+                    continue
+                order_count, total_spend = replies[i]
+                rows.append({
+                    "user_id": user_id,
+                    "order_count": int(order_count or 0),
+                    "total_spend": float(total_spend or 0.0),
+                })
+            if rows:
+                yield rows
+
+
+def _read_buckets(client, start: int, stop: int):
+    """
+    Yields batches of rows for buckets ``start``..``stop - 1`` on one node.
+    Bucket keys are enumerable, so no SCAN is needed and ranges can be read
+    in parallel.
+    """
+    for first in range(start, stop, BUCKETS_PER_PIPELINE):
+        last = min(first + BUCKETS_PER_PIPELINE, stop)
+        with client.pipeline(transaction=False) as pipe:
+            for bucket in range(first, last):
+                pipe.hgetall(f"{storage.USER_STATS_BUCKET_PREFIX}{bucket}")
+            buckets = pipe.execute()
+
+        totals = {}
+        for fields in buckets:
+            for field, value in fields.items():
+                user_id, _, kind = field.rpartition(":")
+                entry = totals.setdefault(user_id, [0, 0])
+                entry[0 if kind == "c" else 1] += int(value)
+        if not totals:
+            continue
+
+        user_ids = list(totals)
+        with client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hmget(f"{storage.USER_STATS_PREFIX}{user_id}", "order_count", "total_spend")
+            legacy = pipe.execute()
+        yield [
+            {"user_id": user_id, **storage._user_stats_from_replies([legacy_reply, totals[user_id]])}
+            for user_id, legacy_reply in zip(user_ids, legacy)
+        ]
+
+
+def export_segments(segments: int = 4, scan_count: int = 5000, clients: list | None = None) -> list:
+    """
+    Splits the export into segments (callables returning batch iterators)
+    that can be read in parallel. In the hash layout each user node (or read
+    replica) gets ``segments`` readers sharing one SCAN cursor, so the HMGET
+    pipelines run in parallel. In the bucketed layout each node gets
+    ``segments`` bucket ranges plus one reader for leftover legacy hashes.
+    Pass ``clients`` to read other nodes, e.g. the primaries when replica lag
+    is not acceptable.
+    """
+    parts = []
+    buckets = storage.user_stats_bucket_count()
+    readers = 1 if storage.user_stats_bucketed() else max(1, segments)
+    for client in clients if clients is not None else storage.get_user_read_clients():
+        scan = _SharedScan(client, f"{storage.USER_STATS_PREFIX}*", scan_count)
+        parts.extend(lambda client=client, scan=scan: _scan_legacy_hashes(client, scan) for _ in range(readers))
+        if storage.user_stats_bucketed():
+            step = -(-buckets // max(1, segments))
+            for start in range(0, buckets, step):
+                stop = min(start + step, buckets)
+                parts.append(lambda client=client, start=start, stop=stop: _read_buckets(client, start, stop))
+    return parts
+
+
+def iter_user_stats_batches(segments: int = 4, scan_count: int = 5000, stats: ExportStats | None = None,
+                            clients: list | None = None):
+    """
+    Yields batches of user stats rows from all segments, read in parallel
+    threads. A bounded queue keeps memory constant regardless of user count.
+    """
+    parts = export_segments(segments, scan_count, clients)
+    batches = queue.Queue(maxsize=len(parts) * 2)
+    done = object()
+    stop = threading.Event()
+
+    def run(part):
+        try:
+            for batch in part():
+                if stop.is_set():
+                    return
+                batches.put(batch)
+        except Exception as e:
+            batches.put(e)
+        finally:
+            batches.put(done)
+
+    threads = [threading.Thread(target=run, args=(part,), daemon=True) for part in parts]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = batches.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                if stats is not None:
+                    stats.rows += len(item)
+                yield item
+    finally:
+        # Unblock producers if the consumer stopped early
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def iter_ndjson(batches):
+    """Encodes row batches as NDJSON text chunks, one chunk per batch."""
+    for batch in batches:
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+
+def iter_csv(batches):
+    """Encodes row batches as CSV text chunks, starting with the header."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_parquet(batches, path: str):
+    """
+    Writes row batches to a Parquet file, one row group per batch.
+    Requires ``pyarrow``.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ("user_id", pa.string()),
+        ("order_count", pa.int64()),
+        ("total_spend", pa.float64()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
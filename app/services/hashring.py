@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping keys onto a fixed list of nodes.
+
+    Every node is placed on the ring ``replicas`` times (virtual nodes) so keys
+    spread evenly, and adding or removing a node only moves the keys that hashed
+    to its points instead of reshuffling everything.
+    """
+
+    def __init__(self, nodes: list, replicas: int = 160):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node.")
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        points = []
+        for node in self.nodes:
+            for i in range(replicas):
+                points.append((self._hash(f"{node}#{i}"), node))
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key: str):
+        """Returns the node owning ``key``: the first ring point clockwise of its hash."""
+        index = bisect.bisect(self._points, self._hash(key))
+        if index == len(self._points):
+            index = 0
+        return self._owners[index]
+
+    def group_by_node(self, keys) -> dict:
+        """Groups ``keys`` by owning node, preserving their order within each node."""
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.get_node(key), []).append(key)
+        return groups
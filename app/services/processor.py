@@ -32,7 +32,7 @@ def validate_order(order: dict) -> (bool, str | None):
             # Use a tolerance for floating-point comparisons
             if not math.isclose(calculated_total, order_value, rel_tol=1e-2):
                 return False, f"Calculated total ({calculated_total}) does not match order_value ({order_value})"
-        except (TypeError, KeyError):
+        except (TypeError, KeyError, AttributeError):
             return False, "Invalid structure in 'items' list"
 
     return True, None
@@ -52,3 +52,60 @@ def process_order(order: dict):
         storage.update_global_stats(order["order_value"])
     else:
         storage.log_invalid_order(order, reason)
+
+
+class StoreOrdersError(Exception):
+    """
+    Raised by ``store_orders`` when a write fails part-way.
+
+    ``completed`` lists the stages ("invalid", "users", "global") that were
+    fully written before ``failed_stage`` raised; the failed stage itself may
+    be partially applied.
+    """
+
+    def __init__(self, completed: list, failed_stage: str):
+        super().__init__(f"Storing orders failed at stage '{failed_stage}' after {completed or 'no stages'}")
+        self.completed = completed
+        self.failed_stage = failed_stage
+
+
+def store_orders(validated: list):
+    """
+    Writes already-validated orders in bulk.
+
+    Args:
+        validated: A list of (order, is_valid, reason) tuples, as produced by
+            ``validate_order``.
+
+    Invalid orders are logged to the invalid channel in one go, then valid
+    orders are reduced per user and written with pipelined bulk updates,
+    then the global totals. Raises StoreOrdersError naming the completed
+    stages if a write fails.
+    """
+    users = {}
+    revenue = 0.0
+    valid_count = 0
+    invalid = []
+    for order, is_valid, reason in validated:
+        if not is_valid:
+            invalid.append((order, reason))
+            continue
+        totals = users.setdefault(str(order["user_id"]), [0, 0.0])
+        totals[0] += 1
+        totals[1] += order["order_value"]
+        revenue += order["order_value"]
+        valid_count += 1
+
+    stages = []
+    if invalid:
+        stages.append(("invalid", lambda: storage.log_invalid_orders(invalid)))
+    if users:
+        stages.append(("users", lambda: storage.apply_user_aggregates(users)))
+        stages.append(("global", lambda: storage.update_global_stats(revenue, order_count=valid_count)))
+    completed = []
+    for stage, write in stages:
+        try:
+            write()
+        except Exception as e:
+            raise StoreOrdersError(completed, stage) from e
+        completed.append(stage)
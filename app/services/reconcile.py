@@ -0,0 +1,198 @@
+"""Reconciles the spend and orders leaderboards with the user totals.
+
+``update_user_stats`` increments a user's totals and ZADDs the read-back
+values in a second round trip, so concurrent workers can land their ZADDs
+out of order and leave a leaderboard score behind the user's totals. Every
+user is read from the primaries with the export's parallel segments
+(SCAN + pipelined HMGET, or bucket ranges), and each batch is compared with
+one ZMSCORE per board.
+
+- ``reconcile`` reports the drift and, with ``fix=True``, repairs it with
+  ``ZADD GT``. Totals only grow, so GT can never replace a newer score
+  written by a worker while the job runs.
+- ``rebuild`` builds fresh leaderboards under temporary keys, RENAMEs them
+  over the live ones in one transaction per node, and then runs a fix pass
+  for users updated while it was building.
+
+The trending board is decayed over time rather than derived from totals,
+so it is left alone.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.logutil import get_logger
+from app.services import export, storage
+
+logger = get_logger(__name__)
+
+# (board name, leaderboard key, user stats field)
+BOARDS = (
+    ("spend", storage.LEADERBOARD_SPEND, "total_spend"),
+    ("orders", storage.LEADERBOARD_ORDERS, "order_count"),
+)
+
+# Spend differences below half a cent are float noise, not drift.
+SPEND_TOLERANCE = 0.005
+
+REBUILD_SUFFIX = ":rebuild"
+
+
+class DriftStats:
+    """
+    Counts checked users and, per board, entries that were missing, behind
+    or ahead of the user's totals. "Ahead" usually means the user was
+    updated between the read of the totals and the read of the score.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.fixed = 0
+        self.boards = {name: {"missing": 0, "behind": 0, "ahead": 0, "max_drift": 0.0, "total_drift": 0.0}
+                       for name, _, _ in BOARDS}
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def users_per_sec(self) -> float:
+        return self.users / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def drifted(self) -> int:
+        return sum(board["missing"] + board["behind"] + board["ahead"] for board in self.boards.values())
+
+    def merge(self, other: "DriftStats"):
+        self.users += other.users
+        self.fixed += other.fixed
+        for name, counts in other.boards.items():
+            mine = self.boards[name]
+            for field in ("missing", "behind", "ahead", "total_drift"):
+                mine[field] += counts[field]
+            mine["max_drift"] = max(mine["max_drift"], counts["max_drift"])
+
+    def as_dict(self) -> dict:
+        return {"users": self.users, "drifted": self.drifted, "fixed": self.fixed, "boards": self.boards,
+                "elapsed": round(self.elapsed, 3), "users_per_sec": round(self.users_per_sec, 1)}
+
+
+def _group_rows(rows: list) -> list:
+    """Returns ``[(primary client, rows)]`` by the node holding each user."""
+    ring = storage.get_user_ring()
+    if ring is None:
+        return [(storage.get_redis_client(), rows)]
+    by_id = {row["user_id"]: row for row in rows}
+    return [(storage.get_node_client(node), [by_id[user_id] for user_id in ids])
+            for node, ids in ring.group_by_node(by_id).items()]
+
+
+def _check_batch(rows: list, fix: bool) -> DriftStats:
+    """Diffs one batch of user rows against the leaderboards, fixing behind or missing scores if asked."""
+    stats = DriftStats()
+    stats.users = len(rows)
+    for client, node_rows in _group_rows(rows):
+        ids = [row["user_id"] for row in node_rows]
+        with client.pipeline(transaction=False) as pipe:
+            for _, key, _ in BOARDS:
+                pipe.zmscore(key, ids)
+            replies = pipe.execute()
+        updates = {}
+        for (name, key, field), scores in zip(BOARDS, replies):
+            counts = stats.boards[name]
+            tolerance = SPEND_TOLERANCE if name == "spend" else 0
+            for row, score in zip(node_rows, scores):
+                expected = row[field]
+                if score is None:
+                    counts["missing"] += 1
+                    drift = abs(expected)
+                elif expected - score > tolerance:
+                    counts["behind"] += 1
+                    drift = expected - score
+                elif score - expected > tolerance:
+                    counts["ahead"] += 1
+                    continue
+                else:
+                    continue
+                counts["total_drift"] += drift
+                counts["max_drift"] = max(counts["max_drift"], drift)
+                updates.setdefault(key, {})[row["user_id"]] = expected
+        if fix and updates:
+            with client.pipeline(transaction=False) as pipe:
+                for key, mapping in updates.items():
+                    pipe.zadd(key, mapping, gt=True)
+                pipe.execute()
+            stats.fixed += sum(len(mapping) for mapping in updates.values())
+    return stats
+
+
+def reconcile(fix: bool = False, segments: int = 4, scan_count: int = 5000) -> DriftStats:
+    """
+    Compares every user's totals with their leaderboard scores and returns
+    the drift found. Batches are checked by ``segments`` threads while the
+    export threads keep reading. With ``fix``, behind and missing scores are
+    raised to the user's totals.
+    """
+    stats = DriftStats()
+    batches = export.iter_user_stats_batches(segments=segments, scan_count=scan_count,
+                                             clients=storage.get_user_node_clients())
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, segments), thread_name_prefix="reconcile") as pool:
+        for rows in batches:
+            pending.append(pool.submit(_check_batch, rows, fix))
+            # Bound the batches in flight so memory stays flat
+            while len(pending) > 2 * max(1, segments):
+                stats.merge(pending.popleft().result())
+        while pending:
+            stats.merge(pending.popleft().result())
+    logger.info("Reconciled %s users in %.2fs (%.0f users/sec): %s drifted, %s fixed",
+                stats.users, stats.elapsed, stats.users_per_sec, stats.drifted, stats.fixed,
+                extra={"event": "reconcile.done"})
+    return stats
+
+
+def rebuild(segments: int = 4, scan_count: int = 5000) -> dict:
+    """
+    Rebuilds the spend and orders leaderboards from the user totals into
+    ``{key}:rebuild`` keys and RENAMEs them over the live keys, both boards in
+    one MULTI per node. A fix pass then raises the scores of users updated
+    during the build. Returns the per-node member counts before and after,
+    the users written, and the fix pass' stats.
+    """
+    started = time.monotonic()
+    clients = storage.get_user_node_clients()
+    for client in clients:
+        client.delete(*(key + REBUILD_SUFFIX for _, key, _ in BOARDS))
+    before = [{name: client.zcard(key) for name, key, _ in BOARDS} for client in clients]
+
+    users = 0
+    for rows in export.iter_user_stats_batches(segments=segments, scan_count=scan_count, clients=clients):
+        for client, node_rows in _group_rows(rows):
+            with client.pipeline(transaction=False) as pipe:
+                for _, key, field in BOARDS:
+                    pipe.zadd(key + REBUILD_SUFFIX, {row["user_id"]: row[field] for row in node_rows})
+                pipe.execute()
+        users += len(rows)
+
+    for client in clients:
+        with client.pipeline(transaction=True) as pipe:
+            for _, key, _ in BOARDS:
+                pipe.exists(key + REBUILD_SUFFIX)
+            built = pipe.execute()
+        with client.pipeline(transaction=True) as pipe:
+            for (_, key, _), exists in zip(BOARDS, built):
+                if exists:
+                    pipe.rename(key + REBUILD_SUFFIX, key)
+                else:
+                    # No users on this node: the board should be empty too
+                    pipe.delete(key)
+            pipe.execute()
+    after = [{name: client.zcard(key) for name, key, _ in BOARDS} for client in clients]
+    elapsed = time.monotonic() - started
+    logger.info("Rebuilt leaderboards from %s users in %.2fs (%.0f users/sec)", users, elapsed,
+                users / elapsed if elapsed > 0 else 0.0, extra={"event": "reconcile.rebuilt"})
+
+    catch_up = reconcile(fix=True, segments=segments, scan_count=scan_count)
+    return {"users": users, "elapsed": round(elapsed, 3), "before": before, "after": after,
+            "catch_up": catch_up.as_dict()}
@@ -0,0 +1,109 @@
+import itertools
+import math
+import threading
+import time
+
+import redis
+
+from app.logutil import get_logger
+
+logger = get_logger(__name__)
+
+# Written to the primary by every health check and read back from replicas.
+HEARTBEAT_KEY = "replication:heartbeat"
+
+
+class ReplicaRouter:
+    """
+    Spreads reads over read replicas round-robin, skipping replicas that fail
+    their health check or lag the primary by more than ``max_lag`` seconds.
+    With no usable replica, reads go to the primary.
+
+    Health is checked at most every ``check_interval`` seconds, by the first
+    caller that finds a check due (others keep using the last result). A check
+    writes the current time to HEARTBEAT_KEY on the primary and reads it back
+    from each replica: a replica's lag is the age of the heartbeat it returns,
+    measured to within one check interval.
+    """
+
+    def __init__(self, primary, replicas: dict, max_lag: float = 5.0, check_interval: float = 1.0,
+                 clock=time.time):
+        self.primary = primary
+        self.replicas = dict(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = {name: None for name in self.replicas}
+        self._clock = clock
+        self._healthy = []
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+
+    @property
+    def healthy(self) -> list:
+        return list(self._healthy)
+
+    def check(self) -> list:
+        """Runs a health check now and returns the names of the usable replicas."""
+        now = self._clock()
+        try:
+            self.primary.set(HEARTBEAT_KEY, repr(now))
+        except redis.RedisError as e:
+            logger.warning("Could not write the replication heartbeat: %s", e)
+        healthy = []
+        for name, client in self.replicas.items():
+            try:
+                value = client.get(HEARTBEAT_KEY)
+            except redis.RedisError as e:
+                self.lag[name] = None
+                if name in self._healthy:
+                    logger.warning("Read replica %s failed its health check: %s", name, e)
+                continue
+            # A replica that has not applied this check's heartbeat yet reports the previous one
+            lag = math.inf if value is None else max(0.0, now - float(value))
+            self.lag[name] = lag
+            if lag <= self.max_lag:
+                healthy.append(name)
+                if name not in self._healthy:
+                    logger.info("Read replica %s is in service (lag %.1fs).", name, lag)
+            elif name in self._healthy:
+                logger.warning("Read replica %s is %.1fs behind; taking it out of service.", name, lag)
+        self._healthy = healthy
+        return list(healthy)
+
+    def _maybe_check(self):
+        if self._clock() < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = self._clock() + self.check_interval
+            self.check()
+        finally:
+            self._lock.release()
+
+    def pick(self) -> tuple:
+        """Returns ``(name, client)`` of the next replica to read from, or ``(None, primary)``."""
+        self._maybe_check()
+        healthy = self._healthy
+        if not healthy:
+            return None, self.primary
+        name = healthy[next(self._turn) % len(healthy)]
+        return name, self.replicas[name]
+
+    def client(self):
+        return self.pick()[1]
+
+    def read(self, fn):
+        """
+        Runs ``fn(client)`` on the next replica. If the replica cannot be
+        reached it is taken out of service until the next check and ``fn`` is
+        retried on the primary.
+        """
+        name, client = self.pick()
+        if name is None:
+            return fn(client)
+        try:
+            return fn(client)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning("Read replica %s failed (%s); retrying on the primary.", name, e)
+            self._healthy = [other for other in self._healthy if other != name]
+            return fn(self.primary)
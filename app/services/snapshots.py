@@ -0,0 +1,98 @@
+import json
+import time
+
+from app.config import settings
+from app.logutil import get_logger
+from app.services import storage
+
+logger = get_logger(__name__)
+
+# Entries kept per snapshot: the most the top-users endpoint can return.
+SNAPSHOT_SIZE = 100
+
+# Leaderboards that are materialized.
+SNAPSHOT_BOARDS = ("spend", "orders")
+
+
+def snapshot_key(by: str) -> str:
+    return f"leaderboard:{by}:snapshot"
+
+
+def materialize_snapshots() -> dict:
+    """
+    Writes the top SNAPSHOT_SIZE entries of each leaderboard to a single key
+    on the primary. The value is the materialization time followed by one
+    pre-serialized JSON entry per line, so reads only slice and join bytes.
+    Keys expire after LEADERBOARD_SNAPSHOT_TTL seconds, so readers fall back
+    to the live leaderboard if the materializer stops. Returns the number of
+    entries written per board.
+    """
+    now = time.time()
+    payloads = {}
+    for by in SNAPSHOT_BOARDS:
+        users = storage.get_top_users(by, SNAPSHOT_SIZE)
+        payloads[by] = "\n".join([repr(now)] + [json.dumps(user, separators=(",", ":")) for user in users])
+    ttl = max(1, int(settings.leaderboard_snapshot_ttl))
+    with storage.get_redis_client().pipeline(transaction=False) as pipe:
+        for by, payload in payloads.items():
+            pipe.set(snapshot_key(by), payload, ex=ttl)
+        pipe.execute()
+    return {by: payload.count("\n") for by, payload in payloads.items()}
+
+
+def read_top_users(by: str, n: int, offset: int = 0) -> tuple | None:
+    """
+    Returns ``(body, age_seconds)`` for the top-users response served from the
+    snapshot, or None when there is no snapshot or the requested range does
+    not fit in it. ``body`` is the same JSON document the live path returns.
+    """
+    if by not in SNAPSHOT_BOARDS:
+        return None
+    payload = storage.read_with_replicas(lambda client: client.get(snapshot_key(by)))
+    if payload is None:
+        return None
+    lines = payload.split("\n")
+    entries = lines[1:]
+    # A snapshot shorter than SNAPSHOT_SIZE holds the whole leaderboard
+    if offset + n > len(entries) and len(entries) == SNAPSHOT_SIZE:
+        return None
+    body = '{"by":%s,"n":%d,"offset":%d,"users":[%s]}' % (
+        json.dumps(by), n, offset, ",".join(entries[offset:offset + n]))
+    return body, max(0.0, time.time() - float(lines[0]))
+
+
+class SnapshotMaterializer:
+    """
+    Decides when to re-materialize the leaderboard snapshots: after
+    ``every_updates`` recorded updates or ``interval`` seconds, whichever
+    comes first. Either trigger is disabled with 0.
+    """
+
+    def __init__(self, interval: float = 5.0, every_updates: int = 1000, clock=time.monotonic):
+        self.interval = interval
+        self.every_updates = every_updates
+        self._clock = clock
+        self._updates = 0
+        self._last = None
+
+    def record_updates(self, count: int):
+        self._updates += count
+
+    def due(self) -> bool:
+        if self._last is None:
+            return True
+        if self.every_updates and self._updates >= self.every_updates:
+            return True
+        return bool(self.interval) and self._clock() - self._last >= self.interval
+
+    def maybe_materialize(self) -> bool:
+        """Materializes the snapshots if due; returns True if it did."""
+        if not self.due():
+            return False
+        started = time.monotonic()
+        counts = materialize_snapshots()
+        self._updates = 0
+        self._last = self._clock()
+        logger.info("Materialized leaderboard snapshots %s in %.1fms", counts,
+                    (time.monotonic() - started) * 1000, extra={"event": "snapshots.materialized"})
+        return True
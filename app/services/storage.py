@@ -1,119 +1,1046 @@
 import redis
+import heapq
 import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 from app.config import settings
+from app.logutil import get_logger
+from app.services import codec
+from app.services.hashring import HashRing
+from app.services.replicas import ReplicaRouter
+
+logger = get_logger(__name__)
 
 # --- Redis Client ---
-# Use a connection pool for efficient connection management.
-redis_pool = redis.ConnectionPool(
-    host=settings.redis_host,
-    port=settings.redis_port,
-    db=0,
-    decode_responses=True
-)
+# Use a connection pool for efficient connection management. The pool is
+# created on first use (not at import) and can be pre-warmed with warm_up().
+_redis_pool = None
+_redis_pool_lock = threading.Lock()
+
+def get_redis_pool():
+    """Returns the primary connection pool, creating it on first use."""
+    global _redis_pool
+    if _redis_pool is None:
+        with _redis_pool_lock:
+            if _redis_pool is None:
+                _redis_pool = redis.ConnectionPool(
+                    host=settings.redis_host,
+                    port=settings.redis_port,
+                    db=0,
+                    decode_responses=True
+                )
+    return _redis_pool
+
+def __getattr__(name):
+    # Keeps ``storage.redis_pool`` working for callers while the pool is lazy
+    if name == "redis_pool":
+        return get_redis_pool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_redis_client():
     """Returns a Redis client from the connection pool."""
-    return redis.Redis(connection_pool=redis_pool)
+    return redis.Redis(connection_pool=get_redis_pool())
+
+def warm_up():
+    """
+    Opens a connection to the primary and every partition node ahead of the
+    first request, so cold starts don't pay connection setup on the hot path.
+    Failures are logged, not raised: the pools retry on first real use.
+    """
+    started = time.monotonic()
+    clients = [get_redis_client()]
+    if get_user_ring() is not None:
+        clients += get_user_node_clients()
+    router = get_replica_router()
+    if router is not None:
+        clients += router.replicas.values()
+    for client in clients:
+        try:
+            client.ping()
+        except redis.RedisError as e:
+            logger.warning("Redis warm-up failed: %s", e)
+            return
+    logger.info("Redis connections warmed up in %.1fms", (time.monotonic() - started) * 1000)
+
+# --- Read Replicas ---
+# When REDIS_REPLICAS lists "host:port" replicas of the primary, the read
+# functions below (used by the API's GET routes) are spread over them by a
+# ReplicaRouter, which falls back to the primary for replicas that are down
+# or more than REPLICA_MAX_LAG seconds behind. Writes always go to the primary.
+# Partition nodes (REDIS_NODES) are always read directly.
+_replica_pools = {}
+_replica_router = None
+
+def get_replica_client(node: str):
+    """Returns a client for one "host:port" read replica."""
+    pool = _replica_pools.get(node)
+    if pool is None:
+        host, _, port = node.rpartition(":")
+        # A short connect timeout keeps a dead replica from stalling health checks
+        pool = redis.ConnectionPool(host=host, port=int(port), db=0, decode_responses=True,
+                                    socket_connect_timeout=1.0)
+        _replica_pools[node] = pool
+    return redis.Redis(connection_pool=pool)
+
+def get_replica_router() -> ReplicaRouter | None:
+    """Returns the read replica router, or None when REDIS_REPLICAS is unset."""
+    global _replica_router
+    nodes = parse_redis_nodes(settings.redis_replicas)
+    if not nodes:
+        return None
+    if _replica_router is None or list(_replica_router.replicas) != nodes:
+        _replica_router = ReplicaRouter(
+            get_redis_client(),
+            {node: get_replica_client(node) for node in nodes},
+            max_lag=settings.replica_max_lag,
+            check_interval=settings.replica_check_interval,
+        )
+    return _replica_router
+
+def get_read_client():
+    """Returns a client for reads that tolerate replica lag: a healthy replica, else the primary."""
+    router = get_replica_router()
+    return get_redis_client() if router is None else router.client()
+
+def read_with_replicas(fn):
+    """Runs ``fn(client)`` like ``get_read_client``, retrying on the primary if the replica fails."""
+    router = get_replica_router()
+    return fn(get_redis_client()) if router is None else router.read(fn)
+
+# --- User Partitioning ---
+# When REDIS_NODES lists several "host:port" entries, user hashes and their
+# partial leaderboards are spread over those nodes with a consistent-hash ring.
+# Global stats and invalid orders stay on the primary (REDIS_HOST/REDIS_PORT).
+_node_pools = {}
+_user_ring = None
+_scatter_executor = None
+
+def parse_redis_nodes(spec: str) -> list:
+    """Parses a comma-separated "host:port" list, ignoring blank entries."""
+    return [node.strip() for node in spec.split(",") if node.strip()]
+
+def get_user_ring() -> HashRing | None:
+    """Returns the user partitioning ring, or None when REDIS_NODES is unset."""
+    global _user_ring
+    nodes = parse_redis_nodes(settings.redis_nodes)
+    if not nodes:
+        return None
+    if _user_ring is None or _user_ring.nodes != nodes:
+        _user_ring = HashRing(nodes, replicas=settings.hash_ring_replicas)
+    return _user_ring
+
+def get_node_client(node: str):
+    """Returns a Redis client for one "host:port" partition node."""
+    pool = _node_pools.get(node)
+    if pool is None:
+        host, _, port = node.rpartition(":")
+        pool = redis.ConnectionPool(host=host, port=int(port), db=0, decode_responses=True)
+        _node_pools[node] = pool
+    return redis.Redis(connection_pool=pool)
+
+def get_user_client(user_id: str):
+    """Returns the client for the node holding ``user_id``'s aggregates."""
+    ring = get_user_ring()
+    if ring is None:
+        return get_redis_client()
+    return get_node_client(ring.get_node(str(user_id)))
+
+def get_user_node_clients() -> list:
+    """Returns a client per node holding user aggregates and a (partial) leaderboard."""
+    ring = get_user_ring()
+    if ring is None:
+        return [get_redis_client()]
+    return [get_node_client(node) for node in ring.nodes]
+
+def get_user_read_clients() -> list:
+    """Like ``get_user_node_clients``, but on a read replica when the primary holds the users."""
+    if get_user_ring() is None:
+        return [get_read_client()]
+    return get_user_node_clients()
+
+def _scatter(fn, clients: list) -> list:
+    """Runs ``fn(client)`` against every client concurrently, in client order."""
+    global _scatter_executor
+    if len(clients) == 1:
+        return [fn(clients[0])]
+    if _scatter_executor is None:
+        _scatter_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="redis-scatter")
+    return list(_scatter_executor.map(fn, clients))
 
 # --- Constants for Redis Keys ---
 USER_STATS_PREFIX = "user:"
+USER_STATS_BUCKET_PREFIX = "ustats:"
 GLOBAL_STATS_KEY = "global:stats"
 INVALID_ORDERS_KEY = "invalid_orders"
 
+# --- Global Stats Sharding ---
+# Each process picks one shard for its increments so concurrent workers spread
+# their writes over GLOBAL_STATS_SHARDS keys (and cluster slots) instead of
+# all hitting ``global:stats``. Shard 0 is the legacy key itself. The pick is
+# made lazily and re-made when the pid changes, so forked workers (gunicorn
+# --preload, fork-based pools) don't all inherit the parent's shard.
+_worker_shard = {"pid": None, "value": 0}
+
+def _worker_shard_value() -> int:
+    """Returns this process' random shard seed, re-drawn after a fork."""
+    pid = os.getpid()
+    if _worker_shard["pid"] != pid:
+        # random is re-seeded in forked children, so each process draws its own value
+        _worker_shard["value"] = random.randrange(1 << 30)
+        _worker_shard["pid"] = pid
+    return _worker_shard["value"]
+
+# In-process cache of the summed global stats, used when GLOBAL_STATS_CACHE_TTL > 0.
+_global_stats_cache = {"expires_at": 0.0, "value": None}
+
+def global_stats_keys() -> list:
+    """Returns the keys of every global stats shard, shard 0 first."""
+    shards = max(1, settings.global_stats_shards)
+    return [GLOBAL_STATS_KEY] + [f"{GLOBAL_STATS_KEY}:{i}" for i in range(1, shards)]
+
+def _global_stats_shard_key(shard_key: str | None = None) -> str:
+    """
+    Picks the shard an increment goes to: by hash of ``shard_key`` when given
+    (e.g. an order id), otherwise the shard owned by this worker process.
+    """
+    shards = max(1, settings.global_stats_shards)
+    if shards == 1:
+        return GLOBAL_STATS_KEY
+    if shard_key is None:
+        index = _worker_shard_value() % shards
+    else:
+        index = zlib.crc32(shard_key.encode("utf-8")) % shards
+    return GLOBAL_STATS_KEY if index == 0 else f"{GLOBAL_STATS_KEY}:{index}"
+
 # --- Leaderboard Keys ---
 LEADERBOARD_SPEND = "leaderboard:spend"
 LEADERBOARD_ORDERS = "leaderboard:orders"
+LEADERBOARD_TRENDING = "leaderboard:trending"
+LEADERBOARD_TRENDING_EPOCH = "leaderboard:trending:epoch"
+
+# --- Lua Scripts ---
+
+class PipelineScript:
+    """
+    A Lua script queued into pipelines with EVAL. redis-py's registered
+    scripts make every pipeline execute that uses them send SCRIPT EXISTS
+    first, an extra round trip; EVAL sends the source instead, which the
+    server looks up in its script cache by hash, and cannot fail with
+    NOSCRIPT after a restart or SCRIPT FLUSH.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+
+    def __call__(self, pipe, keys: list, args: list):
+        return pipe.eval(self.source, len(keys), *keys, *args)
+
+# --- Trending Leaderboard ---
+# Forward decay: an order of amount ``a`` at time ``t`` adds a·e^(λ·(t - epoch))
+# to the user's score, where λ = ln 2 / TRENDING_HALF_LIFE. Older increments
+# are never rescored; relative to new ones they shrink by half every
+# half-life, and reads divide by e^(λ·(now - epoch)) to get the decayed spend.
+# Once the exponent passes TRENDING_RENORMALIZE_EXPONENT the script rebases
+# every score on a new epoch (one ZUNIONSTORE) so scores never overflow, and
+# drops members whose score has decayed to nothing.
+TRENDING_RENORMALIZE_EXPONENT = 30.0
+TRENDING_PRUNE_SCORE = 1e-4
+
+# KEYS = (trending zset, epoch key),
+# ARGV = (now, lambda, renormalize exponent, prune score, user_id, amount, ...)
+_TRENDING_INCREMENT_LUA = """
+local now = tonumber(ARGV[1])
+local lambda = tonumber(ARGV[2])
+local epoch = tonumber(redis.call('GET', KEYS[2]))
+if not epoch then
+    epoch = now
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+local exponent = lambda * (now - epoch)
+if exponent > tonumber(ARGV[3]) then
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', tostring(math.exp(-exponent)))
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-' .. ARGV[4], ARGV[4])
+    redis.call('SET', KEYS[2], ARGV[1])
+    exponent = 0
+end
+local weight = math.exp(exponent)
+for i = 5, #ARGV, 2 do
+    redis.call('ZINCRBY', KEYS[1], tostring(tonumber(ARGV[i + 1]) * weight), ARGV[i])
+end
+return 0
+"""
+_trending_increment = PipelineScript(_TRENDING_INCREMENT_LUA)
+
+def trending_lambda() -> float:
+    """Returns the decay rate λ (per second) for TRENDING_HALF_LIFE."""
+    return math.log(2) / max(1.0, settings.trending_half_life)
+
+def _queue_trending_increment(pipe, amounts: dict, now: float | None = None):
+    """Queues the forward-decayed trending increments (user_id -> amount) as one script call."""
+    args = [now if now is not None else time.time(), trending_lambda(),
+            TRENDING_RENORMALIZE_EXPONENT, TRENDING_PRUNE_SCORE]
+    for user_id, amount in amounts.items():
+        args += [user_id, amount]
+    _trending_increment(pipe, [LEADERBOARD_TRENDING, LEADERBOARD_TRENDING_EPOCH], args)
+
+def _read_trending(client, start: int, stop: int, now: float | None = None) -> list:
+    """Reads a trending range as (user_id, decayed score) pairs."""
+    with client.pipeline(transaction=False) as pipe:
+        pipe.get(LEADERBOARD_TRENDING_EPOCH)
+        pipe.zrevrange(LEADERBOARD_TRENDING, start, stop, withscores=True)
+        epoch, entries = pipe.execute()
+    if epoch is None:
+        return []
+    now = now if now is not None else time.time()
+    factor = math.exp(-trending_lambda() * (now - float(epoch)))
+    return [(user_id, round(score * factor, 2)) for user_id, score in entries]
+
+# --- Bucketed User Stats Layout ---
+# With USER_STATS_LAYOUT=bucketed, users are packed into user_stats_bucket_count()
+# small hashes ``ustats:{crc32(id) % B}`` holding ``{id}:c`` (order count) and
+# ``{id}:s`` (spend in integer cents via HINCRBY). Small hashes stay in Redis'
+# listpack encoding, which avoids the per-key overhead of one hash per user.
+# Reads also add any legacy ``user:{id}`` hash, so users not yet moved by
+# scripts/migrate_user_stats.py keep their totals.
+
+def user_stats_bucketed() -> bool:
+    """Returns True when user stats use the bucketed layout."""
+    return settings.user_stats_layout == "bucketed"
+
+# Users per bucket when the bucket count is derived. Each user takes 2 fields
+# and Redis' default hash-max-listpack-entries is 128, so a bucket converts to
+# a hashtable above 64 users. Hashing spreads users unevenly (at an average
+# of 50, 1M users put over 64 in ~2% of buckets); an average of 30 keeps the
+# fullest bucket in the mid 50s.
+USERS_PER_BUCKET = 30
+
+def user_stats_bucket_count() -> int:
+    """
+    Returns the number of buckets: USER_STATS_BUCKETS when set, otherwise
+    derived from USER_STATS_EXPECTED_USERS so buckets stay listpack-encoded.
+    """
+    if settings.user_stats_buckets > 0:
+        return settings.user_stats_buckets
+    return max(1, -(-settings.user_stats_expected_users // USERS_PER_BUCKET))
+
+def user_stats_bucket_key(user_id: str) -> str:
+    """Returns the bucket hash holding ``user_id``'s fields."""
+    bucket = zlib.crc32(str(user_id).encode("utf-8")) % user_stats_bucket_count()
+    return f"{USER_STATS_BUCKET_PREFIX}{bucket}"
+
+def user_stats_bucket_fields(user_id: str) -> tuple:
+    """Returns the (order count, spend cents) field names of ``user_id``."""
+    return f"{user_id}:c", f"{user_id}:s"
+
+def to_cents(amount: float) -> int:
+    """Converts a currency amount to integer cents."""
+    return int(round(amount * 100))
+
+def _queue_user_stats_read(pipe, user_id: str) -> int:
+    """Queues the reads for one user's stats and returns how many replies they produce."""
+    pipe.hmget(f"{USER_STATS_PREFIX}{user_id}", "order_count", "total_spend")
+    if user_stats_bucketed():
+        pipe.hmget(user_stats_bucket_key(user_id), *user_stats_bucket_fields(user_id))
+        return 2
+    return 1
+
+def _user_stats_from_replies(replies: list) -> dict:
+    """Builds a user stats dict from the replies queued by ``_queue_user_stats_read``."""
+    order_count, total_spend = replies[0]
+    stats = {
+        "order_count": int(order_count or 0),
+        "total_spend": float(total_spend or 0.0)
+    }
+    if len(replies) > 1:
+        bucket_count, bucket_cents = replies[1]
+        stats["order_count"] += int(bucket_count or 0)
+        stats["total_spend"] = round(stats["total_spend"] + int(bucket_cents or 0) / 100, 2)
+    return stats
+
+# Moves one legacy hash into its bucket atomically: KEYS = (user:{id}, bucket),
+# ARGV = (count field, spend field). Returns 1 if anything was moved.
+_MIGRATE_USER_STATS_LUA = """
+local count = redis.call('HGET', KEYS[1], 'order_count')
+local spend = redis.call('HGET', KEYS[1], 'total_spend')
+if not count and not spend then
+    return 0
+end
+if count then
+    redis.call('HINCRBY', KEYS[2], ARGV[1], count)
+end
+if spend then
+    redis.call('HINCRBY', KEYS[2], ARGV[2], math.floor(tonumber(spend) * 100 + 0.5))
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+def migrate_user_stats_to_buckets(client, user_ids: list) -> int:
+    """
+    Moves the legacy ``user:{id}`` hashes of ``user_ids`` into their buckets,
+    pipelining one atomic script call per user. Returns the number moved.
+    """
+    script = client.register_script(_MIGRATE_USER_STATS_LUA)
+    with client.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            script(
+                keys=[f"{USER_STATS_PREFIX}{user_id}", user_stats_bucket_key(user_id)],
+                args=list(user_stats_bucket_fields(user_id)),
+                client=pipe,
+            )
+        return sum(pipe.execute())
+
+# --- Rolling Window User Stats ---
+# Orders and spend per user over the last hour and day are kept in one small
+# hash per active user, ``uwin:{id}``, holding a ring of buckets per window:
+# field ``{window}:{bucket % slots}`` = "{bucket}:{orders}:{cents}", where
+# ``bucket`` is the absolute bucket number (Unix time // bucket width). A
+# write that lands on a slot still holding an older bucket resets it, so
+# each window uses at most ``slots`` fields and no per-order entries. The
+# key expires USER_WINDOW_TTL seconds after the user's last order.
+# A window sums the buckets of its last ``slots`` periods, so it covers
+# between (slots - 1) and ``slots`` bucket widths (55-60 minutes for 1h).
+USER_WINDOW_PREFIX = "uwin:"
+
+# window -> (bucket width in seconds, buckets)
+USER_WINDOWS = {"1h": (300, 12), "24h": (3600, 24)}
+
+USER_WINDOW_TTL = max(width * slots for width, slots in USER_WINDOWS.values()) + max(
+    width for width, _ in USER_WINDOWS.values())
+
+# KEYS = uwin:{id} per user, ARGV = (now, ttl, window count, then name, width,
+# slots per window, then order count, cents per user in KEYS order)
+_USER_WINDOW_INCREMENT_LUA = """
+local now = tonumber(ARGV[1])
+local windows = tonumber(ARGV[3])
+local values = 4 + 3 * windows
+for k, key in ipairs(KEYS) do
+    local orders = tonumber(ARGV[values + 2 * (k - 1)])
+    local cents = tonumber(ARGV[values + 2 * (k - 1) + 1])
+    for w = 0, windows - 1 do
+        local width = tonumber(ARGV[5 + 3 * w])
+        local slots = tonumber(ARGV[6 + 3 * w])
+        local bucket = math.floor(now / width)
+        local field = ARGV[4 + 3 * w] .. ':' .. string.format('%d', bucket % slots)
+        local count, spent = 0, 0
+        local stored = redis.call('HGET', key, field)
+        if stored then
+            local b, c, s = string.match(stored, '^(%-?%d+):(%-?%d+):(%-?%d+)$')
+            if tonumber(b) == bucket then
+                count, spent = tonumber(c), tonumber(s)
+            end
+        end
+        redis.call('HSET', key, field, string.format('%d:%d:%d', bucket, count + orders, spent + cents))
+    end
+    redis.call('EXPIRE', key, ARGV[2])
+end
+return #KEYS
+"""
+_user_window_increment = PipelineScript(_USER_WINDOW_INCREMENT_LUA)
+
+def user_window_key(user_id: str) -> str:
+    return f"{USER_WINDOW_PREFIX}{user_id}"
+
+def _queue_user_window_increment(pipe, increments: dict, now: float | None = None):
+    """Queues one script call adding (order_count, amount) per user_id to every window's current bucket."""
+    args = [now if now is not None else time.time(), USER_WINDOW_TTL, len(USER_WINDOWS)]
+    for name, (width, slots) in USER_WINDOWS.items():
+        args += [name, width, slots]
+    for order_count, amount in increments.values():
+        args += [order_count, to_cents(amount)]
+    _user_window_increment(pipe, [user_window_key(user_id) for user_id in increments], args)
+
+def _queue_user_window_read(pipe, user_id: str, window: str):
+    _, slots = USER_WINDOWS[window]
+    pipe.hmget(user_window_key(user_id), [f"{window}:{slot}" for slot in range(slots)])
+
+def _user_window_from_reply(reply: list, window: str, now: float | None = None) -> dict:
+    """Sums the buckets of ``window`` that fall inside it at ``now``."""
+    width, slots = USER_WINDOWS[window]
+    current = int((now if now is not None else time.time()) // width)
+    order_count, cents = 0, 0
+    for stored in reply:
+        if stored is None:
+            continue
+        bucket, count, spent = (int(part) for part in stored.split(":"))
+        if current - slots < bucket <= current:
+            order_count += count
+            cents += spent
+    return {"window": window, "order_count": order_count, "total_spend": cents / 100}
 
 # --- Storage Functions ---
 
+def _queue_user_increment(pipe, user_id: str, order_count: int, amount: float) -> int:
+    """
+    Queues the increments of one user's stats and returns how many replies
+    they produce (see ``_user_totals_from_replies``).
+    """
+    if user_stats_bucketed():
+        count_field, spend_field = user_stats_bucket_fields(user_id)
+        key = user_stats_bucket_key(user_id)
+        pipe.hincrby(key, count_field, order_count)
+        pipe.hincrby(key, spend_field, to_cents(amount))
+        pipe.hmget(f"{USER_STATS_PREFIX}{user_id}", "order_count", "total_spend")
+        return 3
+    key = f"{USER_STATS_PREFIX}{user_id}"
+    pipe.hincrby(key, "order_count", order_count)
+    pipe.hincrbyfloat(key, "total_spend", amount)
+    return 2
+
+def _user_totals_from_replies(replies: list) -> tuple:
+    """Returns the updated (order_count, total_spend) from ``_queue_user_increment`` replies."""
+    if len(replies) == 3:
+        stats = _user_stats_from_replies([replies[2], replies[:2]])
+        return stats["order_count"], stats["total_spend"]
+    # The increments return the updated values used for the leaderboards
+    return int(replies[0]), float(replies[1])
+
+def _queue_leaderboard_update(pipe, totals: dict, amounts: dict | None = None):
+    """
+    Queues ZADDs of updated user totals (user_id -> (order_count, total_spend))
+    and, when given, the trending increments of the spend just added
+    (user_id -> amount).
+    """
+    pipe.zadd(LEADERBOARD_SPEND, {user_id: spend for user_id, (_, spend) in totals.items()})
+    pipe.zadd(LEADERBOARD_ORDERS, {user_id: count for user_id, (count, _) in totals.items()})
+    if amounts:
+        _queue_trending_increment(pipe, amounts)
+
 def update_user_stats(user_id: str, order_value: float):
     """
     Updates the order count and total spend for a specific user.
-    Uses Redis Hashes with HINCRBY and HINCRBYFLOAT.
+    Uses Redis Hashes with HINCRBY and HINCRBYFLOAT, or HINCRBY on integer
+    cents in the bucketed layout. The rolling window buckets are updated in
+    the same transaction.
     """
-    client = get_redis_client()
-    key = f"{USER_STATS_PREFIX}{user_id}"
-    import logging
-    logging.info(f"Updating user stats in Redis: key={key}, increment order_count by 1, increment total_spend by {order_value}")
+    client = get_user_client(user_id)
+    key = user_stats_bucket_key(user_id) if user_stats_bucketed() else f"{USER_STATS_PREFIX}{user_id}"
+    logger.info("Updating user stats in Redis: key=%s, increment order_count by 1, increment total_spend by %s",
+                key, order_value, extra={"event": "storage.user_stats"})
+    with client.pipeline() as pipe:
+        size = _queue_user_increment(pipe, user_id, 1, order_value)
+        _queue_user_window_increment(pipe, {user_id: (1, order_value)})
+        totals = _user_totals_from_replies(pipe.execute()[:size])
+    # Update leaderboards (partial per node when partitioned)
     with client.pipeline() as pipe:
-        pipe.hincrby(key, "order_count", 1)
-        pipe.hincrbyfloat(key, "total_spend", order_value)
+        _queue_leaderboard_update(pipe, {user_id: totals}, {user_id: order_value})
         pipe.execute()
-    # Fetch updated values for leaderboard
-    order_count = int(client.hget(key, "order_count"))
-    total_spend = float(client.hget(key, "total_spend"))
-    # Update leaderboards
-    client.zadd(LEADERBOARD_SPEND, {user_id: total_spend})
-    client.zadd(LEADERBOARD_ORDERS, {user_id: order_count})
+
+def apply_user_aggregates(aggregates: dict, batch_size: int = 1000, trending: bool = True,
+                          windows: bool = True) -> int:
+    """
+    Adds pre-aggregated stats (user_id -> (order_count, total_spend)) for many
+    users, with large non-transactional pipelines per node followed by one
+    leaderboard ZADD per batch. ``trending=False`` leaves the trending board
+    alone and ``windows=False`` the rolling windows, e.g. for historical
+    backfills. Returns the number of users written.
+    """
+    ring = get_user_ring()
+    if ring is None:
+        groups = {None: list(aggregates)}
+    else:
+        groups = ring.group_by_node(str(user_id) for user_id in aggregates)
+    for node, ids in groups.items():
+        client = get_redis_client() if node is None else get_node_client(node)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            with client.pipeline(transaction=False) as pipe:
+                sizes = [_queue_user_increment(pipe, user_id, *aggregates[user_id]) for user_id in batch]
+                if windows:
+                    _queue_user_window_increment(pipe, {user_id: aggregates[user_id] for user_id in batch})
+                replies = pipe.execute()
+            totals = {}
+            position = 0
+            for user_id, size in zip(batch, sizes):
+                totals[user_id] = _user_totals_from_replies(replies[position:position + size])
+                position += size
+            amounts = {user_id: aggregates[user_id][1] for user_id in batch} if trending else None
+            with client.pipeline(transaction=False) as pipe:
+                _queue_leaderboard_update(pipe, totals, amounts)
+                pipe.execute()
+    return len(aggregates)
 # --- Leaderboard Functions ---
 from typing import Literal
-def get_top_users(by: Literal["spend","orders"], n: int, offset: int = 0) -> list:
-    if by not in ("spend", "orders"):
-        raise ValueError("Invalid leaderboard type. Must be 'spend' or 'orders'.")
+
+def _merge_top(partials: list, offset: int, n: int) -> list:
+    """
+    K-way merges per-node (user_id, score) lists, each sorted by descending
+    score, and returns the ``n`` entries starting at ``offset``.
+    """
+    merged = heapq.merge(*partials, key=lambda entry: -entry[1])
+    return list(islice(merged, offset, offset + n))
+
+def get_top_users(by: Literal["spend","orders","trending"], n: int, offset: int = 0) -> list:
+    if by not in ("spend", "orders", "trending"):
+        raise ValueError("Invalid leaderboard type. Must be 'spend', 'orders' or 'trending'.")
     if n < 1 or n > 100:
         raise ValueError("n must be between 1 and 100.")
-    key = LEADERBOARD_SPEND if by == "spend" else LEADERBOARD_ORDERS
-    client = get_redis_client()
-    # ZREVRANGE for descending order (top N)
-    results = client.zrevrange(key, offset, offset + n - 1, withscores=True)
+    if by == "trending":
+        # Each node keeps its own epoch, so scores are decayed before merging
+        now = time.time()
+        read_range = lambda client, start, stop: _read_trending(client, start, stop, now)
+    else:
+        key = LEADERBOARD_SPEND if by == "spend" else LEADERBOARD_ORDERS
+        read_range = lambda client, start, stop: client.zrevrange(key, start, stop, withscores=True)
+    clients = get_user_node_clients()
+    if len(clients) == 1:
+        # ZREVRANGE for descending order (top N)
+        results = read_with_replicas(lambda client: read_range(client, offset, offset + n - 1))
+    else:
+        # Scatter-gather: every node may hold any rank, so each returns its own
+        # first offset+n entries and the merge picks the global window.
+        partials = _scatter(lambda client: read_range(client, 0, offset + n - 1), clients)
+        results = _merge_top(partials, offset, n)
     return [{"user_id": user_id, "score": score} for user_id, score in results]
 
-def update_global_stats(order_value: float):
+def update_global_stats(order_value: float, shard_key: str | None = None, order_count: int = 1):
     """
     Updates the total number of orders and total revenue globally.
-    Uses Redis Hashes with HINCRBY and HINCRBYFLOAT.
+    Uses Redis Hashes with HINCRBY and HINCRBYFLOAT on one of the
+    GLOBAL_STATS_SHARDS shard keys (see ``_global_stats_shard_key``).
+    ``order_count`` lets bulk loaders add a pre-aggregated total at once.
     """
     client = get_redis_client()
-    import logging
-    logging.info(f"Updating global stats in Redis: key={GLOBAL_STATS_KEY}, increment total_orders by 1, increment total_revenue by {order_value}")
+    key = _global_stats_shard_key(shard_key)
+    logger.info("Updating global stats in Redis: key=%s, increment total_orders by %s, increment total_revenue by %s",
+                key, order_count, order_value, extra={"event": "storage.global_stats"})
     with client.pipeline() as pipe:
-        pipe.hincrby(GLOBAL_STATS_KEY, "total_orders", 1)
-        pipe.hincrbyfloat(GLOBAL_STATS_KEY, "total_revenue", order_value)
+        pipe.hincrby(key, "total_orders", order_count)
+        pipe.hincrbyfloat(key, "total_revenue", order_value)
         pipe.execute()
 
-def get_user_stats(user_id: str) -> dict:
+def get_user_stats(user_id: str, window: str | None = None) -> dict:
     """
     Retrieves the statistics for a given user.
     Returns a dictionary with zero values if the user does not exist.
+    With ``window`` ("1h" or "24h"), the orders and spend in that rolling
+    window are added under "window", read in the same pipeline.
     """
-    client = get_redis_client()
-    stats = client.hgetall(f"{USER_STATS_PREFIX}{user_id}")
-    return {
-        "order_count": int(stats.get("order_count", 0)),
-        "total_spend": float(stats.get("total_spend", 0.0))
-    }
+    if window is not None and window not in USER_WINDOWS:
+        raise ValueError(f"Unknown window. Must be one of: {', '.join(USER_WINDOWS)}.")
+
+    def read(client):
+        with client.pipeline(transaction=False) as pipe:
+            size = _queue_user_stats_read(pipe, user_id)
+            if window is not None:
+                _queue_user_window_read(pipe, user_id, window)
+            replies = pipe.execute()
+        stats = _user_stats_from_replies(replies[:size])
+        if window is not None:
+            stats["window"] = _user_window_from_reply(replies[size], window)
+        return stats
+
+    if get_user_ring() is None:
+        return read_with_replicas(read)
+    return read(get_user_client(user_id))
+
+def get_many_user_stats(user_ids: list) -> dict:
+    """
+    Retrieves the statistics for several users at once, with one pipeline
+    per node. Returns a mapping of user_id to the ``get_user_stats`` dict.
+    """
+    ring = get_user_ring()
+    if ring is None:
+        groups = {None: list(user_ids)}
+    else:
+        groups = ring.group_by_node(str(user_id) for user_id in user_ids)
+    results = {}
+    for node, ids in groups.items():
+        def read(client):
+            with client.pipeline(transaction=False) as pipe:
+                sizes = [_queue_user_stats_read(pipe, user_id) for user_id in ids]
+                return sizes, pipe.execute()
+
+        sizes, replies = read_with_replicas(read) if node is None else read(get_node_client(node))
+        position = 0
+        for user_id, size in zip(ids, sizes):
+            results[user_id] = _user_stats_from_replies(replies[position:position + size])
+            position += size
+    return results
 
 def get_global_stats() -> dict:
     """
     Retrieves the global order and revenue statistics.
+    Sums all shards in a single pipelined read; when GLOBAL_STATS_CACHE_TTL is
+    set the total is cached in-process for that many seconds.
     Returns a dictionary with zero values if no stats are available.
     """
-    client = get_redis_client()
-    stats = client.hgetall(GLOBAL_STATS_KEY)
-    return {
-        "total_orders": int(stats.get("total_orders", 0)),
-        "total_revenue": float(stats.get("total_revenue", 0.0))
+    ttl = settings.global_stats_cache_ttl
+    cached = _global_stats_cache["value"]
+    if ttl > 0 and cached is not None and time.monotonic() < _global_stats_cache["expires_at"]:
+        return dict(cached)
+
+    def read(client):
+        with client.pipeline(transaction=False) as pipe:
+            for key in global_stats_keys():
+                pipe.hmget(key, "total_orders", "total_revenue")
+            return pipe.execute()
+
+    shards = read_with_replicas(read)
+    stats = {
+        "total_orders": sum(int(orders or 0) for orders, _ in shards),
+        "total_revenue": sum(float(revenue or 0.0) for _, revenue in shards)
+    }
+    if ttl > 0:
+        _global_stats_cache["value"] = dict(stats)
+        _global_stats_cache["expires_at"] = time.monotonic() + ttl
+    return stats
+
+# --- Invalid Orders ---
+# Each invalid order gets an id from INCR invalid_orders:seq. The entry itself
+# lives in the invalid_orders:entries hash, packed by app.services.codec
+# (msgpack + zlib/zstd behind a version byte, INVALID_ORDERS_CODEC); the invalid_orders list holds the
+# ids, newest first (older deployments pushed the JSON entry itself, which
+# readers still accept). Every entry is also indexed by time in per-day
+# sorted sets (invalid_orders:day:{YYYY-MM-DD}, listed in invalid_orders:days)
+# and by reason code (invalid_orders:reason:{code}), scored by its Unix time,
+# and counted per reason overall and per day. Index members whose entry has
+# been replayed or trimmed are skipped and removed when a query meets them.
+INVALID_ORDERS_SEQ_KEY = "invalid_orders:seq"
+INVALID_ORDERS_ENTRIES_KEY = "invalid_orders:entries"
+INVALID_ORDERS_DAYS_KEY = "invalid_orders:days"
+INVALID_ORDERS_COUNTS_KEY = "invalid_orders:counts"
+
+# Stable codes for the reasons produced by the validators, by message prefix.
+INVALID_REASON_CODES = (
+    ("Missing required field", "missing_field"),
+    ("order_value must be a number", "invalid_value"),
+    ("Calculated total", "total_mismatch"),
+    ("Invalid structure in 'items'", "invalid_items"),
+    ("Validation error", "validation_error"),
+)
+INVALID_REASON_OTHER = "other"
+
+def classify_invalid_reason(reason: str) -> str:
+    """Maps a validation reason to its stable code (``other`` if unknown)."""
+    for prefix, code in INVALID_REASON_CODES:
+        if str(reason).startswith(prefix):
+            return code
+    return INVALID_REASON_OTHER
+
+def invalid_reason_codes() -> list:
+    return [code for _, code in INVALID_REASON_CODES] + [INVALID_REASON_OTHER]
+
+def invalid_reason_key(code: str) -> str:
+    return f"invalid_orders:reason:{code}"
+
+def invalid_day_key(day: str) -> str:
+    return f"invalid_orders:day:{day}"
+
+def invalid_day_counts_key(day: str) -> str:
+    return f"{INVALID_ORDERS_COUNTS_KEY}:{day}"
+
+def _invalid_day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+def _encode_invalid_entry(entry: dict) -> bytes:
+    return codec.encode_entry(entry, settings.invalid_orders_codec)
+
+def _decode_invalid_entry(raw) -> dict:
+    return codec.decode_entry(raw)
+
+# KEYS = (seq, entries, list, days, counts, reason index, day index, day
+# counts, every reason index...), ARGV = (score, day, day start, code,
+# encoded entry, max count, max age, max trims, day counts expiry).
+# After the write, up to ``max trims`` of the oldest entries (the list tail)
+# are removed with their reason index members while the list is over ``max
+# count`` or the tail is older than ``max age`` seconds (0 disables either
+# cap), so retention is enforced in the same round trip. Every key the script
+# touches is passed in KEYS, so the day index of a trimmed entry is not
+# edited here: the script returns the new id followed by (day, id) pairs of
+# trimmed entries, which _unindex_trimmed_invalids removes afterwards.
+_LOG_INVALID_ORDER_LUA = """
+local id = tostring(redis.call('INCR', KEYS[1]))
+redis.call('HSET', KEYS[2], id, ARGV[5])
+redis.call('LPUSH', KEYS[3], id)
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[2])
+redis.call('HINCRBY', KEYS[5], ARGV[4], 1)
+redis.call('ZADD', KEYS[6], ARGV[1], id)
+redis.call('ZADD', KEYS[7], ARGV[1], id)
+redis.call('HINCRBY', KEYS[8], ARGV[4], 1)
+if tonumber(ARGV[9]) > 0 then
+    redis.call('EXPIREAT', KEYS[8], ARGV[9])
+end
+
+local function score_of(entry_id)
+    for i = 9, #KEYS do
+        local score = redis.call('ZSCORE', KEYS[i], entry_id)
+        if score then
+            return tonumber(score), KEYS[i]
+        end
+    end
+end
+
+local trimmed = {id}
+local max_count = tonumber(ARGV[6])
+local max_age = tonumber(ARGV[7])
+local cutoff = tonumber(ARGV[1]) - max_age
+for _ = 1, tonumber(ARGV[8]) do
+    local tail = redis.call('LINDEX', KEYS[3], -1)
+    if not tail then
+        break
+    end
+    -- Entries pushed before ids were used are JSON documents; they predate the rest
+    local legacy = string.sub(tail, 1, 1) == '{'
+    local score, reason_key
+    if not legacy then
+        score, reason_key = score_of(tail)
+    end
+    local expired = max_age > 0 and (legacy or (score ~= nil and score < cutoff))
+    if not (expired or (max_count > 0 and redis.call('LLEN', KEYS[3]) > max_count)) then
+        break
+    end
+    redis.call('RPOP', KEYS[3])
+    if not legacy then
+        redis.call('HDEL', KEYS[2], tail)
+        if score then
+            redis.call('ZREM', reason_key, tail)
+            local day = redis.call('ZREVRANGEBYSCORE', KEYS[4], score, '-inf', 'LIMIT', 0, 1)[1]
+            if day then
+                table.insert(trimmed, day)
+                table.insert(trimmed, tail)
+            end
+        end
+    end
+end
+return trimmed
+"""
+_log_invalid_order = PipelineScript(_LOG_INVALID_ORDER_LUA)
+
+# KEYS = (days, day index), ARGV = (day, trimmed ids...). Drops the ids from
+# the day index, and the day itself once its index is empty.
+_UNINDEX_INVALID_DAY_LUA = """
+redis.call('ZREM', KEYS[2], unpack(ARGV, 2))
+if redis.call('ZCARD', KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[2])
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+_unindex_invalid_day = PipelineScript(_UNINDEX_INVALID_DAY_LUA)
+
+# Oldest entries trimmed at most per write; above 1 so a backlog over the caps drains.
+INVALID_TRIM_PER_WRITE = 10
+
+def _queue_invalid_order(pipe, order_data: dict, reason: str, now: float):
+    """Queues the atomic write of one invalid entry, its index entries and the retention trim."""
+    code = classify_invalid_reason(reason)
+    day = _invalid_day(now)
+    day_start = (int(now) // 86400) * 86400
+    max_age = max(0.0, settings.invalid_orders_max_age)
+    entry = {
+        "order": order_data,
+        "reason": reason,
+        "code": code,
+        "ts": datetime.utcfromtimestamp(now).isoformat(),
     }
+    # A day's counts expire once all of its entries are past the age cap
+    counts_expire_at = day_start + 86400 + math.ceil(max_age) if max_age > 0 else 0
+    _log_invalid_order(
+        pipe,
+        [INVALID_ORDERS_SEQ_KEY, INVALID_ORDERS_ENTRIES_KEY, INVALID_ORDERS_KEY,
+         INVALID_ORDERS_DAYS_KEY, INVALID_ORDERS_COUNTS_KEY, invalid_reason_key(code),
+         invalid_day_key(day), invalid_day_counts_key(day),
+         *(invalid_reason_key(other) for other in invalid_reason_codes())],
+        [repr(now), day, day_start, code, _encode_invalid_entry(entry),
+         max(0, settings.invalid_orders_max_count), max_age, INVALID_TRIM_PER_WRITE, counts_expire_at],
+    )
+
+def _unindex_trimmed_invalids(client, replies: list):
+    """Removes the entries trimmed by the write script (see _LOG_INVALID_ORDER_LUA) from their day indexes."""
+    by_day = {}
+    for reply in replies:
+        for day, entry_id in zip(reply[1::2], reply[2::2]):
+            by_day.setdefault(day, []).append(entry_id)
+    if not by_day:
+        return
+    with client.pipeline(transaction=False) as pipe:
+        for day, ids in by_day.items():
+            _unindex_invalid_day(pipe, [INVALID_ORDERS_DAYS_KEY, invalid_day_key(day)], [day, *ids])
+        pipe.execute()
 
 def log_invalid_order(order_data: dict, reason: str):
     """
-    Logs an invalid order by pushing it to a Redis List as a JSON string.
+    Logs an invalid order: stores the entry, pushes its id to the Redis List
+    and indexes it by reason code and day, in one atomic script call.
     """
-    import logging
     client = get_redis_client()
-    log_entry = {
-        "order": order_data,
-        "reason": reason,
-        "ts": datetime.utcnow().isoformat(),
-    }
-    logging.info(f"Logging invalid order to Redis: key={INVALID_ORDERS_KEY}, entry={log_entry}")
-    client.lpush(INVALID_ORDERS_KEY, json.dumps(log_entry))
+    logger.info("Logging invalid order to Redis: key=%s, order_id=%s, reason=%s",
+                INVALID_ORDERS_KEY, order_data.get("order_id", "N/A"), reason,
+                extra={"event": "storage.invalid_order"})
+    with client.pipeline(transaction=False) as pipe:
+        _queue_invalid_order(pipe, order_data, reason, time.time())
+        replies = pipe.execute()
+    _unindex_trimmed_invalids(client, replies)
+
+def log_invalid_orders(entries: list, batch_size: int = 1000):
+    """
+    Logs many invalid orders at once: ``entries`` is a list of
+    (order_data, reason) tuples, written with one pipeline per batch.
+    """
+    client = get_redis_client()
+    now = time.time()
+    for start in range(0, len(entries), batch_size):
+        with client.pipeline(transaction=False) as pipe:
+            for order_data, reason in entries[start:start + batch_size]:
+                _queue_invalid_order(pipe, order_data, reason, now)
+            replies = pipe.execute()
+        _unindex_trimmed_invalids(client, replies)
+
+def _resolve_invalid_entries(client, ids: list) -> list:
+    """Fetches and decodes the entries for ``ids``; missing ones come back as None."""
+    if not ids:
+        return []
+    # Entries are binary, so they are read without the client's text decoding
+    raws = client.execute_command("HMGET", INVALID_ORDERS_ENTRIES_KEY, *ids, NEVER_DECODE=True)
+    entries = []
+    for entry_id, raw in zip(ids, raws):
+        if raw is None:
+            entries.append(None)
+            continue
+        entry = _decode_invalid_entry(raw)
+        entry["id"] = entry_id
+        entries.append(entry)
+    return entries
+
+def pop_invalid_entry(client, entry_id: str) -> dict | None:
+    """
+    Removes and returns the entry stored under ``entry_id`` (None if already
+    gone). Callers own the id after popping it from the list, so the read and
+    delete need no transaction.
+    """
+    with client.pipeline(transaction=False) as pipe:
+        pipe.execute_command("HGET", INVALID_ORDERS_ENTRIES_KEY, entry_id, NEVER_DECODE=True)
+        pipe.hdel(INVALID_ORDERS_ENTRIES_KEY, entry_id)
+        raw, _ = pipe.execute()
+    return None if raw is None else _decode_invalid_entry(raw)
 
 def list_invalid_orders(limit: int = 50) -> list:
     """
     Retrieves a list of the most recent invalid orders.
     """
-    client = get_redis_client()
-    invalid_orders_json = client.lrange(INVALID_ORDERS_KEY, 0, limit - 1)
-    return [json.loads(order) for order in invalid_orders_json]
+    def read(client):
+        items = client.lrange(INVALID_ORDERS_KEY, 0, limit - 1)
+        ids = [item for item in items if not item.startswith("{")]
+        return items, dict(zip(ids, _resolve_invalid_entries(client, ids)))
+
+    items, by_id = read_with_replicas(read)
+    entries = []
+    for item in items:
+        # Entries pushed before the id-based layout are the JSON document itself
+        entry = json.loads(item) if item.startswith("{") else by_id[item]
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
+# Returns up to ARGV[4] (id, score) pairs of KEYS[1], by descending score,
+# starting after member ARGV[3] if given (or below score ARGV[5] if that
+# member is gone), else below score ARGV[1], and stopping below score
+# ARGV[2]. Ranks are read atomically with the range.
+_PAGE_INDEX_LUA = """
+local start
+if ARGV[3] ~= '' then
+    local rank = redis.call('ZREVRANK', KEYS[1], ARGV[3])
+    if rank then
+        start = rank + 1
+    else
+        start = redis.call('ZCOUNT', KEYS[1], '(' .. ARGV[5], '+inf')
+    end
+else
+    start = redis.call('ZCOUNT', KEYS[1], '(' .. ARGV[1], '+inf')
+end
+local low = tonumber(ARGV[2]) or -math.huge
+local rows = redis.call('ZREVRANGE', KEYS[1], start, start + tonumber(ARGV[4]) - 1, 'WITHSCORES')
+local page = {}
+for i = 1, #rows, 2 do
+    if tonumber(rows[i + 1]) < low then
+        break
+    end
+    page[#page + 1] = rows[i]
+    page[#page + 1] = rows[i + 1]
+end
+return page
+"""
+
+def _parse_invalid_cursor(cursor: str | None) -> tuple:
+    if not cursor:
+        return None, None
+    score, _, entry_id = cursor.partition(":")
+    try:
+        return float(score), entry_id
+    except ValueError:
+        raise ValueError("Invalid cursor.") from None
+
+def query_invalid_orders(reason: str | None = None, since: float | None = None, until: float | None = None,
+                         cursor: str | None = None, limit: int = 50) -> tuple:
+    """
+    Returns ``(entries, next_cursor)``: invalid orders newest first, filtered
+    by reason code and/or a [since, until] range of Unix times, read from the
+    reason or day indexes. Pass ``next_cursor`` back to get the next page; it
+    is None when the range is exhausted.
+    """
+    if reason is not None and reason not in invalid_reason_codes():
+        raise ValueError(f"Unknown reason code. Must be one of: {', '.join(invalid_reason_codes())}.")
+    high = "+inf" if until is None else repr(float(until))
+    low = "-inf" if since is None else repr(float(since))
+    start_score, start_id = _parse_invalid_cursor(cursor)
+
+    def read(client):
+        page_script = client.register_script(_PAGE_INDEX_LUA)
+        cursor_score, cursor_id = start_score, start_id
+        if reason is not None:
+            keys = [invalid_reason_key(reason)]
+        else:
+            day_high = "+inf" if until is None else until
+            if cursor_score is not None:
+                day_high = cursor_score if until is None else min(until, cursor_score)
+            day_low = "-inf" if since is None else (int(since) // 86400) * 86400
+            keys = [invalid_day_key(day) for day in client.zrevrangebyscore(INVALID_ORDERS_DAYS_KEY, day_high, day_low)]
+
+        entries = []
+        last = None
+        stale = {}
+        for key in keys:
+            # The cursor only positions the first key, the one it was taken from
+            after_id, after_score = cursor_id or "", cursor_score or 0
+            cursor_id, cursor_score = None, None
+            while len(entries) < limit:
+                want = limit - len(entries)
+                rows = page_script(keys=[key], args=[high, low, after_id, want, after_score])
+                if not rows:
+                    break
+                ids, scores = rows[0::2], rows[1::2]
+                for entry_id, score, entry in zip(ids, scores, _resolve_invalid_entries(client, ids)):
+                    if entry is None:
+                        stale.setdefault(key, []).append(entry_id)
+                    else:
+                        entries.append(entry)
+                        last = (score, entry_id)
+                after_id, after_score = ids[-1], scores[-1]
+                if len(rows) < 2 * want:
+                    break
+            if len(entries) >= limit:
+                break
+        return entries, last, stale
+
+    entries, last, stale = read_with_replicas(read)
+    if stale:
+        # Index cleanup is a write, so it always goes to the primary
+        with get_redis_client().pipeline(transaction=False) as pipe:
+            for key, ids in stale.items():
+                pipe.zrem(key, *ids)
+            pipe.execute()
+    next_cursor = f"{last[0]}:{last[1]}" if len(entries) >= limit and last is not None else None
+    return entries, next_cursor
+
+def get_invalid_order_counts(day: str | None = None) -> dict:
+    """Returns the number of invalid orders logged per reason code, overall or for one UTC day (YYYY-MM-DD)."""
+    key = INVALID_ORDERS_COUNTS_KEY if day is None else invalid_day_counts_key(day)
+    return {code: int(count) for code, count in read_with_replicas(lambda client: client.hgetall(key)).items()}
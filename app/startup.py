@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+
+# Reference point for startup timings: the first import of this module,
+# which the API and worker entry points do before anything heavy.
+_STARTED = time.perf_counter()
+
+
+class StartupProfile:
+    """
+    Records how long each startup phase (imports, client creation, warm-up)
+    took, for ``--print-startup-profile``. Phases may run in background
+    threads; they are listed in completion order.
+    """
+
+    def __init__(self, started: float = _STARTED):
+        self.started = started
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, begin - self.started, time.perf_counter() - begin))
+
+    def report(self) -> str:
+        lines = ["Startup profile (ms):"]
+        for name, offset, duration in self.phases:
+            lines.append(f"  {name:<32} start +{offset * 1000:8.1f}   took {duration * 1000:8.1f}")
+        lines.append(f"  {'total since first import':<32} {(time.perf_counter() - self.started) * 1000:8.1f}")
+        return "\n".join(lines)
+
+
+profile = StartupProfile()
@@ -0,0 +1,221 @@
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+
+from botocore.exceptions import ClientError
+from redis.exceptions import ResponseError
+
+from app.logutil import get_logger
+
+logger = get_logger(__name__)
+
+
+class Message:
+    """One received message: its body, the handle used to ack it and its send time (Unix seconds, if known)."""
+
+    __slots__ = ("body", "handle", "sent_at")
+
+    def __init__(self, body: str, handle: str, sent_at: float | None = None):
+        self.body = body
+        self.handle = handle
+        self.sent_at = sent_at
+
+
+class Transport(ABC):
+    """
+    Where the worker gets orders from. Implementations receive batches, ack
+    processed messages in bulk and nack messages to have them redelivered.
+    Messages that are neither acked nor nacked are redelivered once their
+    ``visibility_timeout`` runs out.
+    """
+
+    name = ""
+    max_batch = 10
+    visibility_timeout = 30.0
+
+    @abstractmethod
+    def receive_batch(self, max_messages: int, wait_seconds: int) -> list:
+        """Receives up to ``max_messages``, waiting up to ``wait_seconds`` for the first."""
+
+    @abstractmethod
+    def ack_batch(self, messages: list):
+        """Removes processed ``messages`` from the queue."""
+
+    @abstractmethod
+    def nack(self, messages: list, delay: float = 0.0):
+        """Makes ``messages`` deliverable again after ``delay`` seconds."""
+
+    @abstractmethod
+    def extend(self, messages: list, timeout: float):
+        """Keeps in-flight ``messages`` from being redelivered for another ``timeout`` seconds."""
+
+    def depth(self) -> int | None:
+        """Approximate number of messages waiting, if known."""
+        return None
+
+
+def get_or_create_queue_url(sqs_client, queue_name):
+    """
+    Retrieves the URL of an SQS queue, creating it if it doesn't exist.
+    """
+    try:
+        response = sqs_client.get_queue_url(QueueName=queue_name)
+        logger.info("Queue '%s' found at URL: %s", queue_name, response['QueueUrl'])
+        return response['QueueUrl']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'AWS.SimpleQueueService.NonExistentQueue':
+            logger.warning("Queue '%s' not found. Creating it...", queue_name)
+            response = sqs_client.create_queue(QueueName=queue_name)
+            logger.info("Queue '%s' created at URL: %s", queue_name, response['QueueUrl'])
+            return response['QueueUrl']
+        else:
+            logger.error("Failed to get or create queue.", exc_info=True)
+            raise
+
+
+def get_queue_attribute(sqs_client, queue_url, name, default=None):
+    """
+    Reads one SQS queue attribute, returning ``default`` if it is unavailable.
+    """
+    try:
+        response = sqs_client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=[name])
+        return response["Attributes"][name]
+    except (ClientError, KeyError):
+        return default
+
+
+class SQSTransport(Transport):
+    """An SQS queue. Receives are capped at 10 messages by SQS."""
+
+    def __init__(self, sqs_client, queue_name: str, max_batch: int = 10):
+        self.sqs = sqs_client
+        self.name = queue_name
+        self.max_batch = min(max_batch, 10)
+        self.queue_url = get_or_create_queue_url(sqs_client, queue_name)
+        self.visibility_timeout = float(get_queue_attribute(sqs_client, self.queue_url, "VisibilityTimeout", 30))
+
+    def receive_batch(self, max_messages: int, wait_seconds: int) -> list:
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=["SentTimestamp"],
+        )
+        messages = []
+        for msg in response.get("Messages", []):
+            sent = msg.get("Attributes", {}).get("SentTimestamp")
+            messages.append(Message(msg["Body"], msg["ReceiptHandle"], int(sent) / 1000 if sent else None))
+        return messages
+
+    def _entries(self, messages: list, **fields) -> list:
+        return [{"Id": str(i), "ReceiptHandle": msg.handle, **fields} for i, msg in enumerate(messages)]
+
+    def ack_batch(self, messages: list):
+        if len(messages) == 1:
+            self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=messages[0].handle)
+        elif messages:
+            response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=self._entries(messages))
+            for failure in response.get("Failed", []):
+                logger.warning("Could not delete message %s: %s", failure.get("Id"), failure.get("Message"))
+
+    def nack(self, messages: list, delay: float = 0.0):
+        if not messages:
+            return
+        try:
+            self.sqs.change_message_visibility_batch(
+                QueueUrl=self.queue_url, Entries=self._entries(messages, VisibilityTimeout=int(delay)))
+        except ClientError as e:
+            logger.warning("Could not release %s messages: %s", len(messages), e)
+
+    def extend(self, messages: list, timeout: float):
+        """
+        Pushes back the visibility timeout of messages still waiting in a batch
+        so they are not redelivered to another worker while we get to them.
+        """
+        try:
+            self.sqs.change_message_visibility_batch(
+                QueueUrl=self.queue_url, Entries=self._entries(messages, VisibilityTimeout=int(timeout)))
+            logger.info("Extended visibility of %s in-flight messages by %ss.", len(messages), int(timeout))
+        except ClientError as e:
+            logger.warning("Could not extend message visibility: %s", e)
+
+    def depth(self) -> int | None:
+        depth = get_queue_attribute(self.sqs, self.queue_url, "ApproximateNumberOfMessages")
+        return None if depth is None else int(depth)
+
+
+class RedisStreamTransport(Transport):
+    """
+    A Redis Stream read through a consumer group.
+
+    Messages are entries with a ``body`` field. Receives use XREADGROUP with
+    large COUNTs. Entries left pending by a crashed or stalled consumer for
+    longer than ``visibility_timeout`` are taken over with XAUTOCLAIM before
+    new ones are read. Acks XACK and XDEL the entries, so the stream only
+    holds unprocessed work.
+    """
+
+    def __init__(self, client, stream: str, group: str, consumer: str | None = None,
+                 max_batch: int = 500, visibility_timeout: float = 30.0, claim_interval: float = 5.0,
+                 clock=time.monotonic):
+        self.client = client
+        self.name = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_batch = max_batch
+        self.visibility_timeout = visibility_timeout
+        self.claim_interval = claim_interval
+        self._clock = clock
+        self._next_claim = 0.0
+        try:
+            # Start from the beginning so entries added before the first worker are consumed
+            client.xgroup_create(stream, group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _messages(self, entries) -> list:
+        return [
+            Message(fields.get("body", ""), entry_id, int(entry_id.split("-")[0]) / 1000)
+            for entry_id, fields in entries if fields is not None
+        ]
+
+    def receive_batch(self, max_messages: int, wait_seconds: int) -> list:
+        count = min(max_messages, self.max_batch)
+        if self._clock() >= self._next_claim:
+            self._next_claim = self._clock() + self.claim_interval
+            _, claimed, *_ = self.client.xautoclaim(
+                self.name, self.group, self.consumer, int(self.visibility_timeout * 1000), "0-0", count=count)
+            if claimed:
+                logger.info("Claimed %s stuck messages from %s.", len(claimed), self.name)
+                return self._messages(claimed)
+        reply = self.client.xreadgroup(self.group, self.consumer, {self.name: ">"}, count=count,
+                                       block=int(wait_seconds * 1000) or None)
+        return self._messages(reply[0][1]) if reply else []
+
+    def ack_batch(self, messages: list):
+        if not messages:
+            return
+        ids = [msg.handle for msg in messages]
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.xack(self.name, self.group, *ids)
+            pipe.xdel(self.name, *ids)
+            pipe.execute()
+
+    def _reset_idle(self, messages: list, idle_ms: int):
+        self.client.xclaim(self.name, self.group, self.consumer, 0, [msg.handle for msg in messages],
+                           idle=max(0, idle_ms), justid=True)
+
+    def nack(self, messages: list, delay: float = 0.0):
+        # Back-date the idle time so XAUTOCLAIM picks the entries up after ``delay``
+        if messages:
+            self._reset_idle(messages, int((self.visibility_timeout - delay) * 1000))
+            self._next_claim = min(self._next_claim, self._clock() + delay)
+
+    def extend(self, messages: list, timeout: float):
+        if messages:
+            self._reset_idle(messages, int((self.visibility_timeout - timeout) * 1000))
+
+    def depth(self) -> int | None:
+        return self.client.xlen(self.name)
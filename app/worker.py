@@ -1,102 +1,292 @@
+import argparse
+import importlib
 import json
 import time
-import boto3
-import logging
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
-from app.config import settings
-from app.services.processor import process_order
+from app.startup import profile
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+with profile.phase("import redis + app modules"):
+    from botocore.exceptions import ClientError
+    from redis.exceptions import RedisError
 
-def get_or_create_queue_url(sqs_client, queue_name):
+    from app.config import settings
+    from app.logutil import configure_logging, get_logger
+    from app.flowcontrol import AdaptivePoller, CircuitBreaker, HALF_OPEN, QueueScheduler, parse_queue_weights
+    from app.services import snapshots, storage
+    from app.services.processor import process_order
+    from app.transport import RedisStreamTransport, SQSTransport
+
+logger = get_logger(__name__)
+
+def __getattr__(name):
+    # boto3 takes a few hundred ms to import, so it is only loaded when the
+    # SQS client is created (see create_sqs_client); ``app.worker.boto3``
+    # still resolves for callers that patch it.
+    if name == "boto3":
+        return importlib.import_module("boto3")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_sqs_client():
+    """
+    Imports boto3 and builds the SQS client.
+    """
+    with profile.phase("import boto3 + create SQS client"):
+        import boto3
+        return boto3.client(
+            "sqs",
+            endpoint_url=settings.aws_endpoint_url,
+            region_name=settings.aws_region,
+            aws_access_key_id=settings.aws_access_key_id,
+            aws_secret_access_key=settings.aws_secret_access_key
+        )
+
+def warm_up_redis():
+    with profile.phase("Redis warm-up"):
+        storage.warm_up()
+
+def create_transports(names):
+    """
+    Builds one transport per queue name: SQS queues, or Redis Streams read
+    through the STREAM_GROUP consumer group when WORKER_TRANSPORT=redis.
+    """
+    if settings.worker_transport == "redis":
+        client = storage.get_redis_client()
+        return {
+            name: RedisStreamTransport(
+                client, name, settings.stream_group,
+                max_batch=settings.stream_max_batch,
+                visibility_timeout=settings.stream_visibility_timeout,
+            )
+            for name in names
+        }
+    sqs = create_sqs_client()
+    with profile.phase("resolve queue URL"):
+        return {name: SQSTransport(sqs, name, max_batch=settings.worker_max_batch) for name in names}
+
+# Processed messages are acked in groups of this many, so a crash replays at
+# most this many already-applied (non-idempotent) stat increments.
+ACK_EVERY = 10
+
+def process_batch(transport, messages, poller, breaker):
     """
-    Retrieves the URL of an SQS queue, creating it if it doesn't exist.
+    Processes one received batch in order and acks the processed messages
+    in batch calls of up to ACK_EVERY messages.
+
+    Redis errors and slow calls feed the circuit breaker; if it opens mid-batch
+    the remaining messages are nacked for redelivery once the breaker probes
+    again. Messages still waiting when half the visibility timeout has passed
+    get it extended, after the processed ones are acked so none of them can
+    expire and be delivered again. Returns the number of messages processed
+    and acked.
     """
+    received_at = time.monotonic()
+    done = []
+    acked = 0
     try:
-        response = sqs_client.get_queue_url(QueueName=queue_name)
-        logging.info(f"Queue '{queue_name}' found at URL: {response['QueueUrl']}")
-        return response['QueueUrl']
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'AWS.SimpleQueueService.NonExistentQueue':
-            logging.warning(f"Queue '{queue_name}' not found. Creating it...")
-            response = sqs_client.create_queue(QueueName=queue_name)
-            logging.info(f"Queue '{queue_name}' created at URL: {response['QueueUrl']}")
-            return response['QueueUrl']
-        else:
-            logging.error("Failed to get or create queue.", exc_info=True)
-            raise
-
-def run_worker():
+        for index, msg in enumerate(messages):
+            if len(done) >= ACK_EVERY:
+                transport.ack_batch(done)
+                acked += len(done)
+                done = []
+            if not breaker.allow():
+                logger.warning("Redis circuit open; leaving %s messages for redelivery.", len(messages) - index)
+                transport.nack(messages[index:], delay=breaker.seconds_until_probe())
+                break
+            if time.monotonic() - received_at > poller.visibility_timeout * 0.5:
+                transport.ack_batch(done)
+                acked += len(done)
+                done = []
+                transport.extend(messages[index:], poller.visibility_timeout)
+                received_at = time.monotonic()
+
+            try:
+                body = json.loads(msg.body)
+                logger.info("Processing order_id: %s", body.get('order_id', 'N/A'), extra={"event": "worker.order_received"})
+                started = time.monotonic()
+                process_order(body)
+                elapsed = time.monotonic() - started
+                breaker.record(True, elapsed)
+                poller.observe_message(elapsed)
+                done.append(msg)
+                logger.info("Successfully processed message for order_id: %s", body.get('order_id', 'N/A'),
+                            extra={"event": "worker.order_processed"})
+            except json.JSONDecodeError:
+                logger.error("Invalid JSON in message body. Message will be retried. Body: %s", msg.body)
+                # Don't ack, let it become visible again for manual inspection/retry
+            except RedisError as e:
+                breaker.record(False)
+                logger.error("Redis error processing message: %s", e, exc_info=True)
+            except Exception as e:
+                logger.error("Error processing message: %s", e, exc_info=True)
+                # Let the message reappear for another attempt.
+                # The processor.py already logs invalid orders to Redis.
+                pass
+    finally:
+        # If processing is successful, ack (delete) the messages
+        transport.ack_batch(done)
+    return acked + len(done)
+
+def refresh_snapshots(materializer):
     """
-    Main worker function to poll SQS and process messages.
+    Re-materializes the leaderboard snapshots when due. Failures are only
+    logged: readers fall back to the live leaderboards once snapshots expire.
     """
-    logging.info("Starting SQS worker...")
-    sqs = boto3.client(
-        "sqs",
-        endpoint_url=settings.aws_endpoint_url,
-        region_name=settings.aws_region,
-        aws_access_key_id=settings.aws_access_key_id,
-        aws_secret_access_key=settings.aws_secret_access_key
-    )
+    if materializer is None:
+        return
+    try:
+        materializer.maybe_materialize()
+    except RedisError as e:
+        logger.warning("Could not materialize leaderboard snapshots: %s", e)
 
+def receive_messages(transport, poller, breaker, wait_seconds):
+    """Receives one batch, sized by the poller (a single probe while the breaker is half-open)."""
+    messages = transport.receive_batch(poller.batch_size(probing=breaker.state == HALF_OPEN), wait_seconds)
+    poller.record_success()
+    return messages
+
+def message_lag(messages):
+    """Returns the age in seconds of the oldest message in a batch, if the transport reported send times."""
+    sent = [msg.sent_at for msg in messages if msg.sent_at is not None]
+    return max(0.0, time.time() - min(sent)) if sent else None
+
+def poll_queues(queues, scheduler, breaker):
+    """
+    Runs one scheduling round over ``queues`` (name -> (transport, poller)):
+    the queues are tried in the scheduler's order without waiting and the
+    first non-empty batch is processed. If all are empty, the scheduler's
+    idle queue is long-polled. A single queue is long-polled directly.
+    Returns the number of messages processed.
+    """
+    order = scheduler.order()
+    attempts = [(name, 0) for name in order] if len(order) > 1 else []
+    idle = scheduler.idle_queue()
+    attempts.append((idle, queues[idle][1].wait_seconds()))
+    for name, wait_seconds in attempts:
+        transport, poller = queues[name]
+        messages = receive_messages(transport, poller, breaker, wait_seconds)
+        scheduler.record(name, len(messages), message_lag(messages))
+        if messages:
+            logger.info("Received %s messages from %s.", len(messages), name, extra={"event": "worker.batch_received"})
+            return process_batch(transport, messages, poller, breaker)
+    return 0
+
+def report_queue_stats(scheduler, queues):
+    """Logs per-queue throughput, lag and depth since the previous report."""
+    for name, stats in scheduler.report().items():
+        depth = queues[name][1].queue_depth
+        logger.info("Queue %s: %s messages (%.2f/s), lag %s, depth %s", name, stats["messages"],
+                    stats["per_sec"], "n/a" if stats["lag"] is None else f"{stats['lag']:.1f}s", depth,
+                    extra={"event": "worker.queue_stats", "queue": name, "depth": depth, **stats})
+
+def run_worker(max_polls: int | None = None, print_startup_profile: bool = False):
+    """
+    Main worker function to poll the queues and process messages.
+
+    The worker consumes every queue in WORKER_QUEUES (or SQS_QUEUE_NAME), and
+    a ``QueueScheduler`` splits receives between them by weight or strict
+    priority (WORKER_SCHEDULING). Per-queue throughput and lag are logged
+    every WORKER_STATS_INTERVAL seconds.
+
+    Queues are read through an ``app.transport`` transport chosen by
+    WORKER_TRANSPORT: SQS, or Redis Streams with consumer groups and
+    receives of up to STREAM_MAX_BATCH entries.
+
+    Transports are built while Redis connections warm up in the background.
+    Receives are paused while the Redis circuit breaker is open, and the batch
+    size and long-poll wait adapt to queue depth and processing time (see
+    ``app.flowcontrol``). ``max_polls`` bounds the loop for tests.
+    """
+    logger.info("Starting %s worker...", "Redis Streams" if settings.worker_transport == "redis" else "SQS")
+    weights = parse_queue_weights(settings.worker_queues) or {settings.sqs_queue_name: 1}
+    warmup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+    transports_future = warmup.submit(create_transports, list(weights))
+    redis_future = warmup.submit(warm_up_redis)
+    warmup.shutdown(wait=False)
     try:
-        queue_url = get_or_create_queue_url(sqs, settings.sqs_queue_name)
-    except ClientError:
-        logging.error("Could not connect to SQS. Exiting.")
+        transports = transports_future.result()
+    except (ClientError, RedisError):
+        logger.error("Could not connect to the %s transport. Exiting.", settings.worker_transport, exc_info=True)
         return
 
-    logging.info(f"Worker polling queue: {settings.sqs_queue_name}")
-    while True:
-        try:
-            response = sqs.receive_message(
-                QueueUrl=queue_url,
-                MaxNumberOfMessages=10,
-                WaitTimeSeconds=20,
-                AttributeNames=['All']
-            )
+    if print_startup_profile:
+        redis_future.result()
+        print(profile.report(), flush=True)
 
-            messages = response.get("Messages", [])
-            if not messages:
-                # No messages, continue polling
+    queues = {
+        name: (transport, AdaptivePoller(
+            max_batch=transport.max_batch,
+            max_wait=settings.worker_max_wait,
+            visibility_timeout=transport.visibility_timeout,
+        ))
+        for name, transport in transports.items()
+    }
+    scheduler = QueueScheduler(weights, strict_priority=settings.worker_scheduling == "priority")
+    # Error backoff is shared: SQS or Redis trouble affects every queue
+    backoff = queues[scheduler.idle_queue()][1]
+    breaker = CircuitBreaker(
+        latency_threshold=settings.breaker_latency_threshold,
+        error_rate=settings.breaker_error_rate,
+        window=settings.breaker_window,
+        reset_timeout=settings.breaker_reset_timeout,
+    )
+    materializer = None
+    if settings.leaderboard_snapshots:
+        materializer = snapshots.SnapshotMaterializer(
+            interval=settings.leaderboard_snapshot_interval,
+            every_updates=settings.leaderboard_snapshot_every,
+        )
+    next_depth_check = 0.0
+    next_stats_report = time.monotonic() + settings.worker_stats_interval
+    polls = 0
+
+    logger.info("Worker polling queues: %s (%s)", ", ".join(f"{name}={weight}" for name, weight in weights.items()),
+                "priority" if scheduler.strict_priority else "weighted")
+    while max_polls is None or polls < max_polls:
+        polls += 1
+        try:
+            if not breaker.allow():
+                pause = breaker.seconds_until_probe()
+                logger.warning("Redis circuit open; pausing receives for %.1fs.", pause)
+                time.sleep(pause)
                 continue
 
-            logging.info(f"Received {len(messages)} messages.")
-
-            for msg in messages:
-                receipt_handle = msg['ReceiptHandle']
-                try:
-                    body = json.loads(msg['Body'])
-                    logging.info(f"Processing order_id: {body.get('order_id', 'N/A')}")
-                    process_order(body)
-                    # If processing is successful, delete the message
-                    sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=receipt_handle)
-                    logging.info(f"Successfully processed and deleted message for order_id: {body.get('order_id', 'N/A')}")
-                except json.JSONDecodeError:
-                    logging.error(f"Invalid JSON in message body. Message will be retried. Body: {msg['Body']}")
-                    # Don't delete, let it become visible again for manual inspection/retry
-                except Exception as e:
-                    logging.error(f"Error processing message: {e}", exc_info=True)
-                    # Let the message reappear for another attempt.
-                    # The processor.py already logs invalid orders to Redis.
-                    pass
+            if time.monotonic() >= next_depth_check:
+                for transport, poller in queues.values():
+                    depth = transport.depth()
+                    if depth is not None:
+                        poller.observe_depth(depth)
+                next_depth_check = time.monotonic() + settings.worker_depth_refresh
+
+            processed = poll_queues(queues, scheduler, breaker)
+            if materializer is not None:
+                materializer.record_updates(processed)
+            # Runs on empty polls too, so the cadence holds when traffic stops
+            refresh_snapshots(materializer)
+
+            if time.monotonic() >= next_stats_report:
+                report_queue_stats(scheduler, queues)
+                next_stats_report = time.monotonic() + settings.worker_stats_interval
 
         except ClientError as e:
-            logging.error(f"SQS client error: {e}", exc_info=True)
-            # Sleep before retrying to avoid overwhelming the service on connection issues
-            time.sleep(5)
+            logger.error("SQS client error: %s", e, exc_info=True)
+            # Back off before retrying to avoid overwhelming the service on connection issues
+            time.sleep(backoff.error_backoff())
         except Exception as e:
-            logging.error(f"An unexpected error occurred: {e}", exc_info=True)
-            time.sleep(5)
+            logger.error("An unexpected error occurred: %s", e, exc_info=True)
+            time.sleep(backoff.error_backoff())
 
 
 if __name__ == "__main__":
-    run_worker()
+    parser = argparse.ArgumentParser(description="Consume orders from SQS or Redis Streams and update Redis aggregates.")
+    parser.add_argument("--print-startup-profile", action="store_true",
+                        help="Print import and initialization timings once the worker is ready.")
+    args = parser.parse_args()
+    configure_logging()
+    run_worker(print_startup_profile=args.print_startup_profile)
 
 def run_worker_for_test(max_polls: int):
     """
     Test helper to run the worker for a limited number of polls.
     """
-    for _ in range(max_polls):
-        run_worker()
+    run_worker(max_polls=max_polls)
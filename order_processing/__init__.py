@@ -2,6 +2,8 @@
 
 Expose the public processing API.
 """
-from .processing import process_order
+from .model import Item, Order, OrderBatch, OrderTotals
+from .processing import ProcessedOrder, process_order, process_order_view, process_orders
 
-__all__ = ["process_order"]
+__all__ = ["Item", "Order", "OrderBatch", "OrderTotals", "ProcessedOrder", "process_order", "process_order_view",
+           "process_orders"]
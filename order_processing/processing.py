@@ -1,9 +1,59 @@
 """Minimal order processing implementation for scaffold.
 
-This module provides a single function `process_order` that validates
-and computes a simple total for an order dictionary.
+This module provides `process_order`, which validates and computes a simple
+total for an order dictionary, `process_order_view`, which returns the same
+result as a read-only view instead of a copy, and `process_orders`, which
+does the same for a stream of orders using the column-oriented `OrderBatch`
+(see `.model`).
 """
-from typing import Dict, Any
+from collections.abc import Mapping
+from typing import Dict, Any, Iterable, Iterator
+
+from .model import OrderTotals, _check_item, _check_order, iter_batches
+
+
+class ProcessedOrder(Mapping):
+    """Read-only view of an order plus its computed ``subtotal`` and ``total``.
+
+    Compares equal to the dict `process_order` returns, but references the
+    input instead of copying it. Call ``dict(result)`` for a mutable copy.
+    """
+
+    __slots__ = ("order", "subtotal", "total")
+
+    def __init__(self, order: Dict[str, Any], subtotal: float, total: float):
+        self.order = order
+        self.subtotal = subtotal
+        self.total = total
+
+    def __getitem__(self, key):
+        if key == "subtotal":
+            return self.subtotal
+        if key == "total":
+            return self.total
+        return self.order[key]
+
+    def __iter__(self):
+        for key in self.order:
+            if key not in ("subtotal", "total"):
+                yield key
+        yield "subtotal"
+        yield "total"
+
+    def __len__(self):
+        return len(self.order) + 2 - ("subtotal" in self.order) - ("total" in self.order)
+
+    def __repr__(self):
+        return f"ProcessedOrder({dict(self)!r})"
+
+
+def _subtotal(order: Dict[str, Any]) -> float:
+    _, items = _check_order(order)
+    subtotal = 0.0
+    for i, item in enumerate(items):
+        _, qty, unit_price = _check_item(i, item)
+        subtotal += qty * unit_price
+    return round(subtotal, 2)
 
 
 def process_order(order: Dict[str, Any]) -> Dict[str, Any]:
@@ -21,30 +71,33 @@ def process_order(order: Dict[str, Any]) -> Dict[str, Any]:
 
     Raises ValueError for invalid inputs.
     """
-    if not isinstance(order, dict):
-        raise ValueError("order must be a dict")
+    subtotal = _subtotal(order)
+    result = dict(order)
+    result["subtotal"] = subtotal
+    result["total"] = subtotal
+    return result
 
-    order_id = order.get("id")
-    if not order_id:
-        raise ValueError("order missing 'id'")
 
-    items = order.get("items")
-    if not isinstance(items, list):
-        raise ValueError("order 'items' must be a list")
+def process_order_view(order: Dict[str, Any]) -> ProcessedOrder:
+    """Like `process_order`, but returns a read-only `ProcessedOrder` view.
 
-    subtotal = 0.0
-    for i, item in enumerate(items):
-        if not isinstance(item, dict):
-            raise ValueError(f"item at index {i} must be a dict")
-        qty = item.get("qty")
-        unit_price = item.get("unit_price")
-        if not isinstance(qty, int) or qty < 0:
-            raise ValueError(f"item at index {i} has invalid 'qty'")
-        if not (isinstance(unit_price, (int, float)) and unit_price >= 0):
-            raise ValueError(f"item at index {i} has invalid 'unit_price'")
-        subtotal += qty * float(unit_price)
+    The input is neither copied nor modified, which saves the per-order dict
+    copy when the result is only read.
 
-    result = dict(order)
-    result["subtotal"] = round(subtotal, 2)
-    result["total"] = result["subtotal"]
-    return result
+    Raises ValueError for invalid inputs.
+    """
+    subtotal = _subtotal(order)
+    return ProcessedOrder(order, subtotal, subtotal)
+
+
+def process_orders(orders: Iterable, batch_size: int = 1024) -> Iterator[OrderTotals]:
+    """Validate and process a stream of orders (dicts or `Order` objects).
+
+    Orders are packed ``batch_size`` at a time into an `OrderBatch`, whose
+    typed item columns replace per-item objects, and an `OrderTotals` is
+    yielded per order in input order. Memory stays bounded by one batch.
+
+    Raises ValueError for the first invalid order, like `process_order`.
+    """
+    for batch in iter_batches(orders, batch_size):
+        yield from batch.totals()
@@ -0,0 +1,39 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import backfill
+from app.logutil import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill aggregates from NDJSON order archives without SQS.")
+    parser.add_argument("paths", nargs="+", help="NDJSON files with one order per line.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--chunk-mb", type=int, default=64, help="Approximate chunk size per worker task, in MB.")
+    parser.add_argument("--batch", type=int, default=1000, help="Users or invalid entries per pipelined write.")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and aggregate without writing to Redis.")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        started = time.monotonic()
+        summary = backfill.run_backfill(
+            path,
+            workers=args.workers,
+            chunk_size=args.chunk_mb * 1024 * 1024,
+            batch_size=args.batch,
+            dry_run=args.dry_run,
+        )
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Backfilled %s: %s valid orders for %s users, %s invalid, %s undecodable lines in %.2fs (%.0f orders/sec).",
+            path, summary["orders"], summary["users"], summary["invalid"], summary["bad_lines"],
+            elapsed, (summary["orders"] + summary["invalid"]) / elapsed if elapsed > 0 else 0.0,
+        )
@@ -0,0 +1,87 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import storage
+from app.logutil import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+def _memory_per_user(client, pattern: str, sample: int, users_in_key) -> float | None:
+    """
+    Averages MEMORY USAGE per user over up to ``sample`` keys matching ``pattern``.
+    ``users_in_key`` returns how many users a key holds.
+    """
+    total_bytes = 0
+    total_users = 0
+    for key in client.scan_iter(match=pattern, count=1000):
+        usage = client.memory_usage(key, samples=0)
+        users = users_in_key(client, key)
+        if usage and users:
+            total_bytes += usage
+            total_users += users
+        sample -= 1
+        if sample <= 0:
+            break
+    return total_bytes / total_users if total_users else None
+
+def report_memory(sample: int):
+    """Logs the average bytes per user for the legacy and bucketed layouts."""
+    for client in storage.get_user_node_clients():
+        legacy = _memory_per_user(client, f"{storage.USER_STATS_PREFIX}*", sample, lambda c, k: 1)
+        bucketed = _memory_per_user(
+            client, f"{storage.USER_STATS_BUCKET_PREFIX}*", sample, lambda c, k: c.hlen(k) // 2
+        )
+        logger.info(
+            "Memory per user on %s: legacy user:{id} hashes=%s bytes, bucketed ustats:* hashes=%s bytes",
+            client.connection_pool.connection_kwargs.get("host"),
+            f"{legacy:.1f}" if legacy is not None else "n/a",
+            f"{bucketed:.1f}" if bucketed is not None else "n/a",
+        )
+
+def migrate(batch_size: int, dry_run: bool) -> int:
+    """
+    SCANs every user node for legacy ``user:{id}`` hashes and moves them into
+    the bucketed layout in pipelined batches.
+    """
+    moved = 0
+    for client in storage.get_user_node_clients():
+        batch = []
+        for key in client.scan_iter(match=f"{storage.USER_STATS_PREFIX}*", count=batch_size):
+            batch.append(key[len(storage.USER_STATS_PREFIX):])
+            if len(batch) >= batch_size:
+                moved += len(batch) if dry_run else storage.migrate_user_stats_to_buckets(client, batch)
+                batch = []
+        if batch:
+            moved += len(batch) if dry_run else storage.migrate_user_stats_to_buckets(client, batch)
+        logger.info("Migrated users so far: %s", moved)
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move user stats into the bucketed (ustats:*) layout.")
+    parser.add_argument("--batch", type=int, default=1000, help="Users per SCAN batch and pipeline.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the users that would be moved.")
+    parser.add_argument(
+        "--memory-sample",
+        type=int,
+        default=0,
+        help="Before and after migrating, report bytes per user from MEMORY USAGE on this many keys.",
+    )
+    args = parser.parse_args()
+
+    if not storage.user_stats_bucketed() and not args.dry_run:
+        # With the hash layout, reads ignore buckets: migrated users would read as zero
+        logger.error("USER_STATS_LAYOUT must be 'bucketed' before migrating; refusing to move user stats.")
+        sys.exit(1)
+
+    if args.memory_sample:
+        report_memory(args.memory_sample)
+    count = migrate(args.batch, args.dry_run)
+    logger.info("%s %s users.", "Would migrate" if args.dry_run else "Migrated", count)
+    if args.memory_sample and not args.dry_run:
+        report_memory(args.memory_sample)
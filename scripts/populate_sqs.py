@@ -84,9 +84,8 @@ def generate_invalid_order():
             order['items'][0]['price_per_unit'] = "not_a_number"
     return order
 
-def populate_queue(queue_url, num_valid, num_invalid):
-    """Populates the SQS queue with a mix of valid and invalid orders."""
-    sqs = get_sqs_client()
+def generate_messages(num_valid, num_invalid):
+    """Generates a shuffled mix of valid and invalid orders."""
     messages = []
     
     logger.info("Generating %s valid orders...", num_valid)
@@ -98,7 +97,13 @@ def populate_queue(queue_url, num_valid, num_invalid):
         messages.append(generate_invalid_order())
         
     random.shuffle(messages)
-    
+    return messages
+
+def populate_queue(queue_url, num_valid, num_invalid):
+    """Populates the SQS queue with a mix of valid and invalid orders."""
+    sqs = get_sqs_client()
+    messages = generate_messages(num_valid, num_invalid)
+
     logger.info("Sending %s messages to the queue: %s", len(messages), queue_url)
     
     sent_count = 0
@@ -114,16 +119,39 @@ def populate_queue(queue_url, num_valid, num_invalid):
             
     logger.info("Successfully sent %s messages.", sent_count)
 
+def populate_stream(stream, num_valid, num_invalid, batch_size=500):
+    """Appends a mix of valid and invalid orders to a Redis Stream, pipelined in batches."""
+    from app.services import storage
+
+    client = storage.get_redis_client()
+    messages = generate_messages(num_valid, num_invalid)
+
+    logger.info("Adding %s messages to the stream: %s", len(messages), stream)
+    for start in range(0, len(messages), batch_size):
+        with client.pipeline(transaction=False) as pipe:
+            for msg in messages[start:start + batch_size]:
+                pipe.xadd(stream, {"body": json.dumps(msg)})
+            pipe.execute()
+
+    logger.info("Successfully added %s messages.", len(messages))
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Populate the SQS queue with sample order data.")
+    parser = argparse.ArgumentParser(description="Populate the SQS queue or Redis Stream with sample order data.")
     parser.add_argument("--valid", type=int, default=50, help="Number of valid orders to generate.")
     parser.add_argument("--invalid", type=int, default=10, help="Number of invalid orders to generate.")
+    parser.add_argument("--queue", default=settings.sqs_queue_name,
+                        help="Queue or stream to send to, e.g. one of WORKER_QUEUES (default: SQS_QUEUE_NAME).")
+    parser.add_argument("--transport", choices=["sqs", "redis"], default=settings.worker_transport,
+                        help="Send to SQS or append to a Redis Stream (default: WORKER_TRANSPORT).")
     args = parser.parse_args()
 
     try:
-        client = get_sqs_client()
-        q_url = get_or_create_queue_url(client, settings.sqs_queue_name)
-        populate_queue(q_url, args.valid, args.invalid)
+        if args.transport == "redis":
+            populate_stream(args.queue, args.valid, args.invalid)
+        else:
+            client = get_sqs_client()
+            q_url = get_or_create_queue_url(client, args.queue)
+            populate_queue(q_url, args.valid, args.invalid)
     except ClientError as e:
         logger.error("A client error occurred: %s", e)
     except Exception as e:
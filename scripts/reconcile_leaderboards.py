@@ -0,0 +1,29 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import reconcile
+from app.logutil import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the spend and orders leaderboards against user stats.")
+    parser.add_argument("--fix", action="store_true", help="Raise scores that are behind or missing (ZADD GT).")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rebuild both leaderboards under temporary keys and RENAME them into place.")
+    parser.add_argument("--segments", type=int, default=4, help="Parallel scan segments and checker threads.")
+    parser.add_argument("--scan-count", type=int, default=5000, help="COUNT hint per SCAN call.")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        result = reconcile.rebuild(segments=args.segments, scan_count=args.scan_count)
+    else:
+        result = reconcile.reconcile(fix=args.fix, segments=args.segments, scan_count=args.scan_count).as_dict()
+    print(json.dumps(result, indent=2))
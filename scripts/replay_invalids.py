@@ -36,7 +36,14 @@ def replay_invalid_orders(limit: int):
             break
             
         try:
-            log_entry = json.loads(order_json)
+            if order_json.startswith("{"):
+                # Entry pushed before entries were stored by id
+                log_entry = json.loads(order_json)
+            else:
+                log_entry = storage.pop_invalid_entry(client, order_json)
+                if log_entry is None:
+                    logger.warning("Skipping invalid order %s: entry already removed", order_json)
+                    continue
             order_data = log_entry.get("order", {})
             
             if not order_data:
@@ -46,8 +53,8 @@ def replay_invalid_orders(limit: int):
             processor.process_order(order_data)
             reprocessed_count += 1
             
-        except json.JSONDecodeError:
-            logger.error("Could not decode JSON for order: %s", order_json)
+        except ValueError:
+            logger.error("Could not decode invalid order entry: %s", order_json)
         except Exception as e:
             logger.exception("An error occurred while replaying order: %s", e)
             # Optionally, push it back to the invalid queue or a separate dead-letter queue
@@ -0,0 +1,55 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services import backup
+from app.logutil import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot and restore user stats, global stats and leaderboards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="Write a snapshot of the current aggregates.")
+    dump.add_argument("path", help="Snapshot file to write.")
+    dump.add_argument("--segments", type=int, default=4, help="Parallel scan segments for user stats.")
+    dump.add_argument("--scan-count", type=int, default=5000, help="COUNT hint per SCAN call.")
+    restore = commands.add_parser("restore", help="Load a snapshot into Redis.")
+    restore.add_argument("path", help="Snapshot file to read.")
+    inspect = commands.add_parser("inspect", help="Summarize a snapshot offline, or look up one user.")
+    inspect.add_argument("path", help="Snapshot file to read.")
+    inspect.add_argument("--user", help="Print this user's totals from the snapshot.")
+    synthetic = commands.add_parser("synthetic", help="Write a snapshot of generated users, to measure restores.")
+    synthetic.add_argument("path", help="Snapshot file to write.")
+    synthetic.add_argument("--users", type=int, default=10_000_000, help="Number of users to generate.")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "inspect":
+            with backup.SnapshotReader(args.path) as reader:
+                if args.user:
+                    found = reader.find_user(args.user)
+                    print(json.dumps(None if found is None else
+                                     {"user_id": args.user, "order_count": found[0], "total_spend": found[1]}))
+                else:
+                    print(json.dumps(reader.summary(), indent=2))
+        elif args.command == "restore":
+            result = backup.restore(args.path)
+            print(f"Restored {result.users} users and {result.board_entries} leaderboard entries "
+                  f"in {result.elapsed:.2f}s ({result.users_per_sec:.0f} users/sec).")
+        else:
+            if args.command == "dump":
+                result = backup.dump(args.path, segments=args.segments, scan_count=args.scan_count)
+            else:
+                result = backup.write_synthetic(args.path, args.users)
+            logger.info("Wrote %s users and %s leaderboard entries (%s bytes) to %s in %.2fs.",
+                        result.users, result.board_entries, result.bytes, args.path, result.elapsed)
+    except ValueError as e:
+        logger.error("%s", e)
+        sys.exit(1)
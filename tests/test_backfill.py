@@ -0,0 +1,94 @@
+import json
+
+from app.services import backfill
+
+
+def _write_orders(path, lines):
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def _orders(n):
+    lines = []
+    for i in range(n):
+        lines.append(json.dumps({
+            "user_id": f"u{i % 3}",
+            "order_id": f"o{i}",
+            "order_value": 10.0,
+            "items": [{"product_id": "P1", "quantity": 2, "price_per_unit": 5.0}],
+        }))
+    return lines
+
+
+def test_line_aligned_chunks_cover_file(tmp_path):
+    path = _write_orders(tmp_path / "orders.ndjson", _orders(50))
+    data = open(path, "rb").read()
+
+    chunks = backfill.line_aligned_chunks(path, chunk_size=100)
+
+    assert len(chunks) > 1
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_line_aligned_chunks_empty_file(tmp_path):
+    path = tmp_path / "empty.ndjson"
+    path.write_text("")
+    assert backfill.line_aligned_chunks(str(path)) == []
+
+
+def test_reduce_chunk_validates_and_aggregates(tmp_path):
+    lines = _orders(4) + [
+        json.dumps({"user_id": "u9", "order_id": "bad", "order_value": 99.0, "items": [{"quantity": 1, "price_per_unit": 1.0}]}),
+        "{not json",
+        "",
+    ]
+    path = _write_orders(tmp_path / "orders.ndjson", lines)
+
+    result = backfill.reduce_chunk(path, 0, len(open(path, "rb").read()))
+
+    assert result["users"] == {"u0": [2, 20.0], "u1": [1, 10.0], "u2": [1, 10.0]}
+    assert result["orders"] == 4
+    assert result["revenue"] == 40.0
+    assert result["bad_lines"] == 1
+    assert len(result["invalid"]) == 1
+    assert result["invalid"][0][0]["order_id"] == "bad"
+    assert "does not match" in result["invalid"][0][1]
+
+
+def test_run_backfill_writes_merged_totals(tmp_path, monkeypatch):
+    lines = _orders(30) + [json.dumps({"order_id": "missing-user", "order_value": 1.0})]
+    path = _write_orders(tmp_path / "orders.ndjson", lines)
+    written = {}
+
+    monkeypatch.setattr("app.services.storage.apply_user_aggregates",
+                        lambda aggregates, batch_size, trending, windows: written.setdefault("users", aggregates))
+    monkeypatch.setattr("app.services.storage.update_global_stats",
+                        lambda revenue, order_count: written.setdefault("global", (order_count, revenue)))
+    monkeypatch.setattr("app.services.storage.log_invalid_orders",
+                        lambda entries, batch_size: written.setdefault("invalid", []).extend(entries))
+
+    summary = backfill.run_backfill(path, workers=2, chunk_size=200)
+
+    assert summary["chunks"] > 1
+    assert summary["orders"] == 30 and summary["users"] == 3 and summary["invalid"] == 1
+    assert written["users"] == {"u0": [10, 100.0], "u1": [10, 100.0], "u2": [10, 100.0]}
+    assert written["global"] == (30, 300.0)
+    assert written["invalid"][0][1] == "Missing required field: user_id"
+
+
+def test_reduce_chunk_records_validation_errors_as_invalid(tmp_path):
+    # 10**400 * 1.0 raises OverflowError inside validate_order
+    lines = _orders(1) + [
+        '{"user_id": "u9", "order_id": "huge", "order_value": 1.0, "items": [{"quantity": ' + "9" * 400 + ', "price_per_unit": 1.0}]}',
+    ] + _orders(2)[1:]
+    path = _write_orders(tmp_path / "orders.ndjson", lines)
+
+    result = backfill.reduce_chunk(path, 0, len(open(path, "rb").read()))
+
+    assert result["orders"] == 2
+    assert len(result["invalid"]) == 1
+    assert result["invalid"][0][0]["order_id"] == "huge"
+    assert result["invalid"][0][1].startswith("Validation error")
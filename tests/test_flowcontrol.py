@@ -0,0 +1,98 @@
+from app.flowcontrol import AdaptivePoller, CircuitBreaker, CLOSED, HALF_OPEN, OPEN, QueueScheduler, parse_queue_weights
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_on_error_rate_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(error_rate=0.5, min_samples=4, reset_timeout=10.0, clock=clock)
+    for ok in (True, False, False, True):
+        breaker.record(ok)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.seconds_until_probe() == 10.0
+
+    clock.now = 10.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_counts_slow_calls_and_reopens_on_bad_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(latency_threshold=0.1, error_rate=0.5, min_samples=2, reset_timeout=5.0, clock=clock)
+    breaker.record(True, 0.5)
+    breaker.record(True, 0.5)
+    assert breaker.state == OPEN
+
+    clock.now = 5.0
+    breaker.record(True, 0.5)
+    assert breaker.state == OPEN
+
+
+def test_poller_batch_fits_visibility_timeout():
+    poller = AdaptivePoller(max_batch=10, visibility_timeout=30.0)
+    assert poller.batch_size() == 10
+    poller.observe_message(5.0)
+    # 15s budget / 5s per message
+    assert poller.batch_size() == 3
+    assert poller.batch_size(probing=True) == 1
+
+
+def test_poller_wait_follows_queue_depth():
+    poller = AdaptivePoller(max_batch=10, max_wait=20, min_wait=1)
+    assert poller.wait_seconds() == 20
+    poller.observe_depth(4)
+    assert poller.wait_seconds() == 1
+    assert poller.batch_size() == 4
+    poller.observe_depth(0)
+    assert poller.wait_seconds() == 20
+
+
+def test_poller_error_backoff_grows_and_resets():
+    poller = AdaptivePoller(max_backoff=8.0)
+    delays = [poller.error_backoff() for _ in range(6)]
+    assert delays[0] <= 1.0
+    assert all(delay <= 8.0 for delay in delays)
+    assert delays[-1] >= 4.0
+    poller.record_success()
+    assert poller.error_backoff() <= 1.0
+
+
+def test_parse_queue_weights():
+    assert parse_queue_weights("orders-live=8, orders-bulk=2,orders-replay") == {
+        "orders-live": 8, "orders-bulk": 2, "orders-replay": 1}
+    assert parse_queue_weights("") == {}
+
+
+def test_weighted_scheduler_splits_rounds_by_weight():
+    scheduler = QueueScheduler({"live": 3, "bulk": 1})
+    leaders = [scheduler.order()[0] for _ in range(8)]
+    assert leaders.count("live") == 6 and leaders.count("bulk") == 2
+    # Every round still lists all queues, for when the leader is empty
+    assert sorted(scheduler.order()) == ["bulk", "live"]
+    assert scheduler.idle_queue() == "live"
+
+
+def test_priority_scheduler_and_report():
+    clock = FakeClock()
+    scheduler = QueueScheduler({"live": 1, "bulk": 1}, strict_priority=True, clock=clock)
+    assert scheduler.order() == ["live", "bulk"]
+    assert scheduler.order() == ["live", "bulk"]
+
+    scheduler.record("live", 10, lag=0.5)
+    scheduler.record("bulk", 30, lag=120.0)
+    clock.now = 10.0
+    report = scheduler.report()
+    assert report["live"] == {"messages": 10, "per_sec": 1.0, "lag": 0.5}
+    assert report["bulk"]["per_sec"] == 3.0
+    scheduler.record("bulk", 0)
+    clock.now = 20.0
+    assert scheduler.report()["bulk"] == {"messages": 30, "per_sec": 0.0, "lag": 0.0}
@@ -0,0 +1,46 @@
+import json
+import logging
+import queue
+
+from app import logutil
+
+
+def _record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_parse_sample_rates():
+    assert logutil.parse_sample_rates("") == {}
+    assert logutil.parse_sample_rates("storage.user_stats=0.1, worker.order_processed=0") == {
+        "storage.user_stats": 0.1,
+        "worker.order_processed": 0.0,
+    }
+
+
+def test_sampling_filter_drops_sampled_events_only():
+    sampler = logutil.SamplingFilter({"hot": 0.0})
+    assert not sampler.filter(_record("hot path", event="hot"))
+    assert sampler.filter(_record("other", event="cold"))
+    assert sampler.filter(_record("untagged"))
+    assert sampler.filter(_record("problem", event="hot", level=logging.WARNING))
+
+
+def test_json_formatter_includes_extra_fields():
+    line = logutil.JsonFormatter().format(_record("order %s", "o1", event="worker.order_processed"))
+    entry = json.loads(line)
+    assert entry["msg"] == "order o1"
+    assert entry["event"] == "worker.order_processed"
+    assert entry["level"] == "INFO"
+
+
+def test_queue_handler_defers_formatting():
+    records = queue.SimpleQueue()
+    handler = logutil._LazyQueueHandler(records)
+    handler.handle(_record("value %s", "lazy"))
+    queued = records.get_nowait()
+    # The %-args are still unmerged; the listener formats them later
+    assert queued.msg == "value %s"
+    assert queued.args == ("lazy",)
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from order_processing import Order, OrderBatch, process_order, process_order_view, process_orders
+
+
+def _order(order_id, *items):
+    return {"id": order_id, "items": [{"sku": sku, "qty": qty, "unit_price": price} for sku, qty, price in items]}
+
+
+def test_process_order_returns_a_plain_dict():
+    order = _order("o1", ("a", 2, 1.25), ("b", 1, 3))
+    result = process_order(order)
+
+    assert isinstance(result, dict)
+    assert json.loads(json.dumps(result)) == {**order, "subtotal": 5.5, "total": 5.5}
+    result["note"] = "edited"
+    assert "note" not in order and "subtotal" not in order
+
+
+def test_process_order_view_does_not_copy():
+    order = _order("o1", ("a", 2, 1.25), ("b", 1, 3))
+    result = process_order_view(order)
+
+    assert result == {**order, "subtotal": 5.5, "total": 5.5}
+    assert result["items"] is order["items"]
+    assert "subtotal" not in order
+
+
+def test_process_order_rejects_bad_items():
+    with pytest.raises(ValueError, match="item at index 1 has invalid 'qty'"):
+        process_order(_order("o1", ("a", 1, 1.0), ("b", -1, 1.0)))
+    with pytest.raises(ValueError, match="order missing 'id'"):
+        process_order({"items": []})
+
+
+def test_process_orders_matches_process_order_across_batches():
+    orders = [_order(f"o{i}", ("a", i, 0.1), ("b", 1, 2.5)) for i in range(7)]
+
+    totals = list(process_orders(orders, batch_size=3))
+
+    assert [t.id for t in totals] == [o["id"] for o in orders]
+    assert [t.subtotal for t in totals] == [process_order(o)["subtotal"] for o in orders]
+
+
+def test_order_batch_columns_round_trip():
+    batch = OrderBatch()
+    batch.append(_order("o1", ("a", 2, 1.5)))
+    batch.append(Order.from_dict(_order("o2", ("b", 1, 4.0), ("c", 3, 0.5))))
+    with pytest.raises(ValueError):
+        batch.append(_order("bad", ("x", "2", 1.0)))
+
+    assert len(batch) == 2
+    assert list(batch.offsets) == [0, 1, 3]
+    assert batch.qty.typecode == "q" and batch.unit_price.typecode == "d"
+    assert [item.sku for item in batch.order(1).items] == ["b", "c"]
+    assert batch.order(1).subtotal == 5.5
@@ -0,0 +1,50 @@
+import pytest
+
+from app.services import storage
+from app.services.hashring import HashRing
+
+
+def test_hash_ring_is_deterministic():
+    ring = HashRing(["a:1", "b:2", "c:3"])
+    again = HashRing(["a:1", "b:2", "c:3"])
+    for i in range(200):
+        assert ring.get_node(f"user_{i}") == again.get_node(f"user_{i}")
+
+
+def test_hash_ring_spreads_keys_over_all_nodes():
+    ring = HashRing(["a:1", "b:2", "c:3"])
+    groups = ring.group_by_node(f"user_{i}" for i in range(3000))
+    assert set(groups) == {"a:1", "b:2", "c:3"}
+    # Virtual nodes keep every node within a reasonable share of the keys
+    for keys in groups.values():
+        assert 600 < len(keys) < 1400
+
+
+def test_hash_ring_adding_node_moves_few_keys():
+    keys = [f"user_{i}" for i in range(3000)]
+    before = HashRing(["a:1", "b:2", "c:3"])
+    after = HashRing(["a:1", "b:2", "c:3", "d:4"])
+    moved = [key for key in keys if before.get_node(key) != after.get_node(key)]
+    # Only keys taken over by the new node move
+    assert all(after.get_node(key) == "d:4" for key in moved)
+    assert len(moved) < len(keys) / 2
+
+
+def test_hash_ring_requires_nodes():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_merge_top_k_way():
+    partials = [
+        [("u1", 90.0), ("u4", 40.0)],
+        [("u2", 80.0), ("u5", 30.0)],
+        [("u3", 70.0)],
+    ]
+    assert storage._merge_top(partials, 0, 3) == [("u1", 90.0), ("u2", 80.0), ("u3", 70.0)]
+    assert storage._merge_top(partials, 3, 10) == [("u4", 40.0), ("u5", 30.0)]
+
+
+def test_parse_redis_nodes():
+    assert storage.parse_redis_nodes("") == []
+    assert storage.parse_redis_nodes("r1:6379, r2:6380,") == ["r1:6379", "r2:6380"]
@@ -0,0 +1,43 @@
+import os
+import pytest
+
+from app.config import settings
+from app.services import storage
+
+
+pytestmark = pytest.mark.skipif(not os.getenv("REDIS_NODES"), reason="Partitioning tests need REDIS_NODES")
+
+
+@pytest.fixture
+def node_clients():
+    """Flushes every partition node before and after the test.
+
+    Start local nodes with e.g. ``redis-server --port 6380 --daemonize yes``
+    (and 6381, 6382) and set REDIS_NODES=localhost:6380,localhost:6381,localhost:6382.
+    """
+    clients = [storage.get_node_client(node) for node in storage.parse_redis_nodes(settings.redis_nodes)]
+    for client in clients:
+        client.flushdb()
+    yield clients
+    for client in clients:
+        client.flushdb()
+
+
+def test_users_are_spread_and_leaderboard_merged(node_clients):
+    for i in range(30):
+        storage.update_user_stats(f"p_user_{i}", float(i + 1))
+
+    # Every node holds some users and a partial leaderboard
+    for client in node_clients:
+        assert client.zcard(storage.LEADERBOARD_SPEND) > 0
+
+    top = storage.get_top_users("spend", 5)
+    assert [entry["user_id"] for entry in top] == [f"p_user_{i}" for i in range(29, 24, -1)]
+
+    page = storage.get_top_users("spend", 5, offset=5)
+    assert page[0]["user_id"] == "p_user_24"
+
+    stats = storage.get_many_user_stats(["p_user_3", "p_user_17", "missing"])
+    assert stats["p_user_3"] == {"order_count": 1, "total_spend": 4.0}
+    assert stats["p_user_17"]["total_spend"] == 18.0
+    assert stats["missing"] == {"order_count": 0, "total_spend": 0.0}
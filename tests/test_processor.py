@@ -56,3 +56,44 @@ def test_process_order_invalid_logs(monkeypatch):
 
     assert logged["reason"] == "Calculated total (2.0) does not match order_value (10.0)"
     assert logged["order"]["order_id"] == "o4"
+
+
+def test_store_orders_bulk_writes(monkeypatch):
+    written = {}
+    monkeypatch.setattr("app.services.storage.apply_user_aggregates", lambda users: written.setdefault("users", users))
+    monkeypatch.setattr("app.services.storage.update_global_stats",
+                        lambda revenue, order_count: written.setdefault("global", (order_count, revenue)))
+    monkeypatch.setattr("app.services.storage.log_invalid_orders", lambda entries: written.setdefault("invalid", entries))
+
+    orders = [
+        {"user_id": "u1", "order_id": "o1", "order_value": 10.0},
+        {"user_id": "u1", "order_id": "o2", "order_value": 5.0},
+        {"user_id": "u2", "order_id": "o3", "order_value": "bad"},
+    ]
+    processor.store_orders([(order, *processor.validate_order(order)) for order in orders])
+
+    assert written["users"] == {"u1": [2, 15.0]}
+    assert written["global"] == (2, 15.0)
+    assert written["invalid"] == [(orders[2], "order_value must be a number")]
+
+
+def test_store_orders_reports_completed_stages(monkeypatch):
+    monkeypatch.setattr("app.services.storage.log_invalid_orders", lambda entries: None)
+    monkeypatch.setattr("app.services.storage.apply_user_aggregates", lambda users: None)
+
+    def failing_global(revenue, order_count):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.services.storage.update_global_stats", failing_global)
+
+    orders = [({"user_id": "u1", "order_id": "o1", "order_value": 1.0}, True, None), ({"order_id": "o2"}, False, "bad")]
+    with pytest.raises(processor.StoreOrdersError) as excinfo:
+        processor.store_orders(orders)
+    assert excinfo.value.completed == ["invalid", "users"]
+    assert excinfo.value.failed_stage == "global"
+
+
+def test_validate_order_non_dict_item():
+    valid, reason = processor.validate_order({"user_id": "u1", "order_id": "o5", "order_value": 1.0, "items": [1]})
+    assert not valid
+    assert reason == "Invalid structure in 'items' list"
@@ -0,0 +1,119 @@
+import pytest
+import redis
+
+from app.services.replicas import HEARTBEAT_KEY, ReplicaRouter
+
+
+class FakeClient:
+    """Just enough of a Redis client for the router: GET/SET, and an outage switch."""
+
+    def __init__(self, name):
+        self.name = name
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError(f"{self.name} is down")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self._check()
+        self.data[key] = value
+
+
+class Replicating(FakeClient):
+    """A primary that copies every write to its replicas unless they are paused."""
+
+    def __init__(self, name, replicas):
+        super().__init__(name)
+        self.replicas = replicas
+        self.paused = set()
+
+    def set(self, key, value):
+        super().set(key, value)
+        for replica in self.replicas:
+            if replica.name not in self.paused:
+                replica.data[key] = value
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cluster():
+    replicas = [FakeClient("r1"), FakeClient("r2")]
+    primary = Replicating("primary", replicas)
+    clock = FakeClock()
+    router = ReplicaRouter(primary, {r.name: r for r in replicas}, max_lag=5.0, check_interval=1.0, clock=clock)
+    return primary, replicas, clock, router
+
+
+def test_reads_round_robin_over_replicas(cluster):
+    primary, replicas, clock, router = cluster
+    picked = [router.pick()[0] for _ in range(4)]
+    assert picked == ["r1", "r2", "r1", "r2"]
+    assert router.lag == {"r1": 0.0, "r2": 0.0}
+
+
+def test_lagging_replica_falls_back_to_primary(cluster):
+    primary, replicas, clock, router = cluster
+    router.pick()
+    primary.paused.add("r1")
+
+    clock.now += 3
+    router.check()
+    assert router.healthy == ["r1", "r2"]
+    assert router.lag["r1"] == 3.0
+
+    clock.now += 3
+    router.check()
+    assert router.healthy == ["r2"]
+
+    primary.paused.add("r2")
+    clock.now += 6
+    assert router.pick() == (None, primary)
+
+    # Caught-up replicas return to service at the next check
+    primary.paused.clear()
+    clock.now += 1
+    assert router.pick()[0] in ("r1", "r2")
+    assert router.healthy == ["r1", "r2"]
+
+
+def test_checks_run_at_most_every_interval(cluster):
+    primary, replicas, clock, router = cluster
+    router.pick()
+    heartbeat = primary.data[HEARTBEAT_KEY]
+    clock.now += 0.5
+    router.pick()
+    assert primary.data[HEARTBEAT_KEY] == heartbeat
+    clock.now += 0.5
+    router.pick()
+    assert primary.data[HEARTBEAT_KEY] != heartbeat
+
+
+def test_failed_replica_read_retries_on_primary(cluster):
+    primary, replicas, clock, router = cluster
+    primary.data["k"] = "primary-value"
+    replicas[0].data["k"] = "replica-value"
+    replicas[1].data["k"] = "replica-value"
+    router.pick()  # r1; the next read goes to r2
+    replicas[1].down = True
+
+    assert router.read(lambda client: client.get("k")) == "primary-value"
+    assert router.healthy == ["r1"]
+
+    # Down replicas fail the health check too
+    clock.now += 1
+    router.check()
+    assert router.healthy == ["r1"]
+    assert router.lag["r2"] is None
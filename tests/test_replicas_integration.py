@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.services import storage
+
+
+pytestmark = pytest.mark.skipif(not os.getenv("REDIS_REPLICAS"), reason="Replica tests need REDIS_REPLICAS")
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """Routes reads to the replicas in REDIS_REPLICAS with a short lag threshold.
+
+    Start a replica of the local primary with e.g.
+    ``redis-server --port 6390 --replicaof localhost 6379 --daemonize yes`` and set
+    REDIS_REPLICAS=localhost:6390. The test database is flushed on the primary.
+    """
+    monkeypatch.setattr(settings, "replica_max_lag", 0.5)
+    monkeypatch.setattr(settings, "replica_check_interval", 0.1)
+    monkeypatch.setattr(storage, "_replica_router", None)
+    primary = storage.get_redis_client()
+    primary.delete(storage.USER_STATS_PREFIX + "replica_user", storage.LEADERBOARD_SPEND, storage.LEADERBOARD_ORDERS)
+    router = storage.get_replica_router()
+    yield router
+    primary.delete(storage.USER_STATS_PREFIX + "replica_user", storage.LEADERBOARD_SPEND, storage.LEADERBOARD_ORDERS)
+
+
+def test_reads_are_served_by_replicas(router):
+    storage.update_user_stats("replica_user", 12.5)
+    for replica in router.replicas.values():
+        _wait_for(lambda: replica.exists(storage.USER_STATS_PREFIX + "replica_user"))
+
+    _wait_for(lambda: router.pick()[0] is not None)
+    assert storage.get_user_stats("replica_user") == {"order_count": 1, "total_spend": 12.5}
+
+
+def test_detached_replica_falls_back_to_primary(router):
+    name, replica = next(iter(router.replicas.items()))
+    _wait_for(lambda: name in router.check())
+    replica.replicaof("NO", "ONE")
+    try:
+        time.sleep(1.0)
+        assert name not in router.check()
+    finally:
+        replica.replicaof(settings.redis_host, settings.redis_port)
+    _wait_for(lambda: name in router.check(), timeout=10.0)
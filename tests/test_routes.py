@@ -1,3 +1,5 @@
+import json
+
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -11,3 +13,170 @@ def test_global_stats_default(monkeypatch):
     r = client.get("/stats/global")
     assert r.status_code == 200
     assert r.json() == {"total_orders": 0, "total_revenue": 0.0}
+
+
+def test_export_users_streams_ndjson(monkeypatch):
+    batches = [[{"user_id": "u1", "order_count": 1, "total_spend": 5.0}], [{"user_id": "u2", "order_count": 2, "total_spend": 7.5}]]
+    monkeypatch.setattr("app.services.export.iter_user_stats_batches", lambda segments: iter(batches))
+    r = client.get("/users/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [line for line in r.text.splitlines()] == ['{"user_id": "u1", "order_count": 1, "total_spend": 5.0}', '{"user_id": "u2", "order_count": 2, "total_spend": 7.5}']
+
+
+def test_bulk_orders_streams_per_line_results(monkeypatch):
+    stored = []
+    monkeypatch.setattr("app.services.processor.store_orders", lambda validated: stored.append(list(validated)))
+    body = "\n".join([
+        '{"user_id": "u1", "order_id": "o1", "order_value": 10.0}',
+        '{"order_id": "o2", "order_value": 5.0}',
+        'not json',
+        '',
+        '{"user_id": "u2", "order_id": "o3", "order_value": 2.5}',
+    ])
+    r = client.post("/orders/bulk?chunk_size=2", content=body.encode())
+    assert r.status_code == 200
+    results = [json.loads(line) for line in r.text.splitlines()]
+    by_line = {result["line"]: result for result in results}
+
+    assert by_line[1] == {"line": 1, "order_id": "o1", "status": "processed"}
+    assert by_line[2]["status"] == "invalid"
+    assert by_line[2]["reason"] == "Missing required field: user_id"
+    assert by_line[3] == {"line": 3, "status": "error", "reason": "Invalid JSON"}
+    assert by_line[5]["status"] == "processed"
+    assert sum(len(chunk) for chunk in stored) == 3
+
+
+def test_bulk_orders_responds_before_the_body_ends(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr("app.services.processor.store_orders", lambda validated: None)
+    order = '{"user_id": "u1", "order_id": "o%s", "order_value": 1.0}\n'
+    chunks = [(order % 1 + order % 2).encode(), (order % 3).encode()]
+    events = []
+
+    async def receive():
+        if chunks:
+            events.append("receive")
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            events.append([json.loads(line)["line"] for line in message["body"].decode().splitlines()])
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/orders/bulk", "raw_path": b"/orders/bulk", "root_path": "",
+             "query_string": b"chunk_size=2", "headers": [(b"content-type", b"application/x-ndjson")],
+             "client": ("test", 1), "server": ("test", 80)}
+    asyncio.run(app(scope, receive, send))
+
+    # The first chunk's results go out before the rest of the body is read
+    assert events == ["receive", [1, 2], "receive", [3]]
+
+
+def test_bulk_orders_rejects_bad_structure_and_long_lines(monkeypatch):
+    monkeypatch.setattr("app.services.processor.store_orders", lambda validated: None)
+    monkeypatch.setattr("app.config.settings.bulk_max_line_bytes", 100)
+    body = "\n".join([
+        '{"user_id": "u1", "order_id": "o1", "order_value": 1.0, "items": [1]}',
+        '{"user_id": "u1", "order_id": "o2", "order_value": 1.0, "pad": "' + "x" * 200 + '"}',
+        '{"user_id": "u1", "order_id": "o3", "order_value": 1.0}',
+    ])
+    r = client.post("/orders/bulk", content=body.encode())
+    by_line = {result["line"]: result for result in map(json.loads, r.text.splitlines())}
+
+    assert by_line[1]["status"] == "invalid"
+    assert by_line[1]["reason"] == "Invalid structure in 'items' list"
+    assert by_line[2] == {"line": 2, "status": "error", "reason": "Line exceeds 100 bytes"}
+    assert by_line[3]["status"] == "processed"
+
+
+def test_bulk_orders_reports_partial_storage_failure(monkeypatch):
+    from app.services.processor import StoreOrdersError
+
+    def failing_store(validated):
+        raise StoreOrdersError(["invalid"], "users")
+
+    monkeypatch.setattr("app.services.processor.store_orders", failing_store)
+    body = '{"user_id": "u1", "order_id": "o1", "order_value": 1.0}\n{"order_id": "o2", "order_value": 1.0}\n'
+    r = client.post("/orders/bulk", content=body.encode())
+    by_line = {result["line"]: result for result in map(json.loads, r.text.splitlines())}
+
+    assert by_line[1]["status"] == "error"
+    assert "partially applied" in by_line[1]["reason"]
+    assert by_line[2]["status"] == "invalid"
+
+
+def test_line_splitter_scans_only_new_data():
+    from app.routes import _LineSplitter
+
+    splitter = _LineSplitter(max_bytes=10)
+    assert splitter.feed(b'{"a"') == []
+    assert splitter.feed(b':1}\n{"b":2}\nxx') == [b'{"a":1}', b'{"b":2}']
+    assert splitter.feed(b"x" * 20) == []
+    assert splitter.feed(b"\nok\n") == [None, b"ok"]
+    assert splitter.feed(b"tail") == []
+    assert splitter.finish() == [b"tail"]
+
+
+def test_reprocess_order_runs_processor(monkeypatch):
+    processed = []
+    monkeypatch.setattr("app.services.processor.process_order", processed.append)
+    order = {"order_id": "o1", "user_id": "u1", "order_timestamp": "2024-01-01T00:00:00Z", "order_value": 10.0,
+             "items": [{"product_id": "p1", "quantity": 1, "price_per_unit": 10.0}],
+             "shipping_address": "1 Main St", "payment_method": "PayPal"}
+    r = client.post("/orders/reprocess", json=order)
+    assert r.status_code == 202
+    assert processed[0]["order_id"] == "o1"
+
+
+def test_user_stats_window(monkeypatch):
+    calls = []
+
+    def fake_stats(user_id, window=None):
+        calls.append(window)
+        return {"order_count": 3, "total_spend": 9.0, "window": {"window": window, "order_count": 1, "total_spend": 2.0}}
+
+    monkeypatch.setattr("app.services.storage.get_user_stats", fake_stats)
+    r = client.get("/users/u1/stats?window=1h")
+    assert r.status_code == 200
+    assert r.json()["window"]["order_count"] == 1
+    assert calls == ["1h"]
+    assert client.get("/users/u1/stats?window=7d").status_code == 422
+
+
+def test_top_users_serves_snapshot_bytes(monkeypatch):
+    monkeypatch.setattr("app.config.settings.leaderboard_snapshots", True)
+    body = '{"by":"spend","n":1,"offset":0,"users":[{"user_id":"u1","score":5.0}]}'
+    monkeypatch.setattr("app.services.snapshots.read_top_users", lambda by, n, offset: (body, 1.5))
+    r = client.get("/stats/top-users?by=spend&n=1")
+    assert r.status_code == 200
+    assert r.text == body
+    assert r.headers["x-snapshot-age"] == "1.500"
+
+    monkeypatch.setattr("app.services.snapshots.read_top_users", lambda by, n, offset: None)
+    monkeypatch.setattr("app.services.storage.get_top_users", lambda by, n, offset: [{"user_id": "u2", "score": 1.0}])
+    r = client.get("/stats/top-users?by=spend&n=1")
+    assert r.json()["users"] == [{"user_id": "u2", "score": 1.0}]
+
+
+def test_invalid_orders_filtered_query(monkeypatch):
+    calls = []
+
+    def fake_query(reason, since, until, cursor, limit):
+        calls.append((reason, since, until, cursor, limit))
+        return [{"order": {"order_id": "o1"}, "reason": "r", "code": reason}], "123.0:7"
+
+    monkeypatch.setattr("app.services.storage.query_invalid_orders", fake_query)
+    r = client.get("/orders/invalid?reason=total_mismatch&since=2024-01-01T00:00:00&limit=10")
+    assert r.status_code == 200
+    assert r.headers["x-next-cursor"] == "123.0:7"
+    assert r.json()[0]["code"] == "total_mismatch"
+    assert calls == [("total_mismatch", 1704067200.0, None, None, 10)]
+
+    def bad_query(**kwargs):
+        raise ValueError("Unknown reason code.")
+
+    monkeypatch.setattr("app.services.storage.query_invalid_orders", bad_query)
+    assert client.get("/orders/invalid?reason=nope").status_code == 400
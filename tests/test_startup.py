@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from app.startup import StartupProfile
+
+
+def test_startup_profile_records_phases():
+    profile = StartupProfile()
+    with profile.phase("first"):
+        pass
+    with profile.phase("second"):
+        pass
+    assert [name for name, _, _ in profile.phases] == ["first", "second"]
+    report = profile.report()
+    assert "first" in report and "total since first import" in report
+
+
+def test_worker_import_defers_boto3():
+    # boto3 is only imported when the SQS client is created
+    code = "import sys, app.worker; print('boto3' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=Path(__file__).resolve().parent.parent, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_settings_are_built_lazily():
+    from app.config import get_settings, settings
+    assert settings.sqs_queue_name == get_settings().sqs_queue_name
@@ -129,4 +129,473 @@ def test_list_invalid_orders_limit():
     # Check that it returns the most recent ones
     assert invalid_list[0]["order"]["order_id"] == "lim_4"
     assert invalid_list[1]["order"]["order_id"] == "lim_3"
-    assert invalid_list[2]["order"]["order_id"] == "lim_2"
\ No newline at end of file
+    assert invalid_list[2]["order"]["order_id"] == "lim_2"
+
+def test_sharded_global_stats_sum_all_shards(redis_client, monkeypatch):
+    """Increments spread across shards are summed by get_global_stats."""
+    monkeypatch.setattr(settings, "global_stats_shards", 4)
+    redis_client.delete(*storage.global_stats_keys())
+
+    for i in range(8):
+        storage.update_global_stats(10.0, shard_key=f"order_{i}")
+    storage.update_global_stats(5.5)
+
+    populated = [key for key in storage.global_stats_keys() if redis_client.exists(key)]
+    assert len(populated) > 1
+
+    stats = storage.get_global_stats()
+    assert stats["total_orders"] == 9
+    assert stats["total_revenue"] == 85.5
+
+    redis_client.delete(*storage.global_stats_keys())
+
+def test_global_stats_cache(redis_client, monkeypatch):
+    """With a cache TTL, repeated reads are served from the in-process total."""
+    monkeypatch.setattr(settings, "global_stats_cache_ttl", 60.0)
+    monkeypatch.setattr(storage, "_global_stats_cache", {"expires_at": 0.0, "value": None})
+    redis_client.delete(*storage.global_stats_keys())
+
+    storage.update_global_stats(20.0)
+    assert storage.get_global_stats()["total_orders"] == 1
+    storage.update_global_stats(20.0)
+    assert storage.get_global_stats()["total_orders"] == 1
+
+    redis_client.delete(*storage.global_stats_keys())
+
+def test_get_many_user_stats(redis_client):
+    """Batch reads return stats for every requested user, zeros when missing."""
+    storage.update_user_stats("batch_user_1", 10.0)
+    storage.update_user_stats("batch_user_2", 20.0)
+    storage.update_user_stats("batch_user_2", 5.0)
+
+    stats = storage.get_many_user_stats(["batch_user_1", "batch_user_2", "batch_missing"])
+    assert stats["batch_user_1"] == {"order_count": 1, "total_spend": 10.0}
+    assert stats["batch_user_2"] == {"order_count": 2, "total_spend": 25.0}
+    assert stats["batch_missing"] == {"order_count": 0, "total_spend": 0.0}
+
+def test_bucketed_user_stats(redis_client, monkeypatch):
+    """The bucketed layout stores integer cents in a shared ustats:* hash."""
+    monkeypatch.setattr(settings, "user_stats_layout", "bucketed")
+    user_id = "bucket_user_1"
+
+    storage.update_user_stats(user_id, 19.99)
+    storage.update_user_stats(user_id, 0.01)
+
+    bucket = storage.user_stats_bucket_key(user_id)
+    assert redis_client.hget(bucket, f"{user_id}:s") == "2000"
+    assert not redis_client.exists(f"{storage.USER_STATS_PREFIX}{user_id}")
+    assert storage.get_user_stats(user_id) == {"order_count": 2, "total_spend": 20.0}
+    assert redis_client.zscore(storage.LEADERBOARD_SPEND, user_id) == 20.0
+
+def test_bucketed_reads_include_legacy_hash_until_migrated(redis_client, monkeypatch):
+    """Users with a legacy hash keep their totals across the switch and the migration."""
+    user_id = "legacy_user_1"
+    storage.update_user_stats(user_id, 10.25)
+
+    monkeypatch.setattr(settings, "user_stats_layout", "bucketed")
+    storage.update_user_stats(user_id, 5.0)
+    assert storage.get_user_stats(user_id) == {"order_count": 2, "total_spend": 15.25}
+    assert redis_client.zscore(storage.LEADERBOARD_SPEND, user_id) == 15.25
+
+    assert storage.migrate_user_stats_to_buckets(redis_client, [user_id]) == 1
+    assert not redis_client.exists(f"{storage.USER_STATS_PREFIX}{user_id}")
+    assert storage.get_user_stats(user_id) == {"order_count": 2, "total_spend": 15.25}
+
+def test_export_user_stats_both_layouts(redis_client, monkeypatch):
+    """Export rows cover legacy hashes and buckets exactly once per user."""
+    from app.services import export
+
+    redis_client.flushdb()
+    storage.update_user_stats("exp_legacy", 10.0)
+    storage.update_user_stats("exp_mixed", 1.5)
+    monkeypatch.setattr(settings, "user_stats_layout", "bucketed")
+    monkeypatch.setattr(settings, "user_stats_buckets", 64)
+    storage.update_user_stats("exp_mixed", 2.0)
+    storage.update_user_stats("exp_bucket", 3.25)
+
+    stats = export.ExportStats()
+    rows = [row for batch in export.iter_user_stats_batches(segments=3, scan_count=10, stats=stats) for row in batch]
+    by_user = {row["user_id"]: row for row in rows}
+
+    assert len(rows) == 3 == stats.rows
+    assert by_user["exp_legacy"] == {"user_id": "exp_legacy", "order_count": 1, "total_spend": 10.0}
+    assert by_user["exp_mixed"] == {"user_id": "exp_mixed", "order_count": 2, "total_spend": 3.5}
+    assert by_user["exp_bucket"] == {"user_id": "exp_bucket", "order_count": 1, "total_spend": 3.25}
+
+    csv_text = "".join(export.iter_csv([rows]))
+    assert csv_text.splitlines()[0] == "user_id,order_count,total_spend"
+    assert len(csv_text.splitlines()) == 4
+
+def test_export_hash_layout_reads_in_parallel_segments(redis_client):
+    """In the hash layout, segments share one SCAN and export every user once."""
+    from app.services import export
+
+    redis_client.flushdb()
+    storage.apply_user_aggregates({f"seg_{i}": (1, float(i)) for i in range(200)})
+
+    assert len(export.export_segments(segments=8)) == 8
+    rows = [row for batch in export.iter_user_stats_batches(segments=8, scan_count=10) for row in batch]
+    assert sorted(row["user_id"] for row in rows) == sorted(f"seg_{i}" for i in range(200))
+
+def test_apply_user_aggregates_and_bulk_invalids(redis_client):
+    """Bulk writers add pre-aggregated totals and push invalid entries in batches."""
+    storage.update_user_stats("agg_user_1", 5.0)
+    storage.apply_user_aggregates({"agg_user_1": [2, 20.0], "agg_user_2": [1, 7.5]}, batch_size=1)
+
+    assert storage.get_user_stats("agg_user_1") == {"order_count": 3, "total_spend": 25.0}
+    assert storage.get_user_stats("agg_user_2") == {"order_count": 1, "total_spend": 7.5}
+    assert redis_client.zscore(storage.LEADERBOARD_ORDERS, "agg_user_1") == 3
+
+    storage.log_invalid_orders([({"order_id": "bulk_1"}, "r1"), ({"order_id": "bulk_2"}, "r2")], batch_size=1)
+    recent = storage.list_invalid_orders(limit=2)
+    assert [entry["order"]["order_id"] for entry in recent] == ["bulk_2", "bulk_1"]
+
+def test_user_rolling_windows(redis_client, monkeypatch):
+    """Window counts cover the last hour or day and old buckets are reused, not accumulated."""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(storage.time, "time", lambda: now[0])
+    storage.update_user_stats("win_user", 10.0)
+    now[0] += 1800
+    storage.update_user_stats("win_user", 2.5)
+
+    stats = storage.get_user_stats("win_user", window="1h")
+    assert stats["order_count"] == 2
+    assert stats["window"] == {"window": "1h", "order_count": 2, "total_spend": 12.5}
+    assert 0 < redis_client.ttl(storage.user_window_key("win_user")) <= storage.USER_WINDOW_TTL
+
+    # Two hours later only the day window still sees the orders
+    now[0] += 7200
+    assert storage.get_user_stats("win_user", window="1h")["window"]["order_count"] == 0
+    assert storage.get_user_stats("win_user", window="24h")["window"]["total_spend"] == 12.5
+
+    # An order a day later lands on the oldest slots and resets them
+    now[0] += 86400 - 9000
+    storage.update_user_stats("win_user", 1.0)
+    assert storage.get_user_stats("win_user", window="24h")["window"] == {
+        "window": "24h", "order_count": 1, "total_spend": 1.0}
+    assert redis_client.hlen(storage.user_window_key("win_user")) <= 12 + 24
+
+    assert "window" not in storage.get_user_stats("win_user")
+    with pytest.raises(ValueError):
+        storage.get_user_stats("win_user", window="7d")
+
+def test_worker_shard_is_redrawn_after_fork(monkeypatch):
+    """A child process with a new pid does not reuse the parent's shard pick."""
+    monkeypatch.setattr(storage, "_worker_shard", {"pid": None, "value": 0})
+    monkeypatch.setattr(storage.os, "getpid", lambda: 100)
+    parent = storage._worker_shard_value()
+    assert storage._worker_shard_value() == parent
+    monkeypatch.setattr(storage.random, "randrange", lambda limit: parent + 1)
+    monkeypatch.setattr(storage.os, "getpid", lambda: 101)
+    assert storage._worker_shard_value() == parent + 1
+
+def test_bucket_count_keeps_buckets_listpack_sized(monkeypatch):
+    """The derived bucket count keeps even the fullest buckets under 64 users (128 fields)."""
+    monkeypatch.setattr(settings, "user_stats_buckets", 0)
+    monkeypatch.setattr(settings, "user_stats_expected_users", 10_000_000)
+    assert storage.user_stats_bucket_count() == 333_334
+    monkeypatch.setattr(settings, "user_stats_expected_users", 100_000)
+    counts = {}
+    for i in range(100_000):
+        key = storage.user_stats_bucket_key(f"user_{i}")
+        counts[key] = counts.get(key, 0) + 1
+    assert max(counts.values()) * 2 <= 128
+    monkeypatch.setattr(settings, "user_stats_buckets", 64)
+    assert storage.user_stats_bucket_count() == 64
+
+
+def test_leaderboard_snapshot_serves_ranges_it_covers(redis_client, monkeypatch):
+    """Snapshots hold the serialized top 100 and cover any range inside it."""
+    from app.services import snapshots
+
+    redis_client.flushdb()
+    for i in range(3):
+        storage.update_user_stats(f"snap_user_{i}", 10.0 * (i + 1))
+
+    assert snapshots.read_top_users("spend", 10) is None
+    assert snapshots.materialize_snapshots() == {"spend": 3, "orders": 3}
+    assert redis_client.ttl(snapshots.snapshot_key("spend")) > 0
+
+    body, age = snapshots.read_top_users("spend", 2, offset=1)
+    assert json.loads(body) == {"by": "spend", "n": 2, "offset": 1, "users": storage.get_top_users("spend", 2, 1)}
+    assert age >= 0
+    # Fewer than SNAPSHOT_SIZE entries means the snapshot is the whole leaderboard
+    assert json.loads(snapshots.read_top_users("spend", 10, offset=50)[0])["users"] == []
+
+    monkeypatch.setattr(snapshots, "SNAPSHOT_SIZE", 3)
+    assert snapshots.read_top_users("spend", 2, offset=2) is None
+
+
+def test_snapshot_materializer_cadence():
+    from app.services import snapshots
+
+    now = [0.0]
+    materializer = snapshots.SnapshotMaterializer(interval=5.0, every_updates=10, clock=lambda: now[0])
+    assert materializer.due()
+    materializer._last = 0.0
+    materializer.record_updates(9)
+    assert not materializer.due()
+    materializer.record_updates(1)
+    assert materializer.due()
+    materializer._updates = 0
+    now[0] = 5.0
+    assert materializer.due()
+
+
+def test_trending_leaderboard_decays_old_spend(redis_client, monkeypatch):
+    """Recent spend outranks larger old spend once it has decayed."""
+    redis_client.flushdb()
+    monkeypatch.setattr(settings, "trending_half_life", 3600.0)
+    now = time.time()
+    with redis_client.pipeline() as pipe:
+        storage._queue_trending_increment(pipe, {"whale": 100.0}, now=now - 3 * 3600)
+        storage._queue_trending_increment(pipe, {"riser": 20.0}, now=now)
+        pipe.execute()
+
+    top = storage.get_top_users("trending", 10)
+    assert [entry["user_id"] for entry in top] == ["riser", "whale"]
+    assert top[0]["score"] == pytest.approx(20.0, abs=0.01)
+    # Three half-lives: 100 -> 12.5
+    assert top[1]["score"] == pytest.approx(12.5, abs=0.01)
+
+    # The normal write path feeds the trending board too
+    storage.update_user_stats("riser", 5.0)
+    assert storage.get_top_users("trending", 1)[0]["score"] == pytest.approx(25.0, abs=0.01)
+
+
+def test_trending_renormalizes_without_changing_scores(redis_client, monkeypatch):
+    redis_client.flushdb()
+    monkeypatch.setattr(settings, "trending_half_life", 3600.0)
+    monkeypatch.setattr(storage, "TRENDING_RENORMALIZE_EXPONENT", 1.0)
+    now = time.time()
+    with redis_client.pipeline() as pipe:
+        storage._queue_trending_increment(pipe, {"a": 64.0}, now=now - 3 * 3600)
+        storage._queue_trending_increment(pipe, {"b": 1.0}, now=now)
+        pipe.execute()
+
+    # The second write passed the exponent limit and rebased the epoch
+    assert float(redis_client.get(storage.LEADERBOARD_TRENDING_EPOCH)) == pytest.approx(now)
+    assert redis_client.zscore(storage.LEADERBOARD_TRENDING, "a") == pytest.approx(8.0)
+    scores = {entry["user_id"]: entry["score"] for entry in storage.get_top_users("trending", 10)}
+    assert scores == {"a": pytest.approx(8.0, abs=0.01), "b": pytest.approx(1.0, abs=0.01)}
+
+
+def test_invalid_orders_indexed_by_reason_and_time(redis_client, monkeypatch):
+    """Filtered queries page through the reason and day indexes, newest first."""
+    redis_client.flushdb()
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(storage.time, "time", lambda: clock[0])
+    for i in range(5):
+        storage.log_invalid_order({"order_id": f"mm_{i}"}, "Calculated total (1.0) does not match order_value (2.0)")
+        storage.log_invalid_order({"order_id": f"mf_{i}"}, "Missing required field: user_id")
+        clock[0] += 60
+    # Next day
+    clock[0] += 86400
+    storage.log_invalid_orders([({"order_id": "late"}, "Calculated total (3.0) does not match order_value (4.0)")])
+
+    assert storage.classify_invalid_reason("order_value must be a number") == "invalid_value"
+    assert storage.get_invalid_order_counts() == {"total_mismatch": 6, "missing_field": 5}
+
+    page, cursor = storage.query_invalid_orders(reason="total_mismatch", limit=4)
+    assert [e["order"]["order_id"] for e in page] == ["late", "mm_4", "mm_3", "mm_2"]
+    assert page[0]["code"] == "total_mismatch" and "id" in page[0]
+    page, cursor = storage.query_invalid_orders(reason="total_mismatch", cursor=cursor, limit=4)
+    assert [e["order"]["order_id"] for e in page] == ["mm_1", "mm_0"]
+    assert cursor is None
+
+    # Time range without a reason walks the day buckets
+    since, until = 1_700_000_000.0 + 60, 1_700_000_000.0 + 120
+    page, _ = storage.query_invalid_orders(since=since, until=until)
+    assert sorted(e["order"]["order_id"] for e in page) == ["mf_1", "mf_2", "mm_1", "mm_2"]
+    page, cursor = storage.query_invalid_orders(since=since, limit=3)
+    assert [e["order"]["order_id"] for e in page][0] == "late"
+    rest, _ = storage.query_invalid_orders(since=since, cursor=cursor, limit=50)
+    assert len(page) + len(rest) == 9
+
+    with pytest.raises(ValueError):
+        storage.query_invalid_orders(reason="nope")
+
+
+def test_invalid_index_skips_removed_entries(redis_client):
+    redis_client.flushdb()
+    storage.log_invalid_order({"order_id": "a"}, "Missing required field: user_id")
+    storage.log_invalid_order({"order_id": "b"}, "Missing required field: user_id")
+    # A legacy JSON entry pushed before the id-based layout still lists
+    redis_client.rpush(storage.INVALID_ORDERS_KEY, json.dumps({"order": {"order_id": "old"}, "reason": "x", "ts": "t"}))
+    assert [e["order"]["order_id"] for e in storage.list_invalid_orders()] == ["b", "a", "old"]
+
+    redis_client.hdel(storage.INVALID_ORDERS_ENTRIES_KEY, "1")
+    page, _ = storage.query_invalid_orders(reason="missing_field")
+    assert [e["order"]["order_id"] for e in page] == ["b"]
+    assert redis_client.zcard(storage.invalid_reason_key("missing_field")) == 1
+
+
+def test_invalid_entry_codec_round_trip():
+    from app.services import codec
+
+    entry = {"order": {"order_id": "o1", "items": [{"quantity": 1}] * 20, "shipping_address": "1 Main St"},
+             "reason": "Calculated total (1) does not match order_value (2)", "ts": "2024-01-01T00:00:00"}
+    for name in ("zlib", "zstd"):
+        raw = codec.encode_entry(entry, name)
+        assert raw[0] == codec.CODECS[name]
+        assert len(raw) < len(json.dumps(entry))
+        assert codec.decode_entry(raw) == entry
+    assert codec.decode_entry(json.dumps(entry)) == entry
+    with pytest.raises(ValueError):
+        codec.decode_entry(b"\x09junk")
+
+
+def test_invalid_orders_capped_by_count_in_the_write(redis_client, monkeypatch):
+    redis_client.flushdb()
+    monkeypatch.setattr(settings, "invalid_orders_max_count", 3)
+    for i in range(6):
+        storage.log_invalid_order({"order_id": f"cap_{i}"}, "Missing required field: user_id")
+
+    assert redis_client.llen(storage.INVALID_ORDERS_KEY) == 3
+    assert redis_client.hlen(storage.INVALID_ORDERS_ENTRIES_KEY) == 3
+    assert redis_client.zcard(storage.invalid_reason_key("missing_field")) == 3
+    assert redis_client.zcard(storage.invalid_day_key(storage._invalid_day(time.time()))) == 3
+    assert [e["order"]["order_id"] for e in storage.list_invalid_orders()] == ["cap_5", "cap_4", "cap_3"]
+    # Counts are totals logged, not what is retained
+    assert storage.get_invalid_order_counts() == {"missing_field": 6}
+    raw = redis_client.execute_command("HGET", storage.INVALID_ORDERS_ENTRIES_KEY, "6", NEVER_DECODE=True)
+    assert raw[0] == 1
+
+
+def test_invalid_orders_capped_by_age(redis_client, monkeypatch):
+    redis_client.flushdb()
+    monkeypatch.setattr(settings, "invalid_orders_max_age", 3600.0)
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(storage.time, "time", lambda: clock[0])
+    redis_client.rpush(storage.INVALID_ORDERS_KEY, json.dumps({"order": {"order_id": "legacy"}, "reason": "x", "ts": "t"}))
+    storage.log_invalid_order({"order_id": "old"}, "Missing required field: user_id")
+    clock[0] += 86400
+    storage.log_invalid_order({"order_id": "new"}, "Missing required field: user_id")
+
+    assert [e["order"]["order_id"] for e in storage.list_invalid_orders()] == ["new"]
+    # The emptied day bucket is dropped with its last entry
+    assert redis_client.zcard(storage.INVALID_ORDERS_DAYS_KEY) == 1
+    assert storage.pop_invalid_entry(redis_client, "2")["order"]["order_id"] == "new"
+    assert storage.pop_invalid_entry(redis_client, "2") is None
+
+
+def test_invalid_day_counts_expire_with_retention(redis_client, monkeypatch):
+    redis_client.flushdb()
+    storage.log_invalid_order({"order_id": "kept"}, "Missing required field: user_id")
+    day = storage._invalid_day(time.time())
+    assert redis_client.ttl(storage.invalid_day_counts_key(day)) == -1
+
+    monkeypatch.setattr(settings, "invalid_orders_max_age", 7 * 86400.0)
+    storage.log_invalid_order({"order_id": "aged"}, "Missing required field: user_id")
+    ttl = redis_client.ttl(storage.invalid_day_counts_key(day))
+    assert 7 * 86400 < ttl <= 8 * 86400
+    assert storage.get_invalid_order_counts(day) == {"missing_field": 2}
+
+def test_snapshot_dump_and_restore_round_trip(redis_client, monkeypatch, tmp_path):
+    """A snapshot restores users, global stats and leaderboards, into either layout."""
+    from app.services import backup
+
+    redis_client.flushdb()
+    storage.update_user_stats("snap_a", 12.5)
+    storage.update_user_stats("snap_a", 7.5)
+    storage.update_user_stats("snap_b", 40.0)
+    storage.update_global_stats(60.0, order_count=3)
+    trending_before = dict((row["user_id"], row["score"]) for row in storage.get_top_users("trending", 10))
+
+    path = str(tmp_path / "aggregates.snap")
+    dumped = backup.dump(path, segments=2, scan_count=10)
+    assert dumped.users == 2 and dumped.board_entries == 6
+
+    with backup.SnapshotReader(path) as reader:
+        summary = reader.summary()
+        assert summary["users"] == 2
+        assert summary["boards"] == {"spend": 2, "orders": 2, "trending": 2}
+        assert reader.find_user("snap_a") == (2, 20.0)
+        assert reader.find_user("missing") is None
+
+    redis_client.flushdb()
+    # A legacy hash left over from before a layout switch is replaced, not added to
+    redis_client.hset(f"{storage.USER_STATS_PREFIX}snap_a", mapping={"order_count": 5, "total_spend": 99.0})
+    monkeypatch.setattr(settings, "user_stats_layout", "bucketed")
+    monkeypatch.setattr(settings, "user_stats_buckets", 16)
+    restored = backup.restore(path)
+    assert restored.users == 2
+
+    assert not redis_client.exists(f"{storage.USER_STATS_PREFIX}snap_a")
+    assert storage.get_user_stats("snap_a") == {"order_count": 2, "total_spend": 20.0}
+    assert storage.get_user_stats("snap_b") == {"order_count": 1, "total_spend": 40.0}
+    assert storage.get_global_stats() == {"total_orders": 3, "total_revenue": 60.0}
+    assert [row["user_id"] for row in storage.get_top_users("spend", 10)] == ["snap_b", "snap_a"]
+    assert redis_client.zscore(storage.LEADERBOARD_ORDERS, "snap_a") == 2
+    trending_after = dict((row["user_id"], row["score"]) for row in storage.get_top_users("trending", 10))
+    assert trending_after == pytest.approx(trending_before, abs=0.01)
+
+    # Restoring back into the hash layout clears the users' bucket fields
+    monkeypatch.setattr(settings, "user_stats_layout", "hash")
+    backup.restore(path)
+    bucket = storage.user_stats_bucket_key("snap_a")
+    assert not redis_client.hexists(bucket, storage.user_stats_bucket_fields("snap_a")[0])
+    assert storage.get_user_stats("snap_a") == {"order_count": 2, "total_spend": 20.0}
+
+def test_snapshot_reader_rejects_other_files(tmp_path):
+    from app.services import backup
+
+    bad = tmp_path / "bad.snap"
+    bad.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError, match="not a snapshot"):
+        backup.SnapshotReader(str(bad))
+
+    future = tmp_path / "future.snap"
+    future.write_bytes(backup._HEADER.pack(backup.MAGIC, backup.FORMAT_VERSION + 1, 0.0))
+    with pytest.raises(ValueError, match="Unsupported snapshot version"):
+        backup.SnapshotReader(str(future))
+
+    synthetic = str(tmp_path / "synthetic.snap")
+    backup.write_synthetic(synthetic, 1200)
+    with backup.SnapshotReader(synthetic) as reader:
+        assert reader.summary()["users"] == 1200
+        assert sum(len(rows) for rows in reader.iter_users()) == 1200
+
+def test_reconcile_reports_and_fixes_leaderboard_drift(redis_client):
+    from app.services import reconcile
+
+    redis_client.flushdb()
+    for user_id, amount in (("rec_a", 10.0), ("rec_b", 20.0), ("rec_c", 30.0)):
+        storage.update_user_stats(user_id, amount)
+    # Simulate a late ZADD from an older read-back, a lost ZADD and a concurrent newer update
+    redis_client.zadd(storage.LEADERBOARD_SPEND, {"rec_a": 4.0})
+    redis_client.zrem(storage.LEADERBOARD_ORDERS, "rec_b")
+    redis_client.zadd(storage.LEADERBOARD_SPEND, {"rec_c": 45.0})
+
+    report = reconcile.reconcile(segments=2, scan_count=10)
+    assert report.users == 3
+    assert report.boards["spend"]["behind"] == 1
+    assert report.boards["spend"]["ahead"] == 1
+    assert report.boards["spend"]["max_drift"] == 6.0
+    assert report.boards["orders"]["missing"] == 1
+    assert report.fixed == 0
+    assert redis_client.zscore(storage.LEADERBOARD_SPEND, "rec_a") == 4.0
+
+    fixed = reconcile.reconcile(fix=True, segments=2, scan_count=10)
+    assert fixed.fixed == 2
+    assert redis_client.zscore(storage.LEADERBOARD_SPEND, "rec_a") == 10.0
+    assert redis_client.zscore(storage.LEADERBOARD_ORDERS, "rec_b") == 1
+    # GT never lowers a score
+    assert redis_client.zscore(storage.LEADERBOARD_SPEND, "rec_c") == 45.0
+
+def test_reconcile_rebuild_swaps_in_fresh_leaderboards(redis_client):
+    from app.services import reconcile
+
+    redis_client.flushdb()
+    storage.update_user_stats("reb_a", 10.0)
+    storage.update_user_stats("reb_b", 5.0)
+    redis_client.zadd(storage.LEADERBOARD_SPEND, {"reb_a": 99.0, "orphan": 1.0})
+
+    result = reconcile.rebuild(segments=2, scan_count=10)
+
+    assert result["users"] == 2
+    assert result["before"] == [{"spend": 3, "orders": 2}]
+    assert result["after"] == [{"spend": 2, "orders": 2}]
+    assert result["catch_up"]["drifted"] == 0
+    assert redis_client.zrevrange(storage.LEADERBOARD_SPEND, 0, -1, withscores=True) == [("reb_a", 10.0), ("reb_b", 5.0)]
+    assert not redis_client.exists(storage.LEADERBOARD_SPEND + reconcile.REBUILD_SUFFIX)
@@ -0,0 +1,102 @@
+import pytest
+import redis
+
+from app.config import settings
+from app.transport import Message, RedisStreamTransport, SQSTransport, Transport
+
+
+@pytest.fixture
+def redis_client():
+    client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=1, decode_responses=True)
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_stream_receive_and_ack(redis_client):
+    for i in range(3):
+        redis_client.xadd("orders", {"body": f'{{"order_id": "o{i}"}}'})
+    transport = RedisStreamTransport(redis_client, "orders", "workers", consumer="c1")
+
+    messages = transport.receive_batch(500, 0)
+    assert [m.body for m in messages] == ['{"order_id": "o0"}', '{"order_id": "o1"}', '{"order_id": "o2"}']
+    assert all(m.sent_at for m in messages)
+    assert transport.receive_batch(500, 0) == []
+
+    transport.ack_batch(messages[:2])
+    assert transport.depth() == 1
+    assert redis_client.xpending("orders", "workers")["pending"] == 1
+
+
+def test_stream_claims_stuck_messages(redis_client):
+    redis_client.xadd("orders", {"body": "{}"})
+    clock = FakeClock()
+    crashed = RedisStreamTransport(redis_client, "orders", "workers", consumer="crashed")
+    assert len(crashed.receive_batch(10, 0)) == 1
+
+    survivor = RedisStreamTransport(redis_client, "orders", "workers", consumer="survivor",
+                                    visibility_timeout=0.0, claim_interval=5.0, clock=clock)
+    claimed = survivor.receive_batch(10, 0)
+    assert [m.body for m in claimed] == ["{}"]
+    assert redis_client.xpending_range("orders", "workers", "-", "+", 10)[0]["consumer"] == "survivor"
+
+    # Claims are only attempted every claim_interval
+    assert survivor.receive_batch(10, 0) == []
+
+
+def test_stream_nack_redelivers_after_delay(redis_client):
+    redis_client.xadd("orders", {"body": "{}"})
+    clock = FakeClock()
+    transport = RedisStreamTransport(redis_client, "orders", "workers", consumer="c1",
+                                     visibility_timeout=30.0, claim_interval=60.0, clock=clock)
+    messages = transport.receive_batch(10, 0)
+    assert transport.receive_batch(10, 0) == []
+
+    transport.nack(messages)
+    assert [m.handle for m in transport.receive_batch(10, 0)] == [messages[0].handle]
+
+
+def test_sqs_ack_batch_uses_batch_delete():
+    class FakeSQS:
+        def __init__(self):
+            self.calls = []
+
+        def get_queue_url(self, QueueName):
+            return {"QueueUrl": QueueName}
+
+        def get_queue_attributes(self, QueueUrl, AttributeNames):
+            return {"Attributes": {"VisibilityTimeout": "45"}}
+
+        def delete_message(self, QueueUrl, ReceiptHandle):
+            self.calls.append(("delete", ReceiptHandle))
+
+        def delete_message_batch(self, QueueUrl, Entries):
+            self.calls.append(("batch", [entry["ReceiptHandle"] for entry in Entries]))
+            return {"Successful": Entries}
+
+    sqs = FakeSQS()
+    transport = SQSTransport(sqs, "orders", max_batch=50)
+    assert transport.max_batch == 10
+    assert transport.visibility_timeout == 45.0
+
+    transport.ack_batch([Message("{}", "r1")])
+    transport.ack_batch([Message("{}", "r2"), Message("{}", "r3")])
+    transport.ack_batch([])
+    assert sqs.calls == [("delete", "r1"), ("batch", ["r2", "r3"])]
+
+
+def test_incomplete_transport_fails_at_construction():
+    class ReceiveOnly(Transport):
+        def receive_batch(self, max_messages, wait_seconds):
+            return []
+
+    with pytest.raises(TypeError):
+        ReceiveOnly()
@@ -6,14 +6,21 @@ from app.worker import run_worker_for_test
 
 
 class FakeSQSClient:
-    def __init__(self, messages):
+    def __init__(self, messages, attributes=None):
         self._messages = messages
         self.deleted = []
+        self.receives = []
+        self.visibility_changes = []
+        self.attributes = attributes or {"VisibilityTimeout": "30", "ApproximateNumberOfMessages": str(len(messages))}
 
     def get_queue_url(self, QueueName):
         return {"QueueUrl": "http://fake-queue"}
 
-    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds):
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        return {"Attributes": {name: self.attributes[name] for name in AttributeNames if name in self.attributes}}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, AttributeNames=None):
+        self.receives.append((MaxNumberOfMessages, WaitTimeSeconds))
         if self._messages:
             m = self._messages.pop(0)
             return {"Messages": [m]}
@@ -22,6 +29,14 @@ class FakeSQSClient:
     def delete_message(self, QueueUrl, ReceiptHandle):
         self.deleted.append(ReceiptHandle)
 
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.visibility_changes.append([(entry["ReceiptHandle"], entry["VisibilityTimeout"]) for entry in Entries])
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
 
 def test_worker_processes_message(monkeypatch):
     messages = [{"ReceiptHandle": "r1", "Body": json.dumps({"user_id": "u1", "id": "o1", "order_value": 10.0})}]
@@ -46,3 +61,138 @@ def test_worker_processes_message(monkeypatch):
 
     assert "order" in called
     assert fake.deleted == ["r1"]
+
+
+def test_worker_pauses_receives_while_redis_circuit_open(monkeypatch):
+    from redis.exceptions import ConnectionError as RedisConnectionError
+
+    messages = [{"ReceiptHandle": f"r{i}", "Body": json.dumps({"user_id": "u1", "order_id": f"o{i}", "order_value": 1.0})} for i in range(10)]
+    fake = FakeSQSClient([])
+    batches = [{"Messages": messages}]
+    fake.receive_message = lambda QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, AttributeNames=None: batches.pop(0) if batches else {"Messages": []}
+    monkeypatch.setattr("app.worker.boto3.client", lambda *args, **kwargs: fake)
+
+    attempts = []
+
+    def failing_process(order):
+        attempts.append(order["order_id"])
+        raise RedisConnectionError("redis down")
+
+    sleeps = []
+    monkeypatch.setattr("app.worker.process_order", failing_process)
+    monkeypatch.setattr("app.worker.time.sleep", lambda seconds: sleeps.append(seconds))
+    monkeypatch.setattr("app.config.settings.breaker_reset_timeout", 7.0)
+    received = []
+    receive = fake.receive_message
+    fake.receive_message = lambda **kwargs: received.append(1) or receive(**kwargs)
+
+    run_worker_for_test(max_polls=2)
+
+    # The breaker opens after min_samples failures and the rest of the batch
+    # is released for redelivery when the breaker will next probe.
+    assert len(attempts) == 5
+    assert fake.deleted == []
+    assert len(fake.visibility_changes) == 1
+    assert [handle for handle, _ in fake.visibility_changes[0]] == [f"r{i}" for i in range(5, 10)]
+    assert all(0 < timeout <= 7 for _, timeout in fake.visibility_changes[0])
+    # The next poll sleeps instead of receiving
+    assert received == [1]
+    assert sleeps and 0 < sleeps[0] <= 7.0
+
+
+def test_processed_messages_are_acked_before_extending_the_rest(monkeypatch):
+    from app.flowcontrol import AdaptivePoller, CircuitBreaker
+    from app.transport import Message
+    from app.worker import ACK_EVERY, process_batch
+
+    calls = []
+    transport = SimpleNamespace(
+        ack_batch=lambda messages: calls.append(("ack", [m.handle for m in messages])) if messages else None,
+        extend=lambda messages, timeout: calls.append(("extend", [m.handle for m in messages])),
+        nack=lambda messages, delay: calls.append(("nack", [m.handle for m in messages])),
+    )
+    clock = iter(range(0, 1000, 4))
+    monkeypatch.setattr("app.worker.time.monotonic", lambda: next(clock))
+    monkeypatch.setattr("app.worker.process_order", lambda order: None)
+    messages = [Message(json.dumps({"order_id": f"o{i}"}), f"h{i}") for i in range(ACK_EVERY + 3)]
+
+    # Each message takes longer than half the 10s visibility timeout
+    breaker = CircuitBreaker(latency_threshold=100.0)
+    assert process_batch(transport, messages, AdaptivePoller(visibility_timeout=10.0), breaker) == len(messages)
+
+    # Everything before an extended message has been acked, so no processed
+    # message can expire and be delivered again
+    acked = []
+    extended = 0
+    for kind, handles in calls:
+        if kind == "ack":
+            acked += handles
+        elif kind == "extend":
+            extended += 1
+            assert acked == [m.handle for m in messages[:len(messages) - len(handles)]]
+    assert extended and acked == [m.handle for m in messages]
+    assert max(len(handles) for kind, handles in calls if kind == "ack") <= ACK_EVERY
+
+
+def test_worker_materializes_leaderboard_snapshots(monkeypatch):
+    messages = [{"ReceiptHandle": "r1", "Body": json.dumps({"user_id": "u1", "order_id": "o1", "order_value": 10.0})}]
+    fake = FakeSQSClient(messages)
+    monkeypatch.setattr("app.worker.boto3.client", lambda *args, **kwargs: fake)
+    monkeypatch.setattr("app.worker.process_order", lambda order: None)
+    monkeypatch.setattr("app.config.settings.leaderboard_snapshots", True)
+    monkeypatch.setattr("app.config.settings.leaderboard_snapshot_every", 1)
+    materialized = []
+    monkeypatch.setattr("app.services.snapshots.materialize_snapshots", lambda: materialized.append(1) or {})
+
+    run_worker_for_test(max_polls=2)
+
+    # Once at the first poll (no snapshot yet), not again on the empty poll
+    assert fake.deleted == ["r1"]
+    assert materialized == [1]
+
+
+def test_worker_prefers_priority_queue(monkeypatch):
+    queues = {
+        "orders-live": [{"ReceiptHandle": "live-1", "Body": json.dumps({"order_id": "live-1"})}],
+        "orders-bulk": [{"ReceiptHandle": f"bulk-{i}", "Body": json.dumps({"order_id": f"bulk-{i}"})} for i in range(2)],
+    }
+    fake = FakeSQSClient([])
+    fake.get_queue_url = lambda QueueName: {"QueueUrl": QueueName}
+
+    def receive_message(QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, AttributeNames=None):
+        pending = queues[QueueUrl]
+        return {"Messages": [pending.pop(0)]} if pending else {"Messages": []}
+
+    fake.receive_message = receive_message
+    fake.delete_message = lambda QueueUrl, ReceiptHandle: fake.deleted.append(ReceiptHandle)
+    monkeypatch.setattr("app.worker.boto3.client", lambda *args, **kwargs: fake)
+    monkeypatch.setattr("app.worker.process_order", lambda order: None)
+    monkeypatch.setattr("app.config.settings.worker_queues", "orders-live,orders-bulk")
+    monkeypatch.setattr("app.config.settings.worker_scheduling", "priority")
+    queues["orders-live"].append({"ReceiptHandle": "live-2", "Body": json.dumps({"order_id": "live-2"})})
+
+    run_worker_for_test(max_polls=4)
+
+    assert fake.deleted == ["live-1", "live-2", "bulk-0", "bulk-1"]
+
+
+def test_worker_consumes_redis_stream(monkeypatch):
+    import redis
+
+    from app.config import settings
+
+    client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=1, decode_responses=True)
+    client.delete("orders-stream")
+    for i in range(3):
+        client.xadd("orders-stream", {"body": json.dumps({"order_id": f"o{i}"})})
+    processed = []
+    monkeypatch.setattr("app.worker.storage.get_redis_client", lambda: client)
+    monkeypatch.setattr("app.worker.process_order", lambda order: processed.append(order["order_id"]))
+    monkeypatch.setattr("app.config.settings.worker_transport", "redis")
+    monkeypatch.setattr("app.config.settings.sqs_queue_name", "orders-stream")
+
+    run_worker_for_test(max_polls=1)
+
+    assert processed == ["o0", "o1", "o2"]
+    assert client.xlen("orders-stream") == 0
+    client.delete("orders-stream")